@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+from config import LOUDNESS_NORMALIZATION, LOUDNESS_TARGET_LUFS, LOUDNESS_MAX_GAIN_DB, LOUDNESS_SCAN_INTERVAL, SILENCE_TRIM, SILENCE_THRESHOLD_DB, SILENCE_MIN_SECONDS
+from audio_cache import audio_cache
+from extraction_guard import extract_video_id
+
+logging.basicConfig(level=logging.DEBUG, filename='audio_analysis.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SEGMENT_SAMPLES = SAMPLE_RATE // 10  # 100 ms, the hop between 400 ms gating blocks
+SEGMENT_SECONDS = SEGMENT_SAMPLES / SAMPLE_RATE
+SEGMENTS_PER_BLOCK = 4
+CHUNK_SEGMENTS = 100  # decode and weight 10 s at a time
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# ITU-R BS.1770 K-weighting at 48 kHz: a high shelf modelling the head, then a high-pass
+K_WEIGHTING_STAGES = [
+    ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585]),
+    ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621]),
+]
+
+
+def k_weighting_power_response(n: int) -> np.ndarray:
+    """|H(f)|^2 of the K-weighting filter at the rfft bins of an n-sample segment."""
+    z_inverse = np.exp(-1j * np.pi * np.arange(n // 2 + 1) / (n / 2))
+    response = np.ones(n // 2 + 1, dtype=np.complex128)
+    for b, a in K_WEIGHTING_STAGES:
+        numerator = b[0] + b[1] * z_inverse + b[2] * z_inverse ** 2
+        denominator = a[0] + a[1] * z_inverse + a[2] * z_inverse ** 2
+        response *= numerator / denominator
+    return np.abs(response) ** 2
+
+
+# Parseval weights: rfft drops the mirrored half of the spectrum, so interior bins count twice
+SEGMENT_WEIGHTS = k_weighting_power_response(SEGMENT_SAMPLES) * np.r_[1.0, np.full(SEGMENT_SAMPLES // 2 - 1, 2.0), 1.0]
+
+
+def segment_energies(samples: np.ndarray) -> np.ndarray:
+    """
+    K-weighted mean square per 100 ms segment, summed over channels.
+
+    The filter is applied in the frequency domain of each segment instead of as a
+    running IIR filter, which keeps the whole computation vectorized. Ignoring the
+    filter's state across segment edges shifts the result by well under 0.1 LU.
+    """
+    segments = samples.reshape(-1, SEGMENT_SAMPLES, CHANNELS)
+    spectrum = np.fft.rfft(segments, axis=1)
+    power = (spectrum.real ** 2 + spectrum.imag ** 2) * SEGMENT_WEIGHTS[None, :, None]
+    return power.sum(axis=(1, 2)) / SEGMENT_SAMPLES ** 2
+
+
+def integrated_loudness(energies: np.ndarray) -> Optional[float]:
+    """Gated integrated loudness in LUFS from per-segment energies, None for silence or very short audio."""
+    if energies.size < SEGMENTS_PER_BLOCK:
+        return None
+    # 400 ms blocks overlapping by 75%: the mean of every run of four 100 ms segments
+    cumulative = np.concatenate(([0.0], np.cumsum(energies)))
+    blocks = (cumulative[SEGMENTS_PER_BLOCK:] - cumulative[:-SEGMENTS_PER_BLOCK]) / SEGMENTS_PER_BLOCK
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(blocks)
+
+    gated = blocks[block_loudness > ABSOLUTE_GATE_LUFS]
+    if gated.size == 0:
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = blocks[(block_loudness > ABSOLUTE_GATE_LUFS) & (block_loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def segment_peaks(samples: np.ndarray) -> np.ndarray:
+    """Absolute sample peak per 100 ms segment, over both channels."""
+    return np.abs(samples.reshape(-1, SEGMENT_SAMPLES * CHANNELS)).max(axis=1)
+
+
+def silence_bounds(peaks: np.ndarray):
+    """
+    (trim_start, trim_end) in seconds from per-segment peaks.
+
+    trim_start is 0.0 and trim_end None where the leading or trailing silence is
+    shorter than SILENCE_MIN_SECONDS. A track that is silent throughout is not trimmed.
+    """
+    audible = np.flatnonzero(peaks > 10 ** (SILENCE_THRESHOLD_DB / 20))
+    if audible.size == 0:
+        return 0.0, None
+    start = audible[0] * SEGMENT_SECONDS
+    end = (audible[-1] + 1) * SEGMENT_SECONDS
+    trim_start = float(start) if start >= SILENCE_MIN_SECONDS else 0.0
+    trim_end = float(end) if peaks.size * SEGMENT_SECONDS - end >= SILENCE_MIN_SECONDS else None
+    return trim_start, trim_end
+
+
+class AudioAnalysis(NamedTuple):
+    loudness: Optional[float]
+    trim_start: float
+    trim_end: Optional[float]
+
+
+def analyze_file(path: str) -> Optional[AudioAnalysis]:
+    """
+    Decode a file with ffmpeg, streaming 10 s at a time, and measure its integrated
+    loudness and its leading and trailing silence in the same pass.
+    """
+    process = subprocess.Popen(
+        ['ffmpeg', '-nostdin', '-v', 'error', '-i', path, '-vn', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    chunk_bytes = CHUNK_SEGMENTS * SEGMENT_SAMPLES * CHANNELS * 4
+    segment_bytes = SEGMENT_SAMPLES * CHANNELS * 4
+    energies, peaks = [], []
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            usable = len(data) - len(data) % segment_bytes
+            if usable:
+                samples = np.frombuffer(data[:usable], dtype=np.float32)
+                energies.append(segment_energies(samples))
+                peaks.append(segment_peaks(samples))
+            if len(data) < chunk_bytes:
+                break
+    finally:
+        process.stdout.close()
+        process.wait()
+    if not energies:
+        if process.returncode != 0:
+            logging.error(f"ffmpeg could not decode {path} for analysis")
+        return None
+    return AudioAnalysis(integrated_loudness(np.concatenate(energies)), *silence_bounds(np.concatenate(peaks)))
+
+
+def normalization_gain_db(loudness: Optional[float]) -> float:
+    if loudness is None:
+        return 0.0
+    return float(np.clip(LOUDNESS_TARGET_LUFS - loudness, -LOUDNESS_MAX_GAIN_DB, LOUDNESS_MAX_GAIN_DB))
+
+
+def db_to_gain(gain_db: Optional[float]) -> float:
+    return 10 ** (gain_db / 20) if gain_db else 1.0
+
+
+def analyzable_path(entry) -> Optional[str]:
+    """Local file holding the entry's audio, an uploaded MP3 or a cached track, if there is one to analyze."""
+    if entry.best_audio_url and not entry.best_audio_url.startswith('http') and os.path.isfile(entry.best_audio_url):
+        return entry.best_audio_url
+    return audio_cache.path_for(extract_video_id(entry.video_url))
+
+
+def needs_analysis(entry) -> bool:
+    return (LOUDNESS_NORMALIZATION and entry.loudness_gain_db is None) or (SILENCE_TRIM and entry.trim_start is None)
+
+
+class AudioAnalyzer:
+    """
+    Background task that measures local tracks in the queues and stores the
+    normalization gain on each entry (loudness_gain_db), so playback applies a
+    static gain instead of running ffmpeg's two-pass loudnorm on every stream.
+    For cached tracks the gain is then baked into the cache file, see AudioCache.bake_gain.
+    The same decode finds leading and trailing silence (trim_start, trim_end),
+    which playback skips with input seeking and an early end.
+
+    Analysis runs on a single worker thread, one file at a time, so it never
+    competes with playback for more than one core.
+    """
+
+    def __init__(self, queue_manager):
+        self.queue_manager = queue_manager
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='loudness')
+        self.results: Dict[str, Optional[AudioAnalysis]] = {}  # path -> analysis, shared by duplicate entries
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                await self.analyze_pending()
+            except Exception as e:
+                logging.error(f"Loudness analysis pass failed: {e}")
+            await asyncio.sleep(LOUDNESS_SCAN_INTERVAL)
+
+    async def analyze_pending(self):
+        changed = False
+        for queue in list(self.queue_manager.queues.values()):
+            for entry in list(queue):
+                if not needs_analysis(entry):
+                    continue
+                path = analyzable_path(entry)
+                if path is None:
+                    continue
+                if path not in self.results:
+                    self.results[path] = await asyncio.get_running_loop().run_in_executor(self.executor, analyze_file, path)
+                    logging.info(f"Analyzed {path}: {self.results[path]}")
+                analysis = self.results[path]
+                # A cached file may already carry its gain; measure the track as it was before that
+                baked_gain_db = audio_cache.baked_gain_db(path)
+                loudness = analysis.loudness if analysis is not None else None
+                entry.loudness_gain_db = normalization_gain_db(loudness - baked_gain_db if loudness is not None else None)
+                if LOUDNESS_NORMALIZATION and not baked_gain_db and path != entry.best_audio_url:
+                    audio_cache.bake_gain(extract_video_id(entry.video_url), entry.loudness_gain_db)
+                entry.trim_start, entry.trim_end = (analysis.trim_start, analysis.trim_end) if analysis else (0.0, None)
+                changed = True
+        if changed:
+            self.queue_manager.save_queues()
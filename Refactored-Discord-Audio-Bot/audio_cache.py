@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB, AUDIO_CACHE_PLAY_THRESHOLD, OPUS_BITRATE
+from extraction_guard import extract_video_id, youtube_breaker
+from ytdl_pool import executor, ytdl_pool
+from tee_stream import TeeStream, stream_extension
+
+logging.basicConfig(level=logging.DEBUG, filename='audio_cache.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+INDEX_FILE = 'index.json'
+NORMALIZED_EXTENSION = '.opus'
+GAIN_EXTENSION = '.gain.opus'
+NORMALIZE_TIMEOUT = 600
+MIN_BAKED_GAIN_DB = 0.5  # smaller loudness gains are left to playback, which treats them as unity
+OPUS_ENCODE_ARGS = ['-c:a', 'libopus', '-b:a', f'{OPUS_BITRATE}k', '-ar', '48000', '-ac', '2', '-frame_duration', '20']
+
+
+class AudioCache:
+    """
+    Size-bounded on-disk cache of YouTube audio, keyed by video ID.
+
+    Each cached track is stored once as <video_id>.<ext>, whichever entries or
+    guilds refer to it. A track is normally cached as a side effect of being
+    streamed once (open_tee_stream). Play counts are kept for every video seen,
+    and a track that still is not cached is downloaded in the background once it
+    has been played play_threshold times or favorited. When the cache exceeds its quota, the least recently played
+    tracks are evicted. The index is not shared between processes, so every shard
+    has a directory of its own (see AUDIO_CACHE_DIR in config.py).
+
+    Once a cached track's loudness is measured, its normalization gain is baked in
+    by a second, one-time encode (bake_gain) and recorded as baked_gain_db, so
+    playback only applies what is left and can still hand the packets straight to Discord.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, play_threshold: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.play_threshold = play_threshold
+        self.lock = threading.Lock()
+        self.entries: Dict[str, dict] = {}  # video_id -> {'file', 'size', 'acodec', 'last_access', 'baked_gain_db'}
+        self.play_counts: Dict[str, int] = {}
+        self.downloading: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # ffmpeg conversions to Ogg/Opus run one at a time in the background
+        self.normalizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-normalize')
+        os.makedirs(self.directory, exist_ok=True)
+        self.load()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r') as file:
+                data = json.load(file)
+            self.entries = data.get('entries', {})
+            self.play_counts = data.get('play_counts', {})
+        except (json.JSONDecodeError, FileNotFoundError) as e:
+            logging.warning(f"Could not load audio cache index, starting empty: {e}")
+        # Drop index entries whose file disappeared, e.g. deleted by hand
+        for video_id in [video_id for video_id, item in self.entries.items() if not os.path.isfile(self.file_path(item))]:
+            del self.entries[video_id]
+
+    def save(self):
+        try:
+            with open(self.index_path, 'w') as file:
+                json.dump({'entries': self.entries, 'play_counts': self.play_counts}, file, indent=4)
+        except OSError as e:
+            logging.error(f"Failed to save audio cache index: {e}")
+
+    def file_path(self, item: dict) -> str:
+        return os.path.join(self.directory, item['file'])
+
+    def path_for(self, video_id: Optional[str]) -> Optional[str]:
+        """Path of a cached track without touching the hit/miss counters or LRU order."""
+        with self.lock:
+            item = self.entries.get(video_id) if video_id else None
+            return self.file_path(item) if item else None
+
+    def lookup(self, video_id: Optional[str]) -> Optional[dict]:
+        """Cached track for playback, counted as a hit or miss and marked as recently used."""
+        if not video_id:
+            return None
+        with self.lock:
+            item = self.entries.get(video_id)
+            if item is None or not os.path.isfile(self.file_path(item)):
+                self.entries.pop(video_id, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            item['last_access'] = time.time()
+            return {**item, 'path': self.file_path(item)}
+
+    def baked_gain_db(self, path: str) -> float:
+        """Gain in dB baked into the cached file at path, 0 if none or if path is not the current file."""
+        name = os.path.basename(path)
+        with self.lock:
+            item = next((item for item in self.entries.values() if item['file'] == name), None)
+            return item.get('baked_gain_db', 0.0) if item else 0.0
+
+    def add(self, video_id: str, path: str, acodec: Optional[str] = None):
+        with self.lock:
+            self.entries[video_id] = {
+                'file': os.path.basename(path),
+                'size': os.path.getsize(path),
+                'acodec': acodec,
+                'last_access': time.time(),
+            }
+            self.evict()
+            self.save()
+        logging.info(f"Cached {video_id} at {path}")
+        if not path.endswith(NORMALIZED_EXTENSION):
+            self.normalizer.submit(self.normalize, video_id)
+
+    def normalize(self, video_id: str):
+        """
+        Convert a cached track to Ogg/Opus with 20 ms packets so it can be played by
+        OggOpusSource without ffmpeg. Opus audio is remuxed; anything else is encoded once.
+        """
+        with self.lock:
+            item = self.entries.get(video_id)
+            if item is None or item['file'].endswith(NORMALIZED_EXTENSION):
+                return
+            source_path = self.file_path(item)
+            acodec = item.get('acodec')
+        target_path = os.path.join(self.directory, f"{video_id}{NORMALIZED_EXTENSION}")
+        if acodec == 'opus':
+            codec_args = ['-c:a', 'copy']
+        else:
+            codec_args = OPUS_ENCODE_ARGS
+        if self.convert(video_id, source_path, target_path, codec_args):
+            self.replace_file(video_id, source_path, target_path)
+            logging.info(f"Normalized cached {video_id} to Ogg/Opus")
+
+    def bake_gain(self, video_id: Optional[str], gain_db: Optional[float]):
+        """Queue baking a measured loudness normalization gain into a cached track."""
+        if video_id and gain_db is not None and abs(gain_db) >= MIN_BAKED_GAIN_DB:
+            self.normalizer.submit(self.apply_gain, video_id, gain_db)
+
+    def apply_gain(self, video_id: str, gain_db: float):
+        """Re-encode a normalized cached track with gain_db applied, once, so passthrough can play it at unity gain."""
+        with self.lock:
+            item = self.entries.get(video_id)
+            # Queued before normalization finished, or already baked
+            if item is None or not item['file'].endswith(NORMALIZED_EXTENSION) or item.get('baked_gain_db'):
+                return
+            source_path = self.file_path(item)
+        target_path = os.path.join(self.directory, f"{video_id}{GAIN_EXTENSION}")
+        if self.convert(video_id, source_path, target_path, ['-af', f'volume={gain_db:.2f}dB', *OPUS_ENCODE_ARGS]):
+            self.replace_file(video_id, source_path, target_path, baked_gain_db=gain_db)
+            logging.info(f"Baked {gain_db:+.2f} dB into cached {video_id}")
+
+    def convert(self, video_id: str, source_path: str, target_path: str, codec_args) -> bool:
+        """Write source_path to target_path as Ogg with ffmpeg. Nothing is left behind on failure."""
+        part_path = f"{target_path}.part"
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-i', source_path, '-vn', '-map_metadata', '-1', *codec_args, '-f', 'ogg', part_path],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=NORMALIZE_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Could not convert cached {video_id}: {e}")
+            result = None
+        if result is None or result.returncode != 0:
+            if result is not None:
+                logging.error(f"ffmpeg failed to convert cached {video_id}: {result.stderr.decode(errors='replace')[-500:]}")
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            return False
+        os.replace(part_path, target_path)
+        return True
+
+    def replace_file(self, video_id: str, source_path: str, target_path: str, **attributes):
+        """Point the index at a converted file and remove the one it replaces."""
+        with self.lock:
+            item = self.entries.get(video_id)
+            if item is None:
+                # Evicted while converting
+                os.remove(target_path)
+                return
+            item.update(file=os.path.basename(target_path), size=os.path.getsize(target_path), acodec='opus', **attributes)
+            self.evict()
+            self.save()
+        try:
+            os.remove(source_path)
+        except OSError as e:
+            logging.warning(f"Could not remove replaced cache file {source_path}: {e}")
+
+    def evict(self):
+        """Remove least recently used tracks until the cache fits its quota. Caller holds the lock."""
+        total = sum(item['size'] for item in self.entries.values())
+        for video_id, item in sorted(self.entries.items(), key=lambda pair: pair[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.file_path(item))
+            except OSError as e:
+                logging.warning(f"Could not remove cached file {item['file']}: {e}")
+            total -= item['size']
+            del self.entries[video_id]
+            self.evictions += 1
+            logging.info(f"Evicted {video_id} from the audio cache")
+
+    def record_play(self, entry):
+        """Count a play and start a background download once the track is played often enough."""
+        video_id = extract_video_id(entry.video_url)
+        if not video_id:
+            return
+        with self.lock:
+            self.play_counts[video_id] = self.play_counts.get(video_id, 0) + 1
+            plays = self.play_counts[video_id]
+            self.save()
+        if plays >= self.play_threshold:
+            self.request_download(entry)
+
+    def request_download(self, entry):
+        video_id = extract_video_id(entry.video_url)
+        if not video_id or self.path_for(video_id) or video_id in self.downloading:
+            return
+        self.downloading.add(video_id)
+        asyncio.create_task(self.download(video_id, entry.video_url))
+
+    async def download(self, video_id: str, video_url: str):
+        try:
+            # Background downloads never act as the breaker's half-open probe
+            if youtube_breaker.state != 'closed':
+                logging.info(f"Skipping cache download of {video_id}, extraction is paused")
+                return
+            info = await asyncio.get_running_loop().run_in_executor(executor, self.download_sync, video_url)
+            if not info:
+                return
+            path = info.get('filepath') or next((d.get('filepath') for d in info.get('requested_downloads') or []), None)
+            if path and os.path.isfile(path):
+                self.add(video_id, path, info.get('acodec'))
+        except Exception as e:
+            logging.error(f"Failed to cache {video_id}: {e}")
+        finally:
+            self.downloading.discard(video_id)
+
+    def download_sync(self, video_url: str) -> Optional[dict]:
+        # The 'download' profile writes to AUDIO_CACHE_DIR as <video_id>.<ext>
+        with ytdl_pool.acquire('download') as ydl:
+            return ydl.extract_info(video_url, download=True)
+
+    def open_tee_stream(self, entry) -> Optional[TeeStream]:
+        """
+        Stream for playing an uncached YouTube track that caches it on the way.
+        None if the track is cached, is already being downloaded or tee'd, or is not a remote stream.
+        """
+        video_id = extract_video_id(entry.video_url)
+        if not video_id or not entry.best_audio_url.startswith('http'):
+            return None
+        if self.path_for(video_id) or video_id in self.downloading:
+            return None
+        final_path = os.path.join(self.directory, f"{video_id}.{stream_extension(entry.best_audio_url)}")
+        self.downloading.add(video_id)
+        try:
+            return TeeStream(entry.best_audio_url, f"{final_path}.part", final_path,
+                             lambda path: self.finish_tee(video_id, path, entry.audio_codec))
+        except OSError as e:
+            logging.error(f"Could not open tee cache file for {video_id}: {e}")
+            self.downloading.discard(video_id)
+            return None
+
+    def finish_tee(self, video_id: str, path: Optional[str], acodec: Optional[str]):
+        self.downloading.discard(video_id)
+        if path:
+            self.add(video_id, path, acodec)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'tracks': len(self.entries),
+                'bytes': sum(item['size'] for item in self.entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'downloading': len(self.downloading),
+            }
+
+
+audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024, AUDIO_CACHE_PLAY_THRESHOLD)
@@ -0,0 +1,604 @@
+import logging
+import mmap
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from discord import AudioSource
+
+logging.basicConfig(level=logging.DEBUG, filename='audio_sources.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+FRAME_LENGTH = 0.02  # seconds of audio per frame handed to discord.py
+PCM_FRAME_SIZE = 3840  # 20 ms of 48 kHz 16-bit stereo
+SAMPLES_PER_FRAME = 960  # per channel
+PCM_SILENCE = b'\x00' * PCM_FRAME_SIZE
+OPUS_SILENCE = b'\xf8\xff\xfe'
+PREFILL_TIMEOUT = 5.0  # seconds the first read waits for ffmpeg to produce audio
+VOLUME_RAMP_SECONDS = 0.1  # volume changes glide over this long instead of clicking
+MAX_VOLUME = 2.0
+STALL_SECONDS = 3.0  # a read-ahead underrun this long counts as a stalled stream
+EARLY_EOF_TOLERANCE = 3.0  # an EOF further than this from the expected end is premature
+MAX_FAILOVERS = 3  # per source, so a track that keeps failing still ends
+FAILOVER_TIMEOUT = 15.0  # seconds to wait for a replacement stream
+
+
+class PlaybackTelemetry:
+    """Buffer health counters for one guild, accumulated across tracks."""
+
+    def __init__(self):
+        self.underruns = 0
+        self.underrun_frames = 0
+        self.frames_served = 0
+        self.fill_level = 0
+        self.capacity = 0
+        self.last_recovery_time = 0.0
+        self.total_recovery_time = 0.0
+        self.mixed_frames = 0
+        self.mix_time = 0.0
+        self.gain_frames = 0
+        self.gain_time = 0.0
+        self.failovers = 0
+
+    def record_fill(self, fill_level: int, capacity: int):
+        self.frames_served += 1
+        self.fill_level = fill_level
+        self.capacity = capacity
+
+    def record_underrun(self, new_underrun: bool):
+        self.underrun_frames += 1
+        if new_underrun:
+            self.underruns += 1
+
+    def record_recovery(self, recovery_time: float):
+        self.last_recovery_time = recovery_time
+        self.total_recovery_time += recovery_time
+
+    def record_mix(self, elapsed: float):
+        self.mixed_frames += 1
+        self.mix_time += elapsed
+
+    def record_gain(self, elapsed: float):
+        self.gain_frames += 1
+        self.gain_time += elapsed
+
+    def record_failover(self):
+        self.failovers += 1
+
+    def summary(self) -> str:
+        fill_percent = 100 * self.fill_level / self.capacity if self.capacity else 0
+        average_recovery = self.total_recovery_time / self.underruns if self.underruns else 0
+        average_mix = 1e6 * self.mix_time / self.mixed_frames if self.mixed_frames else 0
+        average_gain = 1e6 * self.gain_time / self.gain_frames if self.gain_frames else 0
+        return (f"Buffer fill: {self.fill_level}/{self.capacity} frames ({fill_percent:.0f}%)\n"
+                f"Underruns: {self.underruns} ({self.underrun_frames * FRAME_LENGTH:.1f}s of silence inserted)\n"
+                f"Recovery time: last {self.last_recovery_time:.2f}s, average {average_recovery:.2f}s\n"
+                f"Crossfaded frames: {self.mixed_frames} (average {average_mix:.0f}µs per frame)\n"
+                f"Gain-scaled frames: {self.gain_frames} (average {average_gain:.0f}µs per frame)\n"
+                f"Stream failovers: {self.failovers}\n"
+                f"Frames served: {self.frames_served}")
+
+
+playback_telemetry: Dict[str, PlaybackTelemetry] = {}
+
+
+def get_playback_telemetry(guild_id) -> PlaybackTelemetry:
+    return playback_telemetry.setdefault(str(guild_id), PlaybackTelemetry())
+
+
+class ReadAheadSource(AudioSource):
+    """
+    Wraps an AudioSource and pre-reads its frames on a separate thread.
+
+    discord.py calls read() on the voice thread every 20 ms; serving it from a bounded
+    in-memory buffer keeps a stall in ffmpeg's input from turning into an audible gap.
+    If the buffer runs dry before the original source has ended, a silence frame is
+    returned instead of ending the track and the underrun is recorded.
+    """
+
+    def __init__(self, original: AudioSource, lookahead_seconds: float, telemetry: Optional[PlaybackTelemetry] = None):
+        self.original = original
+        self.capacity = max(1, int(lookahead_seconds / FRAME_LENGTH))
+        self.telemetry = telemetry or PlaybackTelemetry()
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.finished = False
+        self.closed = False
+        self.started = False
+        self.underrun_started_at = None
+        self.silence = OPUS_SILENCE if original.is_opus() else PCM_SILENCE
+        self.thread = threading.Thread(target=self.fill, daemon=True, name=f'read-ahead:{id(self):#x}')
+        self.thread.start()
+
+    def fill(self):
+        try:
+            while True:
+                with self.condition:
+                    while len(self.buffer) >= self.capacity and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                # Read outside the lock so read() never waits on ffmpeg
+                frame = self.original.read()
+                with self.condition:
+                    if not frame:
+                        self.finished = True
+                        self.condition.notify_all()
+                        return
+                    self.buffer.append(frame)
+                    self.condition.notify_all()
+        except Exception as e:
+            logging.error(f"Read-ahead thread stopped: {e}")
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def read(self) -> bytes:
+        with self.condition:
+            if not self.started:
+                # Let ffmpeg produce the first frame before the player starts pacing
+                self.condition.wait_for(lambda: self.buffer or self.finished or self.closed, timeout=PREFILL_TIMEOUT)
+                self.started = True
+
+            if self.buffer:
+                frame = self.buffer.popleft()
+                self.condition.notify_all()
+                if self.underrun_started_at is not None:
+                    self.telemetry.record_recovery(time.monotonic() - self.underrun_started_at)
+                    self.underrun_started_at = None
+                self.telemetry.record_fill(len(self.buffer), self.capacity)
+                return frame
+
+            if self.finished or self.closed:
+                return b''
+
+            new_underrun = self.underrun_started_at is None
+            if new_underrun:
+                self.underrun_started_at = time.monotonic()
+                logging.warning("Read-ahead buffer underrun, inserting silence")
+            self.telemetry.record_underrun(new_underrun)
+            return self.silence
+
+    def buffered_frames(self) -> int:
+        with self.condition:
+            return len(self.buffer)
+
+    def remaining_frames(self) -> Optional[int]:
+        """Frames left in the track once ffmpeg has finished, None while it is still producing."""
+        with self.condition:
+            return len(self.buffer) if self.finished else None
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self):
+        with self.condition:
+            self.closed = True
+            self.buffer.clear()
+            self.condition.notify_all()
+        self.original.cleanup()
+
+
+class FailoverSource(AudioSource):
+    """
+    Watches the decoding stage of a remote stream and replaces it when the stream fails.
+
+    A stall (the read-ahead buffer empty for STALL_SECONDS) or an EOF more than
+    EARLY_EOF_TOLERANCE before expected_end calls request_replacement(position) with
+    the seconds of audio actually played. It returns a Future for a new stage that
+    starts at that position. Silence is played until the Future resolves, then the new
+    stage is spliced in under the gain and crossfade stages, so the track carries on.
+    After MAX_FAILOVERS, or without a replacement after FAILOVER_TIMEOUT, a premature
+    EOF ends the track as it did before.
+    """
+
+    def __init__(self, original: AudioSource, start_offset: float, expected_end: float,
+                 request_replacement: Callable[[float], Future], telemetry: Optional[PlaybackTelemetry] = None):
+        self.original = original
+        self.position = start_offset
+        self.expected_end = expected_end
+        self.request_replacement = request_replacement
+        self.telemetry = telemetry or PlaybackTelemetry()
+        self.silence = OPUS_SILENCE if original.is_opus() else PCM_SILENCE
+        self.pending: Optional[Future] = None
+        self.pending_since = 0.0
+        self.failovers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def stalled(self) -> bool:
+        read_ahead = find_source(self.original, ReadAheadSource)
+        underrun_started_at = read_ahead.underrun_started_at if read_ahead else None
+        return underrun_started_at is not None and time.monotonic() - underrun_started_at >= STALL_SECONDS
+
+    def start_failover(self, reason: str) -> bool:
+        if self.pending is not None or self.failovers >= MAX_FAILOVERS:
+            return False
+        self.failovers += 1
+        self.telemetry.record_failover()
+        logging.warning(f"Stream {reason} at {self.position:.1f}s, requesting a replacement (attempt {self.failovers})")
+        self.pending = self.request_replacement(self.position)
+        self.pending_since = time.monotonic()
+        return True
+
+    def splice_replacement(self) -> bool:
+        """Swap in the pending replacement once it is ready. False while it is still being prepared."""
+        if not self.pending.done():
+            if time.monotonic() - self.pending_since < FAILOVER_TIMEOUT:
+                return False
+            logging.error(f"No replacement stream after {FAILOVER_TIMEOUT:.0f}s, continuing with the failed one")
+            self.pending.add_done_callback(discard_replacement)
+            self.pending = None
+            return True
+        try:
+            replacement = self.pending.result()
+        except Exception as e:
+            logging.error(f"Replacement stream failed: {e}")
+            replacement = None
+        self.pending = None
+        if replacement is None or replacement.is_opus() != self.original.is_opus():
+            if replacement is not None:
+                replacement.cleanup()
+            return True
+        with self.lock:
+            if self.closed:
+                replacement.cleanup()
+                return True
+            failed, self.original = self.original, replacement
+        failed.cleanup()
+        logging.info(f"Resumed on a replacement stream at {self.position:.1f}s")
+        return True
+
+    def read(self) -> bytes:
+        if self.closed:
+            return b''
+        if self.pending is not None and not self.splice_replacement():
+            return self.silence
+        original = self.original
+        frame = original.read()
+        if not frame:
+            if self.closed:
+                return b''
+            if self.expected_end and self.position < self.expected_end - EARLY_EOF_TOLERANCE and self.start_failover('ended early'):
+                return self.silence
+            return b''
+        if frame is getattr(original, 'silence', None):
+            # Underrun filler from the read-ahead buffer, not part of the track
+            if self.stalled():
+                self.start_failover('stalled')
+            return frame
+        self.position += FRAME_LENGTH
+        return frame
+
+    def remaining_frames(self) -> Optional[int]:
+        remaining_frames = getattr(self.original, 'remaining_frames', None)
+        return remaining_frames() if remaining_frames and self.pending is None else None
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self):
+        with self.lock:
+            self.closed = True
+            original = self.original
+        if self.pending is not None:
+            self.pending.add_done_callback(discard_replacement)
+        original.cleanup()
+
+
+def discard_replacement(future: Future):
+    """Done callback for a replacement stream that is no longer wanted."""
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        future.result().cleanup()
+
+
+# Gain curves for the outgoing track over a crossfade, t running from 0 to 1.
+# The incoming track uses the same curve mirrored, curve(1 - t).
+CROSSFADE_CURVES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'linear': lambda t: 1.0 - t,
+    'equal_power': lambda t: np.cos(t * (np.pi / 2)),  # constant loudness for uncorrelated tracks
+    'exponential': lambda t: (1.0 - t) ** 2,  # drops the outgoing track quickly
+}
+
+
+def pcm_to_array(frame: bytes) -> np.ndarray:
+    """A 20 ms PCM frame as a (960, 2) float32 array, zero padded if the frame is short."""
+    samples = np.frombuffer(frame, dtype=np.int16)
+    if samples.size < SAMPLES_PER_FRAME * 2:
+        samples = np.pad(samples, (0, SAMPLES_PER_FRAME * 2 - samples.size))
+    return samples.reshape(-1, 2).astype(np.float32)
+
+
+def array_to_pcm(samples: np.ndarray) -> bytes:
+    return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+
+
+class CrossfadeSource(AudioSource):
+    """
+    Blends the tail of one PCM track with the head of the next.
+
+    The next track's source is attached with set_next() while this one is still
+    playing, normally the source pre-spawned for gapless playback. Once fewer than
+    fade_frames remain, each read() mixes one frame of both tracks with the curve's
+    gains in a single vectorized step. The frames read from the next source are
+    consumed, so when this source ends the next one carries on from where the
+    crossfade left it.
+
+    The remaining length comes from the read-ahead buffer once ffmpeg has finished,
+    otherwise from the expected frame count of the entry's duration.
+    """
+
+    def __init__(self, original: AudioSource, fade_seconds: float, curve: str = 'equal_power',
+                 expected_frames: int = 0, read_ahead: Optional[AudioSource] = None,
+                 telemetry: Optional[PlaybackTelemetry] = None):
+        if original.is_opus():
+            raise ValueError("CrossfadeSource needs a PCM source")
+        self.original = original
+        self.fade_frames = max(1, int(fade_seconds / FRAME_LENGTH))
+        self.curve = CROSSFADE_CURVES.get(curve, CROSSFADE_CURVES['equal_power'])
+        self.expected_frames = expected_frames
+        self.read_ahead = read_ahead
+        self.telemetry = telemetry or PlaybackTelemetry()
+        self.frames_read = 0
+        self.next_source: Optional[AudioSource] = None
+        self.fade_position = 0
+        self.lock = threading.Lock()
+
+    def set_next(self, next_source: Optional[AudioSource]):
+        with self.lock:
+            self.next_source = next_source
+            self.fade_position = 0
+
+    def remaining_frames(self) -> Optional[int]:
+        if self.read_ahead is not None:
+            remaining = self.read_ahead.remaining_frames()
+            if remaining is not None:
+                return remaining
+        if self.expected_frames:
+            return max(0, self.expected_frames - self.frames_read)
+        return None
+
+    def gains(self, remaining: int):
+        """Per-sample gains for the outgoing and incoming track across the next frame."""
+        # remaining excludes the frame being mixed, so the incoming track reaches full gain on the last one
+        fade_frames = self.fade_position + remaining + 1
+        start = self.fade_position * SAMPLES_PER_FRAME
+        t = (start + np.arange(1, SAMPLES_PER_FRAME + 1, dtype=np.float32)) / (fade_frames * SAMPLES_PER_FRAME)
+        return self.curve(t)[:, None], self.curve(1.0 - t)[:, None]
+
+    def read(self) -> bytes:
+        frame = self.original.read()
+        if not frame:
+            return b''
+        self.frames_read += 1
+
+        with self.lock:
+            next_source = self.next_source
+            remaining = self.remaining_frames()
+            if next_source is None or remaining is None or remaining >= self.fade_frames:
+                return frame
+
+            next_frame = next_source.read()
+            if not next_frame:
+                return frame
+            started = time.perf_counter()
+            fade_out, fade_in = self.gains(remaining)
+            mixed = array_to_pcm(pcm_to_array(frame) * fade_out + pcm_to_array(next_frame) * fade_in)
+            self.fade_position += 1
+            self.telemetry.record_mix(time.perf_counter() - started)
+            return mixed[:len(frame)] if len(frame) < PCM_FRAME_SIZE else mixed
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        # The next source is owned by whoever attached it and keeps playing after this one
+        self.original.cleanup()
+
+
+class GainSource(AudioSource):
+    """
+    Scales 16-bit PCM by a volume factor with NumPy, replacing discord.py's
+    PCMVolumeTransformer and its dependency on audioop (removed in Python 3.13).
+
+    Each frame is scaled and clipped in one vectorized pass. set_volume() ramps
+    the gain over VOLUME_RAMP_SECONDS so changes mid-track do not click. Frames
+    at unity gain are passed through untouched. track_gain is a fixed per-track
+    factor, such as loudness normalization, applied on top of the volume.
+    """
+
+    def __init__(self, original: AudioSource, volume: float = 1.0, track_gain: float = 1.0,
+                 telemetry: Optional[PlaybackTelemetry] = None):
+        if original.is_opus():
+            raise ValueError("GainSource needs a PCM source")
+        self.original = original
+        self.telemetry = telemetry or PlaybackTelemetry()
+        self.track_gain = track_gain
+        self.user_volume = self.clamp(volume)
+        self.gain = self.target = self.user_volume * track_gain
+        self.ramp_frames = max(1, int(VOLUME_RAMP_SECONDS / FRAME_LENGTH))
+        self.step = 0.0
+
+    @staticmethod
+    def clamp(volume: float) -> float:
+        return min(max(float(volume), 0.0), MAX_VOLUME)
+
+    @property
+    def volume(self) -> float:
+        return self.user_volume
+
+    @volume.setter
+    def volume(self, value: float):
+        self.set_volume(value)
+
+    def set_volume(self, volume: float):
+        self.user_volume = self.clamp(volume)
+        self.target = self.user_volume * self.track_gain
+        self.step = (self.target - self.gain) / self.ramp_frames
+
+    def read(self) -> bytes:
+        frame = self.original.read()
+        if not frame:
+            return b''
+        # Copy the floats so a concurrent set_volume() cannot tear a frame
+        gain, target, step = self.gain, self.target, self.step
+        if gain == target == 1.0:
+            return frame
+
+        started = time.perf_counter()
+        samples = np.frombuffer(frame, dtype=np.int16)
+        if gain == target:
+            scaled = samples * np.float32(gain)
+        else:
+            next_gain = min(gain + step, target) if step > 0 else max(gain + step, target)
+            # Interleaved stereo: each pair of samples shares one ramp value
+            ramp = np.repeat(np.linspace(gain, next_gain, samples.size // 2, dtype=np.float32), 2)
+            scaled = samples * ramp[:samples.size]
+            self.gain = next_gain
+        frame = np.clip(scaled, -32768, 32767).astype(np.int16).tobytes()
+        self.telemetry.record_gain(time.perf_counter() - started)
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self.original.cleanup()
+
+
+def find_source(source: Optional[AudioSource], source_type) -> Optional[AudioSource]:
+    """Walk a chain of wrapping sources (via .original) and return the first of source_type (a type or tuple of types)."""
+    while source is not None:
+        if isinstance(source, source_type):
+            return source
+        source = getattr(source, 'original', None)
+    return None
+
+
+# Frame length in ms for each Opus TOC configuration (RFC 6716 section 3.1)
+OPUS_FRAME_MS = [10, 20, 40, 60] * 3 + [10, 20] * 2 + [2.5, 5, 10, 20] * 4
+
+
+def opus_packet_duration_ms(packet: bytes) -> float:
+    toc = packet[0]
+    frame_ms = OPUS_FRAME_MS[toc >> 3]
+    code = toc & 0x3
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3f if len(packet) > 1 else 0
+    return frame_ms * frames
+
+
+class OggOpusSource(AudioSource):
+    """
+    Plays an Ogg/Opus file by handing its Opus packets straight to discord.py.
+
+    The file is memory-mapped and its page headers are parsed into a packet index as
+    playback reaches them. Playback then needs no ffmpeg process and no decode or
+    encode; each read() is a slice of the mapped file. discord.py sends one packet per
+    20 ms, so the file must contain 20 ms packets, which is what the audio cache's
+    normalization writes. Construction only reads the headers and the first audio
+    packet, so it does not stall the event loop on a long track; anything but Ogg/Opus
+    with 20 ms packets there raises ValueError so the caller can fall back to ffmpeg.
+    The rest is checked on the audio thread as it is read, and playback ends at the
+    first invalid page or packet.
+    start_packet and end_packet bound playback, e.g. to skip leading and trailing silence.
+    """
+
+    def __init__(self, path: str, start_packet: int = 0, end_packet: Optional[int] = None):
+        self.path = path
+        self.packets: List[List[Tuple[int, int]]] = []
+        self.partial: List[Tuple[int, int]] = []
+        self.next_page = 0  # byte offset of the first page not indexed yet
+        # The first two packets are the OpusHead and OpusTags headers
+        self.position = 2 + max(0, start_packet)
+        self.end = None if end_packet is None else 2 + end_packet
+        # Set before anything can fail, since discord.py's AudioSource.__del__ calls cleanup()
+        self.lock = threading.Lock()
+        self.map = self.file = None
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.validate()
+        except Exception:
+            self.close()
+            raise
+
+    def index_packets(self, count: float) -> bool:
+        """
+        Extend the index until it holds count packets. Returns False if the file ends first.
+        A packet split across pages has several byte ranges.
+        """
+        size = len(self.map)
+        while len(self.packets) < count and self.next_page + 27 <= size:
+            position = self.next_page
+            if self.map[position:position + 4] != b'OggS':
+                raise ValueError(f"Invalid Ogg page at byte {position} in {self.path}")
+            segment_count = self.map[position + 26]
+            lacing = self.map[position + 27:position + 27 + segment_count]
+            data = position + 27 + segment_count
+            for lace in lacing:
+                self.partial.append((data, data + lace))
+                data += lace
+                if lace < 255:
+                    self.packets.append(self.partial)
+                    self.partial = []
+            self.next_page = data
+        return len(self.packets) >= count
+
+    def packet(self, index: int) -> bytes:
+        ranges = self.packets[index]
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            return self.map[start:end]
+        return b''.join(self.map[start:end] for start, end in ranges)
+
+    def validate(self):
+        self.index_packets(3)
+        if len(self.packets) < 2 or not self.packet(0).startswith(b'OpusHead'):
+            raise ValueError(f"{self.path} is not an Ogg/Opus file")
+        if len(self.packets) > 2:
+            self.check_duration(self.packet(2))
+
+    def check_duration(self, packet: bytes):
+        if packet and opus_packet_duration_ms(packet) != 20:
+            raise ValueError(f"{self.path} has {opus_packet_duration_ms(packet)} ms packets, expected 20 ms")
+
+    @property
+    def packet_count(self) -> int:
+        self.index_packets(float('inf'))
+        return len(self.packets) - 2
+
+    def read(self) -> bytes:
+        with self.lock:
+            try:
+                while (self.end is None or self.position < self.end) and self.index_packets(self.position + 1):
+                    packet = self.packet(self.position)
+                    self.position += 1
+                    if packet:
+                        self.check_duration(packet)
+                        return packet
+            except ValueError as e:
+                # An invalid page or packet, or the mapping closed by cleanup() from another thread
+                if not self.map.closed:
+                    logging.error(f"Stopped playing {self.path}: {e}")
+                self.end = self.position
+            return b''
+
+    def is_opus(self) -> bool:
+        return True
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+    def cleanup(self):
+        with self.lock:
+            self.end = self.position
+            self.close()
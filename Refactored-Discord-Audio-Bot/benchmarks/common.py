@@ -0,0 +1,95 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The benchmarks measure the bot's real audio classes, so they need the bot's
+requirements (discord.py with libopus, numpy) and, where a script decodes audio,
+ffmpeg on the PATH. Run them from the bot directory, e.g. python benchmarks/gain_stage.py.
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from discord import AudioSource  # noqa: E402
+
+FRAME_SIZE = 3840  # 20 ms of 48 kHz 16-bit stereo, as discord.py reads it
+FRAME_SECONDS = 0.02
+
+
+def require_ffmpeg():
+    if shutil.which('ffmpeg') is None:
+        sys.exit("This benchmark needs ffmpeg on the PATH.")
+
+
+def make_test_track(directory: str, seconds: float) -> str:
+    """An Opus/WebM file like the ones YouTube serves (format 251), generated once per directory."""
+    path = os.path.join(directory, f'benchmark-{seconds:g}s.webm')
+    if not os.path.exists(path):
+        # Pink noise keeps the encoder busy the way music does; a sine would be unrealistically cheap
+        subprocess.run(
+            ['ffmpeg', '-nostdin', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'anoisesrc=color=pink:duration={seconds}:sample_rate=48000',
+             '-ac', '2', '-c:a', 'libopus', '-b:a', '160k', path],
+            check=True,
+        )
+    return path
+
+
+def pcm_frames(count: int, seed: int = 0) -> Iterator[bytes]:
+    """count frames of random 16-bit stereo PCM at roughly music level."""
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        yield (rng.standard_normal(FRAME_SIZE // 2) * 6000).clip(-32768, 32767).astype(np.int16).tobytes()
+
+
+class FrameSource(AudioSource):
+    """A PCM AudioSource that replays pre-built frames from memory, so no ffmpeg time is measured."""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+        self.position = 0
+
+    def read(self) -> bytes:
+        if self.position >= len(self.frames):
+            return b''
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        pass
+
+
+def per_frame_seconds(make_source: Callable[[], object], frames: int, repeats: int = 5) -> float:
+    """Best of repeats: seconds per read() of a fresh source from make_source, over frames reads."""
+    best = float('inf')
+    for _ in range(repeats):
+        source = make_source()
+        started = time.perf_counter()
+        for _ in range(frames):
+            source.read()
+        best = min(best, (time.perf_counter() - started) / frames)
+    return best
+
+
+def cpu_seconds() -> Tuple[float, float]:
+    """(this process, finished child processes) CPU time, user plus system."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def describe_frame_cost(name: str, seconds: float) -> str:
+    """One result line: cost per frame, share of the 20 ms frame budget, and streams one core could sustain."""
+    return (f"{name:<34} {seconds * 1e6:8.1f} us/frame  {seconds / FRAME_SECONDS:7.3%} of a frame  "
+            f"~{int(FRAME_SECONDS / seconds) if seconds else 0:>6} streams/core")
@@ -0,0 +1,43 @@
+"""
+Per-frame cost of CrossfadeSource, the NumPy mixer that blends two PCM tracks.
+
+Reads 20 ms frames from in-memory PCM sources, so only the mixing is measured,
+not ffmpeg. The baseline is the same source outside a crossfade, where read()
+hands the frame through. Each line also gives the share of the 20 ms frame
+budget one mixed frame takes and how many guilds crossfading at the same moment
+one core could keep up with.
+
+Usage: python benchmarks/crossfade_mixer.py [--frames 2000]
+"""
+import argparse
+
+from common import FrameSource, describe_frame_cost, pcm_frames, per_frame_seconds
+
+from audio_sources import CROSSFADE_CURVES, CrossfadeSource
+
+
+def crossfade(outgoing, incoming, frames: int, curve: str, mixing: bool) -> CrossfadeSource:
+    # Mixing: the whole run lies inside the fade. Otherwise the fade would start long after the run ends.
+    fade_seconds = (frames + 1) * 0.02 if mixing else 1.0
+    expected_frames = frames if mixing else frames * 10
+    source = CrossfadeSource(FrameSource(outgoing), fade_seconds, curve, expected_frames=expected_frames)
+    source.set_next(FrameSource(incoming))
+    return source
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=2000)
+    args = parser.parse_args()
+    outgoing = list(pcm_frames(args.frames, seed=1))
+    incoming = list(pcm_frames(args.frames, seed=2))
+
+    results = {'outside a fade': per_frame_seconds(lambda: crossfade(outgoing, incoming, args.frames, 'linear', False), args.frames)}
+    for curve in CROSSFADE_CURVES:
+        results[f'mixing, {curve}'] = per_frame_seconds(lambda: crossfade(outgoing, incoming, args.frames, curve, True), args.frames)
+    for name, seconds in results.items():
+        print(describe_frame_cost(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
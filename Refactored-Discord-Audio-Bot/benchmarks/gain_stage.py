@@ -0,0 +1,55 @@
+"""
+Per-frame cost of GainSource, the NumPy volume stage, against PCMVolumeTransformer.
+
+discord.py's PCMVolumeTransformer scales each frame with audioop.mul, which
+Python 3.13 removed; on such an interpreter only GainSource is measured. Frames
+come from memory, so ffmpeg is not part of the figures.
+
+Usage: python benchmarks/gain_stage.py [--frames 5000]
+"""
+import argparse
+
+from common import FrameSource, describe_frame_cost, pcm_frames, per_frame_seconds
+
+from audio_sources import GainSource
+
+try:
+    from discord import PCMVolumeTransformer
+    import audioop  # noqa: F401  PCMVolumeTransformer fails on its first read without it
+except ImportError:
+    PCMVolumeTransformer = None
+
+
+class Ramping:
+    """A GainSource whose volume changes every frame, so every read takes the ramp path."""
+
+    def __init__(self, frames):
+        self.source = GainSource(FrameSource(frames), 0.5)
+        self.reads = 0
+
+    def read(self) -> bytes:
+        self.reads += 1
+        self.source.set_volume(1.5 if self.reads % 2 else 0.5)
+        return self.source.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=5000)
+    args = parser.parse_args()
+    frames = list(pcm_frames(args.frames))
+
+    results = {}
+    if PCMVolumeTransformer is not None:
+        results['PCMVolumeTransformer, 75%'] = per_frame_seconds(lambda: PCMVolumeTransformer(FrameSource(frames), 0.75), args.frames)
+    else:
+        print("audioop is not available on this Python, skipping PCMVolumeTransformer")
+    results['GainSource, 75%'] = per_frame_seconds(lambda: GainSource(FrameSource(frames), 0.75), args.frames)
+    results['GainSource, ramping'] = per_frame_seconds(lambda: Ramping(frames), args.frames)
+    results['GainSource, 100% (pass-through)'] = per_frame_seconds(lambda: GainSource(FrameSource(frames), 1.0), args.frames)
+    for name, seconds in results.items():
+        print(describe_frame_cost(name, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+CPU per concurrent stream: PLAYBACK_MODE=pcm against PLAYBACK_MODE=passthrough.
+
+pcm decodes the Opus/WebM stream to PCM in ffmpeg, scales it in Python
+(discord.py's PCMVolumeTransformer, the pre-passthrough path, and the bot's
+GainSource) and encodes every 20 ms frame to Opus with libopus in this process.
+passthrough has ffmpeg remux the Opus packets (codec copy), or encode them itself
+when a volume other than 100% has to be applied, and hands packets over unchanged.
+
+Each stream is read as fast as it is produced rather than in real time, so the
+result is CPU milliseconds per second of audio: thousandths of a core that one
+real-time stream keeps busy. ffmpeg warns
+that -b:a is unused in the codec copy case; discord.py always passes it.
+
+Usage: python benchmarks/passthrough_cpu.py [--streams 1 4 8] [--seconds 60]
+"""
+import argparse
+import tempfile
+import threading
+
+from common import cpu_seconds, make_test_track, require_ffmpeg
+
+from discord import FFmpegOpusAudio, FFmpegPCMAudio, PCMVolumeTransformer
+from discord.opus import Encoder
+
+from audio_sources import GainSource
+
+SAMPLES_PER_FRAME = 960
+
+
+def pcm_stream(path: str, gain_stage: str):
+    source = FFmpegPCMAudio(path, options='-vn')
+    source = PCMVolumeTransformer(source, volume=0.75) if gain_stage == 'audioop' else GainSource(source, 0.75)
+    encoder = Encoder()
+    try:
+        while frame := source.read():
+            encoder.encode(frame, SAMPLES_PER_FRAME)
+    finally:
+        source.cleanup()
+
+
+def passthrough_stream(path: str, copy: bool):
+    # As in create_audio_source: no codec means ffmpeg encodes, which a volume filter needs
+    if copy:
+        source = FFmpegOpusAudio(path, codec='copy', options='-vn')
+    else:
+        source = FFmpegOpusAudio(path, options='-vn -af volume=0.75')
+    try:
+        while source.read():
+            pass
+    finally:
+        source.cleanup()
+
+
+def measure(streams: int, run_stream):
+    """Run streams copies of run_stream at once; (bot process, ffmpeg) CPU seconds."""
+    own_before, children_before = cpu_seconds()
+    threads = [threading.Thread(target=run_stream) for _ in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    own_after, children_after = cpu_seconds()
+    return own_after - own_before, children_after - children_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seconds', type=float, default=60.0, help='length of the generated test track')
+    args = parser.parse_args()
+    require_ffmpeg()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_test_track(directory, args.seconds)
+        modes = {
+            'pcm (PCMVolumeTransformer)': lambda: pcm_stream(path, 'audioop'),
+            'pcm (GainSource)': lambda: pcm_stream(path, 'numpy'),
+            'passthrough (encode, volume 75%)': lambda: passthrough_stream(path, False),
+            'passthrough (copy)': lambda: passthrough_stream(path, True),
+        }
+        print(f"{'mode':<34} {'streams':>7} {'bot ms/s':>9} {'ffmpeg ms/s':>11} {'total ms/s':>10} {'vs pcm':>7}")
+        for streams in args.streams:
+            baseline = None
+            for name, run_stream in modes.items():
+                own, children = measure(streams, run_stream)
+                audio_seconds = args.seconds * streams
+                total = (own + children) / audio_seconds
+                baseline = baseline or total
+                print(f"{name:<34} {streams:>7} {own / audio_seconds * 1000:9.2f} {children / audio_seconds * 1000:11.2f} "
+                      f"{total * 1000:10.2f} {baseline / total:6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Load test for the voice worker pool (VOICE_WORKERS): PCM streams per node against worker count.
+
+Every stream runs the PCM pipeline, ffmpeg decode -> GainSource -> Opus encode,
+on the same generated track and is drained as fast as it produces packets. With
+0 workers the pipelines run as threads in this process, like VOICE_WORKERS=0;
+otherwise they go through VoiceWorkerPool, guild i pinned to worker i % workers.
+
+Capacity is seconds of audio produced per wall-clock second across all streams:
+how many real-time streams the node could sustain. It should grow with the
+worker count up to the number of cores and stay flat with in-process threads,
+whose Python-side work shares one interpreter.
+
+Usage: python benchmarks/voice_workers_load.py [--streams 8] [--workers 0 1 2 4] [--seconds 30]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from common import make_test_track, require_ffmpeg
+
+from discord import FFmpegPCMAudio
+from discord.opus import Encoder
+
+from audio_sources import SAMPLES_PER_FRAME, GainSource
+from voice_workers import VoiceWorkerPool
+
+
+def spec(path: str) -> dict:
+    return {'input': path, 'before_options': None, 'options': '-vn', 'volume': 0.75, 'track_gain': 1.0, 'bitrate': 128}
+
+
+def in_process_stream(path: str) -> int:
+    source = GainSource(FFmpegPCMAudio(path, options='-vn'), 0.75)
+    encoder = Encoder()
+    packets = 0
+    try:
+        while frame := source.read():
+            encoder.encode(frame, SAMPLES_PER_FRAME)
+            packets += 1
+    finally:
+        source.cleanup()
+    return packets
+
+
+def worker_stream(pool: VoiceWorkerPool, guild_id: int, path: str) -> int:
+    source = pool.open_stream(guild_id, spec(path))
+    packets = 0
+    try:
+        while source.read():
+            packets += 1
+    finally:
+        source.cleanup()
+    return packets
+
+
+def run(workers: int, streams: int, path: str) -> float:
+    """Seconds of audio produced per wall-clock second by streams concurrent pipelines."""
+    pool = VoiceWorkerPool(workers) if workers else None
+    if pool:
+        # Start the processes before timing, as the bot keeps them running between tracks
+        for guild_id in range(workers):
+            pool.worker_for(guild_id)
+    packets = [0] * streams
+
+    def play(index: int):
+        packets[index] = worker_stream(pool, index, path) if pool else in_process_stream(path)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=play, args=(index,)) for index in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if pool:
+        for worker in pool.workers:
+            worker.send(('shutdown', 0, None))
+            worker.process.join(5)
+    return sum(packets) * 0.02 / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--seconds', type=float, default=30.0, help='length of the generated test track')
+    args = parser.parse_args()
+    require_ffmpeg()
+
+    print(f"{os.cpu_count()} cores, {args.streams} streams of {args.seconds:g}s")
+    print(f"{'workers':>7} {'real-time streams':>18} {'vs first row':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_test_track(directory, args.seconds)
+        baseline = None
+        for workers in args.workers:
+            capacity = run(workers, args.streams, path)
+            baseline = baseline or capacity
+            print(f"{workers:>7} {capacity:18.1f} {capacity / baseline:12.2f}x")
+
+
+if __name__ == '__main__':
+    main()
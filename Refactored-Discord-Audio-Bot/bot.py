@@ -1,37 +1,44 @@
 import logging
 from discord.ext import commands
-from config import DISCORD_TOKEN
+from config import DISCORD_TOKEN, LOUDNESS_NORMALIZATION, SILENCE_TRIM, SHARD_COUNT, SHARD_ID
 from commands import setup_commands
-from queue_manager import BotQueue, QueueEntry
-from button_view import ButtonView
-from discord import Intents, PCMVolumeTransformer
+from queue_manager import BotQueue, queue_manager
+from audio_analysis import AudioAnalyzer
+from ffmpeg_supervisor import ffmpeg_supervisor
+from playback_state import get_playback_state
+from playback import PlaybackManager
+from button_view import dispatch_button
+from discord import Intents
 
 logging.basicConfig(level=logging.DEBUG, filename='bot.log', format='%(asctime)s:%(levelname)s:%(message)s')
 
 class AudioBot(commands.Bot):
     def __init__(self, command_prefix, intents):
         logging.debug("Initializing AudioBot")
-        super().__init__(command_prefix, intents=intents, help_command=None)
+        # Under launcher.py every process connects as one shard of SHARD_COUNT
+        shard_options = {'shard_id': SHARD_ID, 'shard_count': SHARD_COUNT} if SHARD_COUNT > 1 else {}
+        super().__init__(command_prefix, intents=intents, help_command=None, **shard_options)
         self.queue_manager = BotQueue()
-        self.message_views = {}
-        self.now_playing_messages = []
 
     async def setup_hook(self):
         logging.debug("Setting up hook for AudioBot")
-        dummy_entry = QueueEntry(video_url='', best_audio_url='', title='dummy', is_playlist=False, guild_id=None)
-        self.add_view(ButtonView(self, dummy_entry))
         await setup_commands(self)
-        await self.tree.sync()
+        # Slash commands are global, one shard registering them is enough
+        if SHARD_ID == 0:
+            await self.tree.sync()
+        if LOUDNESS_NORMALIZATION or SILENCE_TRIM:
+            self.audio_analyzer = AudioAnalyzer(queue_manager)
+            self.audio_analyzer.start()
 
     async def on_ready(self):
         logging.info(f'{self.user} is now connected and ready.')
         print(f'{self.user} is now connected and ready.')
 
-    async def on_message(self, message):
-        view = self.message_views.get(message.id)
-        if view:
-            await message.edit(view=view)
+    async def on_interaction(self, interaction):
+        # Now playing buttons carry everything in their custom IDs, so they work across restarts
+        await dispatch_button(self, interaction)
 
+    async def on_message(self, message):
         # Check for mp3_list command trigger
         if message.content.startswith(".mp3_list"):
             ctx = await self.get_context(message)
@@ -50,19 +57,14 @@ class AudioBot(commands.Bot):
             await self.invoke(ctx)
             print("voice_listen command triggered")
 
-    def add_now_playing_message(self, message_id):
-        self.now_playing_messages.append(message_id)
-
-    def clear_now_playing_messages(self):
-        self.now_playing_messages.clear()
-
     async def on_voice_state_update(self, member, before, after):
-        if after.channel is not None:
-            voice_client = self.get_guild(member.guild.id).voice_client
-            if voice_client and voice_client.channel == after.channel:
-                # Ensure volume is set to 50% if not already
-                if voice_client.source and isinstance(voice_client.source, PCMVolumeTransformer):
-                    voice_client.source.volume = 0.5
+        # The bot left or was removed from voice: nothing will read its ffmpeg processes any more
+        if member.id == self.user.id and before.channel is not None and after.channel is None:
+            playback_manager = PlaybackManager(queue_manager)
+            playback_manager.cancel_next_source_preparation(str(member.guild.id))
+            playback_manager.discard_prepared_source(str(member.guild.id))
+            ffmpeg_supervisor.kill_guild(member.guild.id)
+            get_playback_state(member.guild.id).transition('idle')
 
 if __name__ == '__main__':
     intents = Intents.default()
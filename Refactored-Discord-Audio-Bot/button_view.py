@@ -1,12 +1,14 @@
 import logging
-import uuid
-import asyncio
 
-from discord import ButtonStyle, Interaction, User
+from discord import ButtonStyle, Interaction, InteractionType, User
 from discord.ui import Button, View
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from queue_manager import queue_manager, QueueEntry
-from utils import create_now_playing_embed, schedule_progress_bar_update
+from utils import create_now_playing_embed
+from now_playing_scheduler import now_playing_scheduler
+from now_playing_registry import now_playing_registry
+from playback_state import get_playback_state
+from config import SEEK_STEP_SECONDS
 from view_functions import (
     handle_lyrics_button,
     handle_loop_button,
@@ -16,6 +18,8 @@ from view_functions import (
     handle_stop_button,
     handle_skip_button,
     handle_restart_button,
+    handle_rewind_button,
+    handle_fast_forward_button,
     handle_shuffle_button,
     handle_list_queue_button,
     handle_remove_button,
@@ -28,70 +32,121 @@ from view_functions import (
 
 logging.basicConfig(level=logging.DEBUG, filename='views.log', format='%(asctime)s:%(levelname)s:%(message)s')
 
+BUTTON_ID_PREFIX = 'np'
+
+# action -> handler(interaction, entry, button_view); the action is the second part of the custom ID
+BUTTON_HANDLERS = {
+    'pause': handle_pause_button,
+    'resume': handle_resume_button,
+    'stop': handle_stop_button,
+    'skip': handle_skip_button,
+    'restart': handle_restart_button,
+    'rewind': handle_rewind_button,
+    'fast_forward': handle_fast_forward_button,
+    'shuffle': handle_shuffle_button,
+    'list_queue': handle_list_queue_button,
+    'remove': handle_remove_button,
+    'previous': handle_previous_button,
+    'loop': handle_loop_button,
+    'move_up': handle_move_up_button,
+    'move_down': handle_move_down_button,
+    'move_to_top': handle_move_to_top_button,
+    'move_to_bottom': handle_move_to_bottom_button,
+    'favorite': handle_favorite_button,
+    'lyrics': handle_lyrics_button,
+}
+
+
+def entry_key(entry: QueueEntry) -> str:
+    """Short ID of an entry that is the same after a restart, and differs between entries of the same URL."""
+    return entry.entry_id
+
+
+def button_custom_id(action: str, guild_id, entry: QueueEntry) -> str:
+    return f"{BUTTON_ID_PREFIX}:{action}:{guild_id}:{entry_key(entry)}"
+
+
+def parse_button_custom_id(custom_id: str) -> Optional[Tuple[str, str, str]]:
+    """(action, guild_id, entry key) of a now playing button, None for any other component."""
+    parts = custom_id.split(':')
+    if len(parts) != 4 or parts[0] != BUTTON_ID_PREFIX or parts[1] not in BUTTON_HANDLERS:
+        return None
+    return parts[1], parts[2], parts[3]
+
+
+def find_entry(guild_id: str, key: str) -> Optional[QueueEntry]:
+    candidates = [get_playback_state(guild_id).entry] + queue_manager.get_queue(guild_id)
+    return next((entry for entry in candidates if entry is not None and entry_key(entry) == key), None)
+
 
 class ButtonView(View):
-    def __init__(self, bot, entry: QueueEntry, paused: bool = False, current_user: Optional[User] = None):
+    """
+    The controls of a guild's now playing message, built once per guild and reused.
+
+    Custom IDs are np:<action>:<guild id>:<entry key>, so they are the same for the
+    same queue entry after a restart, and differ for two entries of the same track. Presses are not handled by per-button callbacks but
+    by dispatch_button, which AudioBot.on_interaction calls for every component
+    interaction and which finds the guild's view and the entry from the ID.
+    update() re-points the view at another entry without creating new buttons.
+    The view is stopped right away: it is only a template for the components, so
+    discord.py's view store does not keep a reference per message it is sent with.
+    """
+
+    def __init__(self, bot, guild_id, entry: QueueEntry, paused: bool = False, current_user: Optional[User] = None):
         logging.debug(f"Initializing ButtonView for: {entry.title} with paused state: {paused}")
-        # print(f"Initializing ButtonView for: {entry.title} with paused state: {paused}")
         super().__init__(timeout=None)
         self.bot = bot
+        self.guild_id = str(guild_id)
         self.paused = paused
         self.entry = entry
         self.current_user = current_user
         from playback import PlaybackManager
         self.playback_manager = PlaybackManager(queue_manager)
-        self.progress_update_task = None  # Track the progress update task
-
-        self.pause_button = Button(label="⏸️ Pause", style=ButtonStyle.primary, custom_id=f"pause-{uuid.uuid4()}")
-        self.resume_button = Button(label="▶️ Resume", style=ButtonStyle.primary, custom_id=f"resume-{uuid.uuid4()}")
-        self.stop_button = Button(label="⏹️ Stop", style=ButtonStyle.danger, custom_id=f"stop-{uuid.uuid4()}")
-        self.skip_button = Button(label="⏭️ Skip", style=ButtonStyle.secondary, custom_id=f"skip-{uuid.uuid4()}")
-        self.restart_button = Button(label="🔄 Restart", style=ButtonStyle.secondary, custom_id=f"restart-{uuid.uuid4()}")
-        self.shuffle_button = Button(label="🔀 Shuffle", style=ButtonStyle.secondary, custom_id=f"shuffle-{uuid.uuid4()}")
-        self.list_queue_button = Button(label="📜 List Queue", style=ButtonStyle.secondary, custom_id=f"list_queue-{uuid.uuid4()}")
-        self.remove_button = Button(label="❌ Remove", style=ButtonStyle.danger, custom_id=f"remove-{uuid.uuid4()}")
-        self.previous_button = Button(label="⏮️ Previous", style=ButtonStyle.secondary, custom_id=f"previous-{uuid.uuid4()}")
-        self.loop_button = Button(label="🔁 Loop", style=ButtonStyle.secondary, custom_id=f"loop-{uuid.uuid4()}")
-        self.move_up_button = Button(label="⬆️ Move Up", style=ButtonStyle.secondary, custom_id=f"move_up-{uuid.uuid4()}")
-        self.move_down_button = Button(label="⬇️ Move Down", style=ButtonStyle.secondary, custom_id=f"move_down-{uuid.uuid4()}")
-        self.move_to_top_button = Button(label="⬆️⬆️ Move to Top", style=ButtonStyle.secondary, custom_id=f"move_to_top-{uuid.uuid4()}")
-        self.move_to_bottom_button = Button(label="⬇️⬇️ Move to Bottom", style=ButtonStyle.secondary, custom_id=f"move_to_bottom-{uuid.uuid4()}")
-
-        self.favorite_button = Button(
-            label="⭐ Favorite" if not self.is_favorited_by_current_user() else "💛 Favorited",
-            style=ButtonStyle.secondary if not self.is_favorited_by_current_user() else ButtonStyle.primary,
-            custom_id=f"favorite-{uuid.uuid4()}"
-        )
-
-        self.lyrics_button = Button(label="Lyrics", style=ButtonStyle.secondary, custom_id=f"lyrics-{uuid.uuid4()}")
-
-        self.pause_button.callback = self.pause_button_callback
-        self.resume_button.callback = self.resume_button_callback
-        self.stop_button.callback = self.stop_button_callback
-        self.skip_button.callback = self.skip_button_callback
-        self.restart_button.callback = self.restart_button_callback
-        self.shuffle_button.callback = self.shuffle_button_callback
-        self.list_queue_button.callback = self.list_queue_button_callback
-        self.remove_button.callback = self.remove_button_callback
-        self.previous_button.callback = self.previous_button_callback
-        self.loop_button.callback = self.loop_button_callback
-        self.move_up_button.callback = self.move_up_button_callback
-        self.move_down_button.callback = self.move_down_button_callback
-        self.move_to_top_button.callback = self.move_to_top_button_callback
-        self.move_to_bottom_button.callback = self.move_to_bottom_button_callback
-        self.favorite_button.callback = self.favorite_button_callback
-        self.lyrics_button.callback = self.lyrics_button_callback
 
-        self.update_buttons()
-        # Start the progress update task when the view is initialized
-        asyncio.create_task(self.start_progress_update_task(None, self.entry))
+        self.pause_button = Button(label="⏸️ Pause", style=ButtonStyle.primary, custom_id=self.custom_id('pause'))
+        self.resume_button = Button(label="▶️ Resume", style=ButtonStyle.primary, custom_id=self.custom_id('resume'))
+        self.stop_button = Button(label="⏹️ Stop", style=ButtonStyle.danger, custom_id=self.custom_id('stop'))
+        self.skip_button = Button(label="⏭️ Skip", style=ButtonStyle.secondary, custom_id=self.custom_id('skip'))
+        self.restart_button = Button(label="🔄 Restart", style=ButtonStyle.secondary, custom_id=self.custom_id('restart'))
+        self.rewind_button = Button(label=f"⏪ -{SEEK_STEP_SECONDS}s", style=ButtonStyle.secondary, custom_id=self.custom_id('rewind'))
+        self.fast_forward_button = Button(label=f"⏩ +{SEEK_STEP_SECONDS}s", style=ButtonStyle.secondary, custom_id=self.custom_id('fast_forward'))
+        self.shuffle_button = Button(label="🔀 Shuffle", style=ButtonStyle.secondary, custom_id=self.custom_id('shuffle'))
+        self.list_queue_button = Button(label="📜 List Queue", style=ButtonStyle.secondary, custom_id=self.custom_id('list_queue'))
+        self.remove_button = Button(label="❌ Remove", style=ButtonStyle.danger, custom_id=self.custom_id('remove'))
+        self.previous_button = Button(label="⏮️ Previous", style=ButtonStyle.secondary, custom_id=self.custom_id('previous'))
+        self.loop_button = Button(label="🔁 Loop", style=ButtonStyle.secondary, custom_id=self.custom_id('loop'))
+        self.move_up_button = Button(label="⬆️ Move Up", style=ButtonStyle.secondary, custom_id=self.custom_id('move_up'))
+        self.move_down_button = Button(label="⬇️ Move Down", style=ButtonStyle.secondary, custom_id=self.custom_id('move_down'))
+        self.move_to_top_button = Button(label="⬆️⬆️ Move to Top", style=ButtonStyle.secondary, custom_id=self.custom_id('move_to_top'))
+        self.move_to_bottom_button = Button(label="⬇️⬇️ Move to Bottom", style=ButtonStyle.secondary, custom_id=self.custom_id('move_to_bottom'))
+        self.favorite_button = Button(label="⭐ Favorite", style=ButtonStyle.secondary, custom_id=self.custom_id('favorite'))
+        self.lyrics_button = Button(label="Lyrics", style=ButtonStyle.secondary, custom_id=self.custom_id('lyrics'))
+
+        self.buttons: Dict[str, Button] = {action: getattr(self, f'{action}_button') for action in BUTTON_HANDLERS}
+        self.update(entry, paused, current_user)
+        self.stop()
 
     @staticmethod
     async def send_now_playing_for_buttons(interaction: Interaction, entry: QueueEntry):
         embed = create_now_playing_embed(entry)
-        view = ButtonView(interaction.client, entry, paused=False, current_user=interaction.user)
+        view = get_button_view(interaction.client, interaction.guild.id, entry, paused=False, current_user=interaction.user)
         message = await interaction.channel.send(embed=embed, view=view)
-        await schedule_progress_bar_update(interaction, message, entry, ButtonView, queue_manager)
+        now_playing_scheduler.track(message, entry, interaction.guild.id)
+
+    def update(self, entry: QueueEntry, paused: Optional[bool] = None, current_user: Optional[User] = None):
+        """Point the existing buttons at entry and refresh their labels."""
+        self.entry = entry
+        if paused is not None:
+            self.paused = paused
+        if current_user is not None:
+            self.current_user = current_user
+        for action, button in self.buttons.items():
+            button.custom_id = self.custom_id(action)
+        self.update_buttons()
+        return self
+
+    def custom_id(self, action: str) -> str:
+        return button_custom_id(action, self.guild_id, self.entry)
 
     def is_favorited_by_current_user(self):
         if self.current_user is None:
@@ -109,14 +164,18 @@ class ButtonView(View):
         self.add_item(self.stop_button)
         self.add_item(self.skip_button)
         self.add_item(self.restart_button)
+        self.add_item(self.rewind_button)
+        self.add_item(self.fast_forward_button)
         self.add_item(self.shuffle_button)
         self.add_item(self.list_queue_button)
         self.add_item(self.remove_button)
         self.add_item(self.previous_button)
+        favorited = self.is_favorited_by_current_user()
+        self.favorite_button.label = "💛 Favorited" if favorited else "⭐ Favorite"
+        self.favorite_button.style = ButtonStyle.primary if favorited else ButtonStyle.secondary
         self.add_item(self.favorite_button)
         self.add_item(self.lyrics_button)
         logging.debug(f"Checking guild_id attribute for entry: {self.entry.title}")
-        # print(f"Checking guild_id attribute for entry: {self.entry.title} with guild_id: {self.entry.guild_id}")
 
         if self.entry.guild_id:
             server_id = str(self.entry.guild_id)
@@ -137,70 +196,49 @@ class ButtonView(View):
         self.loop_button.style = ButtonStyle.primary if queue_manager.loop else ButtonStyle.secondary
         self.add_item(self.loop_button)
 
-    async def refresh_all_views(self):
-        for message_id in self.bot.now_playing_messages:
-            try:
-                channel = self.bot.get_channel(self.entry.guild_id)
-                message = await channel.fetch_message(message_id)
-                await message.edit(view=self)
-            except Exception as e:
-                logging.error(f"Error refreshing view for message {message_id}: {e}")
-
     async def refresh_view(self, interaction: Interaction):
         self.update_buttons()
-        await interaction.message.edit(view=self)
-
-    async def lyrics_button_callback(self, interaction: Interaction):
-        await handle_lyrics_button(interaction, self.entry)
-
-    async def loop_button_callback(self, interaction: Interaction):
-        await handle_loop_button(interaction)
-
-    async def favorite_button_callback(self, interaction: Interaction):
-        await handle_favorite_button(interaction, self.entry, self.current_user)
-
-    async def pause_button_callback(self, interaction: Interaction):
-        await handle_pause_button(interaction, self.entry, self)
-
-    async def resume_button_callback(self, interaction: Interaction):
-        await handle_resume_button(interaction, self.entry, self)
-
-    async def stop_button_callback(self, interaction: Interaction):
-        await handle_stop_button(interaction)
-
-    async def skip_button_callback(self, interaction: Interaction):
-        await handle_skip_button(interaction)
-
-    async def restart_button_callback(self, interaction: Interaction):
-        await handle_restart_button(interaction, self)
-
-    async def shuffle_button_callback(self, interaction: Interaction):
-        await handle_shuffle_button(interaction, self)
-
-    async def list_queue_button_callback(self, interaction: Interaction):
-        await handle_list_queue_button(interaction, self)
-
-    async def remove_button_callback(self, interaction: Interaction):
-        await handle_remove_button(interaction)
-
-    async def previous_button_callback(self, interaction: Interaction):
-        await handle_previous_button(interaction)
-
-    async def move_up_button_callback(self, interaction: Interaction):
-        await handle_move_up_button(interaction, self.entry)
-
-    async def move_down_button_callback(self, interaction: Interaction):
-        await handle_move_down_button(interaction, self.entry)
-
-    async def move_to_top_button_callback(self, interaction: Interaction):
-        await handle_move_to_top_button(interaction, self.entry)
-
-    async def move_to_bottom_button_callback(self, interaction: Interaction):
-        await handle_move_to_bottom_button(interaction, self.entry)
-
-    async def start_progress_update_task(self, interaction, entry):
-        if self.progress_update_task is None:
-            logging.debug(f"Starting progress update task with paused state: {queue_manager.is_paused}")
-            # print(f"Starting progress update task with paused state: {queue_manager.is_paused}")
-            self.progress_update_task = asyncio.create_task(schedule_progress_bar_update(
-                interaction, interaction.message, entry, ButtonView, queue_manager))
+        if not now_playing_scheduler.request_update(interaction.message, view=self):
+            await interaction.message.edit(view=self)
+
+
+def get_button_view(bot, guild_id, entry: QueueEntry, paused: Optional[bool] = None, current_user: Optional[User] = None) -> ButtonView:
+    """The guild's view from now_playing_registry, created on first use and otherwise re-pointed at entry."""
+    view = now_playing_registry.view(guild_id)
+    if view is None:
+        view = ButtonView(bot, guild_id, entry, paused=bool(paused), current_user=current_user)
+        now_playing_registry.set_view(guild_id, view)
+        return view
+    return view.update(entry, paused, current_user)
+
+
+async def dispatch_button(bot, interaction: Interaction) -> bool:
+    """
+    Run the handler of a pressed now playing button. Returns False for interactions that are not ours.
+    Works for messages sent before a restart, since everything needed is in the custom ID.
+    """
+    if interaction.type != InteractionType.component:
+        return False
+    parsed = parse_button_custom_id((interaction.data or {}).get('custom_id', ''))
+    if parsed is None:
+        return False
+    action, guild_id, key = parsed
+    entry = find_entry(guild_id, key)
+    if entry is None:
+        await interaction.response.send_message("That track is no longer in the queue.", ephemeral=True)
+        return True
+    voice_client = interaction.guild.voice_client if interaction.guild else None
+    paused = bool(voice_client and voice_client.is_paused())
+    view = now_playing_registry.view(guild_id)
+    if view is None:
+        # First press after a restart, or the guild was evicted from the registry
+        view = get_button_view(bot, guild_id, entry, paused=paused, current_user=interaction.user)
+    elif view.entry is not entry:
+        # A press on an older now playing message gets its own controls, the guild's view stays on the current one
+        view = ButtonView(bot, guild_id, entry, paused=paused, current_user=interaction.user)
+    logging.debug(f"Dispatching '{action}' for {entry.title} in guild {guild_id}")
+    try:
+        await BUTTON_HANDLERS[action](interaction, entry, view)
+    except Exception as e:
+        logging.error(f"Error handling '{action}' button for {entry.title}: {e}")
+    return True
@@ -2,15 +2,25 @@ import logging
 import re
 import asyncio
 import random
-import yt_dlp
+import time
 import os
 from discord import Attachment, Interaction, utils, Embed
 from queue_manager import QueueEntry, queue_manager
 from playback import PlaybackManager
 from utils import download_file, extract_mp3_metadata, sanitize_title, delete_file
 from button_view import ButtonView
+from extraction_guard import ExtractionErrorLog, record_extraction_failure, unavailable_videos, youtube_breaker
+from ytdl_pool import extract_info, select_audio_format, selected_bitrate
+from audio_sources import CROSSFADE_CURVES, get_playback_telemetry
+from guild_settings import guild_settings
+from audio_cache import audio_cache
+from ffmpeg_supervisor import ffmpeg_supervisor
+from voice_workers import voice_workers
+from quality import quality_governor
+from now_playing_scheduler import now_playing_scheduler
+from playback_state import get_playback_state
 from typing import Optional, List, Dict, Tuple, Set
-from config import LASTFM_API_KEY
+from config import LASTFM_API_KEY, HEDGED_SEARCH_ENABLED, HEDGED_SEARCH_CONCURRENCY, PLAYBACK_MODE
 from urllib.parse import quote_plus
 import aiohttp
 
@@ -18,6 +28,8 @@ logging.basicConfig(level=logging.DEBUG, filename='commands.log', format='%(asct
 
 playback_manager = PlaybackManager(queue_manager)
 
+SEARCH_SUFFIXES = ["official audio", "official video", "lyrics", "live", "acoustic"]
+
 async def process_remove_duplicates(interaction: Interaction):
     logging.debug("Remove duplicates command executed")
     server_id = str(interaction.guild.id)
@@ -186,7 +198,7 @@ async def process_play(interaction: Interaction, youtube_url: str = None, youtub
 
     await interaction.followup.send("Please provide a valid URL, YouTube video title, or attach an MP3 file.")
 
-async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set[str], interaction: Interaction, max_attempts: int = 10) -> Optional[QueueEntry]:
+async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set[str], interaction: Interaction, max_attempts: int = 10, hedged: bool = HEDGED_SEARCH_ENABLED) -> Optional[QueueEntry]:
     """
     Search YouTube for a track that isn't already in the queue.
     
@@ -195,6 +207,7 @@ async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set
         queue_titles: Set of lowercase titles already in the queue
         interaction: The Discord interaction object
         max_attempts: Maximum number of search attempts
+        hedged: Run the query variants concurrently instead of one after another
         
     Returns:
         QueueEntry if a non-duplicate is found, None otherwise
@@ -208,8 +221,14 @@ async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set
     # Extract artist name for additional searches if needed
     artist_name = extract_artist_from_input(search_query)
     
+    # Streams are selected within the bitrate the guild's voice channel can carry
+    max_kbps = quality_governor.resolve_kbps(interaction.guild)
+
+    if hedged:
+        return await hedged_find_non_duplicate_youtube_result(search_query, artist_name, queue_titles, max_attempts, max_kbps)
+    
     # Try the original search first
-    entry = await search_youtube_for_non_duplicate(search_query, queue_titles)
+    entry = await search_youtube_for_non_duplicate(search_query, queue_titles, max_kbps=max_kbps)
     if entry:
         return entry
     
@@ -236,18 +255,18 @@ async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set
                     continue
                 
                 # Try to search YouTube for this track
-                entry = await search_youtube_for_non_duplicate(track_title, queue_titles)
+                entry = await search_youtube_for_non_duplicate(track_title, queue_titles, max_kbps=max_kbps)
                 if entry:
                     return entry
         except Exception as e:
             logging.error(f"Error getting Last.fm top tracks: {e}")
     
     # If we still don't have a result, try with "official audio" or "official video" appended
-    for suffix in ["official audio", "official video", "lyrics", "live", "acoustic"]:
+    for suffix in SEARCH_SUFFIXES:
         modified_query = f"{search_query} {suffix}"
         logging.info(f"Trying modified search: {modified_query}")
         
-        entry = await search_youtube_for_non_duplicate(modified_query, queue_titles)
+        entry = await search_youtube_for_non_duplicate(modified_query, queue_titles, max_kbps=max_kbps)
         if entry:
             return entry
     
@@ -276,7 +295,7 @@ async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set
                     continue
                 
                 # Try to search YouTube for this track
-                entry = await search_youtube_for_non_duplicate(track_title, queue_titles)
+                entry = await search_youtube_for_non_duplicate(track_title, queue_titles, max_kbps=max_kbps)
                 if entry:
                     return entry
     except Exception as e:
@@ -285,7 +304,98 @@ async def find_non_duplicate_youtube_result(search_query: str, queue_titles: Set
     # No non-duplicate found after all attempts
     return None
 
-async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[str], max_results: int = 5) -> Optional[QueueEntry]:
+async def hedged_find_non_duplicate_youtube_result(search_query: str, artist_name: str, queue_titles: Set[str], max_attempts: int = 10, max_kbps: Optional[int] = None) -> Optional[QueueEntry]:
+    """
+    Hedged variant of find_non_duplicate_youtube_result.
+
+    Builds the same query variants as the sequential search (raw query, Last.fm top
+    tracks, suffixed queries, then similar artists) but launches each tier concurrently
+    and keeps the first non-duplicate hit in priority order.
+
+    Args:
+        search_query: The search query to use
+        artist_name: Artist extracted from the search query
+        queue_titles: Set of lowercase titles already in the queue
+        max_attempts: Maximum number of Last.fm tracks to try per tier
+        max_kbps: Bitrate cap for the selected stream, None for no cap
+
+    Returns:
+        QueueEntry if a non-duplicate is found, None otherwise
+    """
+    queries = [search_query]
+
+    if " - " in search_query:
+        try:
+            top_tracks = await get_lastfm_top_tracks(artist_name, limit=20)
+            queries += non_duplicate_track_titles(top_tracks, queue_titles)[:max_attempts]
+        except Exception as e:
+            logging.error(f"Error getting Last.fm top tracks: {e}")
+
+    queries += [f"{search_query} {suffix}" for suffix in SEARCH_SUFFIXES]
+
+    entry = await hedged_youtube_search(queries, queue_titles, max_kbps=max_kbps)
+    if entry:
+        return entry
+
+    # Similar artists are the least promising tier, so only pay for them if everything else failed
+    try:
+        similar_artists = await get_lastfm_similar_artists(artist_name, limit=10)
+        similar_artist_tracks = await asyncio.gather(*(get_lastfm_top_tracks(artist, limit=5) for artist in similar_artists))
+        tracks = [track for artist_tracks in similar_artist_tracks for track in artist_tracks]
+        return await hedged_youtube_search(non_duplicate_track_titles(tracks, queue_titles)[:max_attempts], queue_titles, max_kbps=max_kbps)
+    except Exception as e:
+        logging.error(f"Error getting similar artists: {e}")
+
+    return None
+
+async def hedged_youtube_search(queries: List[str], queue_titles: Set[str], max_concurrency: int = HEDGED_SEARCH_CONCURRENCY, max_kbps: Optional[int] = None) -> Optional[QueueEntry]:
+    """
+    Run YouTube searches concurrently and return the first non-duplicate hit in priority order.
+
+    Searches start in list order under a concurrency cap. A result is only accepted once
+    every higher-priority query has come back empty, and the remaining searches are
+    cancelled as soon as a winner is chosen.
+
+    Args:
+        queries: Search queries ordered from most to least promising
+        queue_titles: Set of lowercase titles already in the queue
+        max_concurrency: Maximum number of searches in flight at once
+        max_kbps: Bitrate cap for the selected stream, None for no cap
+
+    Returns:
+        QueueEntry if a non-duplicate is found, None otherwise
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited_search(query: str) -> Optional[QueueEntry]:
+        async with semaphore:
+            return await search_youtube_for_non_duplicate(query, queue_titles, max_kbps=max_kbps)
+
+    tasks = [asyncio.create_task(limited_search(query)) for query in queries]
+    try:
+        for query, task in zip(queries, tasks):
+            entry = await task
+            if entry:
+                logging.info(f"Hedged search picked '{entry.title}' from query: {query}")
+                return entry
+        return None
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def non_duplicate_track_titles(tracks: List[Dict], queue_titles: Set[str]) -> List[str]:
+    """Format Last.fm tracks as 'artist - title' search queries, skipping ones already in the queue."""
+    track_titles = []
+    for track in tracks:
+        track_title = f"{track['artist']} - {track['title']}"
+        if is_title_duplicate(track_title, queue_titles):
+            logging.info(f"Skipping duplicate track title: {track_title}")
+            continue
+        track_titles.append(track_title)
+    return track_titles
+
+async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[str], max_results: int = 5, max_kbps: Optional[int] = None) -> Optional[QueueEntry]:
     """
     Search YouTube for a specific query and check if the result is already in the queue.
     
@@ -293,32 +403,29 @@ async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[
         search_query: The search query to use
         queue_titles: Set of lowercase titles already in the queue
         max_results: Maximum number of results to check
+        max_kbps: Bitrate cap for the selected stream, None for no cap
         
     Returns:
         QueueEntry if a non-duplicate is found, None otherwise
     """
+    if not youtube_breaker.allow_request():
+        logging.warning(f"Skipping search for '{search_query}': {youtube_breaker.status_message()}")
+        return None
+
     try:
         # Use ytsearch5 to get multiple results instead of just one
         yt_search_query = f"ytsearch{max_results}:{search_query}"
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'ignoreerrors': True,
-            'cookiefile': 'cookies.txt',
-            'http_headers': {
-                'User-Agent': (
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                )
-            }
-        }
-
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await asyncio.get_running_loop().run_in_executor(None, lambda: ydl.extract_info(yt_search_query, download=False))
+        error_log = ExtractionErrorLog()
+        info = await extract_info('search', yt_search_query, logger=error_log)
 
         if not info or 'entries' not in info or not info['entries']:
             logging.warning(f"No videos found for search: {search_query}")
+            if error_log.last_error:
+                record_extraction_failure(search_query, error_log.last_error)
+            else:
+                youtube_breaker.record_success()
             return None
+        youtube_breaker.record_success()
 
         # Check each result until we find a non-duplicate
         for video in info['entries']:
@@ -326,6 +433,8 @@ async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[
                 continue
                 
             video_url = video.get('webpage_url')
+            if unavailable_videos.contains(video.get('id', '')):
+                continue
             title = video.get('title')
             thumbnail = video.get('thumbnail')
             duration = video.get('duration', 0)
@@ -335,7 +444,7 @@ async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[
                 logging.info(f"Skipping long video: {title} ({duration} seconds)")
                 continue
                 
-            best_audio_url = next((f['url'] for f in video.get('formats', []) if f.get('acodec') != 'none'), video_url)
+            best_audio_url, audio_codec = select_audio_format(video, video_url, max_kbps=max_kbps)
 
             # Check if this YouTube result is already in the queue
             if is_title_duplicate(title, queue_titles):
@@ -348,7 +457,11 @@ async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[
                 title=title,
                 is_playlist=False,
                 thumbnail=thumbnail,
-                duration=duration
+                duration=duration,
+                resolved_at=time.time() if best_audio_url != video_url else None,
+                audio_codec=audio_codec,
+                audio_bitrate=selected_bitrate(video, best_audio_url),
+                resolved_max_kbps=max_kbps
             )
 
             return entry
@@ -359,6 +472,7 @@ async def search_youtube_for_non_duplicate(search_query: str, queue_titles: Set[
 
     except Exception as e:
         logging.error(f"Error searching YouTube: {e}")
+        record_extraction_failure(search_query, str(e))
         return None
 
 def is_title_duplicate(title: str, queue_titles: Set[str]) -> bool:
@@ -441,8 +555,10 @@ async def process_previous(interaction: Interaction):
     queue.insert(1, entry)
     queue_manager.save_queues()
     if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
+        state = get_playback_state(interaction.guild.id)
         interaction.guild.voice_client.stop()
-        await asyncio.sleep(0.5)
+        # The after callback rotates the queue and starts the previous entry
+        await state.wait_for('started')
         await ButtonView.send_now_playing_for_buttons(interaction, entry)
 
 async def process_remove_by_title(interaction: Interaction, title: str):
@@ -596,6 +712,7 @@ async def process_pause(interaction: Interaction):
         return
 
     interaction.guild.voice_client.pause()
+    get_playback_state(interaction.guild.id).transition('pause')
     await interaction.response.send_message("Paused the current track.")
 
 async def process_resume(interaction: Interaction):
@@ -605,6 +722,7 @@ async def process_resume(interaction: Interaction):
         return
 
     interaction.guild.voice_client.resume()
+    get_playback_state(interaction.guild.id).transition('resume')
     await interaction.response.send_message("Resumed playback.")
 
 async def process_stop(interaction: Interaction):
@@ -618,19 +736,65 @@ async def process_stop(interaction: Interaction):
     await interaction.guild.voice_client.disconnect()
     await interaction.response.send_message("Stopped playback and disconnected from the voice channel.")
 
+def parse_seek_position(position: str, current: float) -> Optional[float]:
+    """Parse '90', '1:30' or '1:02:03' as an absolute position, '+15' / '-15' as relative to current."""
+    position = position.strip()
+    relative = position[:1] in ('+', '-')
+    try:
+        parts = [float(part) for part in position.lstrip('+-').split(':')]
+    except ValueError:
+        return None
+    if not parts or len(parts) > 3:
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    if not relative:
+        return seconds
+    return current + seconds if position.startswith('+') else current - seconds
+
+def format_position(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+async def process_seek(interaction: Interaction, position: str):
+    logging.debug(f"Seek command executed: {position}")
+    entry = get_playback_state(interaction.guild.id).entry
+    if not entry or not interaction.guild.voice_client:
+        await interaction.response.send_message("No track is currently playing.", ephemeral=True)
+        return
+    target = parse_seek_position(position, entry.playback_position())
+    if target is None:
+        await interaction.response.send_message("Use seconds (90), minutes:seconds (1:30) or a relative jump (+15, -15).", ephemeral=True)
+        return
+
+    await interaction.response.defer()
+    new_position = await playback_manager.seek(interaction, target)
+    if new_position is None:
+        await interaction.followup.send("No track is currently playing.", ephemeral=True)
+    else:
+        await interaction.followup.send(f"Jumped to {format_position(new_position)} in {entry.title}.")
+
 async def process_restart(interaction: Interaction):
     logging.debug("Restart command executed")
-    if not queue_manager.currently_playing:
+    current_entry = get_playback_state(interaction.guild.id).entry
+    if not current_entry:
         await interaction.response.send_message("No track is currently playing.")
         return
 
-    current_entry = queue_manager.currently_playing
+    await interaction.response.defer()
+    # Seeking to the start keeps the same player and avoids re-running queue rotation
+    if interaction.guild.voice_client and await playback_manager.seek(interaction, 0) is not None:
+        await interaction.followup.send(f"Restarted {current_entry.title}.")
+        return
     queue_manager.is_restarting = True
 
     if interaction.guild.voice_client:
-        interaction.guild.voice_client.stop()
-        await asyncio.sleep(0.5)
+        await get_playback_state(interaction.guild.id).stop_player(interaction.guild.voice_client)
         await playback_manager.play_audio(interaction, current_entry)
+        await interaction.followup.send(f"Restarted {current_entry.title}.")
+    else:
+        await interaction.followup.send("The bot is not connected to a voice channel.", ephemeral=True)
 
 async def process_mp3_list_next(ctx):
     logging.debug("mp3_list_next command invoked")
@@ -774,9 +938,8 @@ async def process_search_and_play_from_queue(interaction: Interaction, title: st
     queue_manager.save_queues()
     
     voice_client = interaction.guild.voice_client
-    if voice_client and (voice_client.is_playing() or voice_client.is_paused()):
-        voice_client.stop()
-        await asyncio.sleep(1)
+    if voice_client:
+        await get_playback_state(interaction.guild.id).stop_player(voice_client)
 
     if not voice_client:
         if interaction.user.voice:
@@ -784,6 +947,74 @@ async def process_search_and_play_from_queue(interaction: Interaction, title: st
     
     await playback_manager.play_audio(interaction, entry)
 
+async def process_extraction_status(interaction: Interaction):
+    logging.debug("Extraction status command executed")
+    await interaction.response.send_message(
+        f"{youtube_breaker.status_message()}\n"
+        f"Known-unavailable videos cached: {len(unavailable_videos)}"
+    )
+
+async def process_playback_stats(interaction: Interaction):
+    logging.debug("Playback stats command executed")
+    telemetry = get_playback_telemetry(interaction.guild.id)
+    state = get_playback_state(interaction.guild.id)
+    await interaction.response.send_message(
+        f"**Playback buffer for {interaction.guild.name}**\n{telemetry.summary()}\n\n**Playback state**\n{state.describe()}\n"
+        f"{quality_governor.describe(interaction.guild.id)}\n{now_playing_scheduler.describe()}"
+    )
+
+async def process_cache_stats(interaction: Interaction):
+    logging.debug("Cache stats command executed")
+    stats = audio_cache.stats()
+    await interaction.response.send_message(
+        f"**Audio cache**\n"
+        f"Tracks: {stats['tracks']} using {stats['bytes'] / 1024 ** 2:.0f}/{stats['max_bytes'] / 1024 ** 2:.0f} MB\n"
+        f"Hits: {stats['hits']}, misses: {stats['misses']} ({stats['hit_rate']:.0%} hit rate)\n"
+        f"Evictions: {stats['evictions']}, downloads in progress: {stats['downloading']}"
+    )
+
+async def process_ffmpeg_stats(interaction: Interaction):
+    logging.debug("ffmpeg stats command executed")
+    message = f"**ffmpeg processes**\n{ffmpeg_supervisor.summary(interaction.guild.id)}"
+    if voice_workers.enabled:
+        # ffmpeg inside the workers is not supervised here, so the workers are listed separately
+        message += f"\n\n**Voice workers**\n{voice_workers.summary()}"
+    await interaction.response.send_message(message)
+
+async def process_crossfade(interaction: Interaction, seconds: float, curve: Optional[str] = None):
+    logging.debug(f"Crossfade command executed: {seconds}s, curve {curve}")
+    if not 0 <= seconds <= 12:
+        await interaction.response.send_message("Crossfade length must be between 0 and 12 seconds.", ephemeral=True)
+        return
+    if curve is not None and curve not in CROSSFADE_CURVES:
+        await interaction.response.send_message(f"Unknown curve. Choose one of: {', '.join(CROSSFADE_CURVES)}.", ephemeral=True)
+        return
+
+    guild_settings.set(interaction.guild.id, 'crossfade_seconds', seconds)
+    if curve is not None:
+        guild_settings.set(interaction.guild.id, 'crossfade_curve', curve)
+
+    if seconds == 0:
+        message = "Crossfade disabled."
+    else:
+        message = f"Crossfade set to {seconds:g}s ({guild_settings.get(interaction.guild.id, 'crossfade_curve')} curve), starting with the next track."
+    if PLAYBACK_MODE != 'pcm':
+        # Opus passthrough never decodes the audio, so there is nothing to mix
+        message += "\nNote: crossfade only applies when the bot runs with PLAYBACK_MODE=pcm."
+    await interaction.response.send_message(message)
+
+async def process_volume(interaction: Interaction, level: int):
+    logging.debug(f"Volume command executed: {level}%")
+    if not 0 <= level <= 200:
+        await interaction.response.send_message("Volume must be between 0 and 200%.", ephemeral=True)
+        return
+
+    applied_now = playback_manager.set_volume(interaction.guild, level / 100)
+    message = f"Volume set to {level}%."
+    if not applied_now:
+        message += " It will take effect from the next track."
+    await interaction.response.send_message(message)
+
 async def process_help(interaction: Interaction):
     commands_info = [
         {"name": "/play_next_in_queue", "description": "Move a specified track to the second position in the queue."},
@@ -799,9 +1030,16 @@ async def process_help(interaction: Interaction):
         {"name": "/resume", "description": "Resume playback if it is paused."},
         {"name": "/stop", "description": "Stop playback and disconnect the bot from the voice channel."},
         {"name": "/restart", "description": "Restart the currently playing track from the beginning."},
+        {"name": "/seek", "description": "Jump to a position in the current track, e.g. 1:30, 90, +15 or -15."},
         {"name": "/clear_queue", "description": "Clear the queue except the currently playing entry."},
         {"name": "/move_to_next", "description": "Move the specified track in the queue to the second position."},
         {"name": "/search_and_play_from_queue", "description": "Search the current queue and play the specified track."},
+        {"name": "/extraction_status", "description": "Show whether YouTube extraction is healthy or paused after repeated failures."},
+        {"name": "/playback_stats", "description": "Show read-ahead buffer health and underruns for this server."},
+        {"name": "/crossfade", "description": "Set the crossfade length in seconds (0 disables) and optionally the fade curve."},
+        {"name": "/volume", "description": "Set the playback volume for this server, from 0 to 200%."},
+        {"name": "/cache_stats", "description": "Show audio cache usage and hit rate."},
+        {"name": "/ffmpeg_stats", "description": "Show ffmpeg processes for this server with CPU, memory and recent exits."},
         {"name": "/help", "description": "Show the help text."},
         {"name": ".mp3_list_next", "description": "List MP3 files and play the next one in the list."},
         {"name": ".mp3_list", "description": "List all available MP3 files."}
@@ -31,6 +31,13 @@ from command_functions import (
     process_move_to_next,
     process_search_and_play_from_queue,
     process_remove_duplicates,
+    process_extraction_status,
+    process_playback_stats,
+    process_crossfade,
+    process_volume,
+    process_cache_stats,
+    process_seek,
+    process_ffmpeg_stats,
     discover_and_queue_recommendations
 )
 
@@ -142,6 +149,47 @@ class MusicCommands(commands.Cog):
         logging.debug(f"Search and play from queue command executed for title: {title}")
         await process_search_and_play_from_queue(interaction, title)
 
+    @app_commands.command(name='extraction_status', description='Show whether YouTube extraction is healthy or paused after repeated failures.')
+    async def extraction_status(self, interaction: Interaction):
+        logging.debug("Extraction status command executed")
+        await process_extraction_status(interaction)
+
+    @app_commands.command(name='playback_stats', description='Show read-ahead buffer health and underruns for this server.')
+    async def playback_stats(self, interaction: Interaction):
+        logging.debug("Playback stats command executed")
+        await process_playback_stats(interaction)
+
+    @app_commands.command(name='crossfade', description='Set the crossfade length in seconds (0 disables) and optionally the fade curve.')
+    @app_commands.describe(
+        seconds="Crossfade length in seconds, 0 to disable",
+        curve="Fade curve: linear, equal_power or exponential"
+    )
+    async def crossfade(self, interaction: Interaction, seconds: float, curve: Optional[str] = None):
+        logging.debug(f"Crossfade command executed: {seconds}s, curve {curve}")
+        await process_crossfade(interaction, seconds, curve)
+
+    @app_commands.command(name='volume', description='Set the playback volume for this server, from 0 to 200%.')
+    @app_commands.describe(level="Volume in percent, 100 is the original loudness")
+    async def volume(self, interaction: Interaction, level: int):
+        logging.debug(f"Volume command executed: {level}%")
+        await process_volume(interaction, level)
+
+    @app_commands.command(name='cache_stats', description='Show audio cache usage and hit rate.')
+    async def cache_stats(self, interaction: Interaction):
+        logging.debug("Cache stats command executed")
+        await process_cache_stats(interaction)
+
+    @app_commands.command(name='seek', description='Jump to a position in the current track, e.g. 1:30, 90, +15 or -15.')
+    @app_commands.describe(position="Absolute position (1:30 or 90) or a relative jump (+15 or -15)")
+    async def seek(self, interaction: Interaction, position: str):
+        logging.debug(f"Seek command executed: {position}")
+        await process_seek(interaction, position)
+
+    @app_commands.command(name='ffmpeg_stats', description='Show ffmpeg processes for this server with CPU, memory and recent exits.')
+    async def ffmpeg_stats(self, interaction: Interaction):
+        logging.debug("ffmpeg stats command executed")
+        await process_ffmpeg_stats(interaction)
+
     @app_commands.command(name='help', description='Show the help text.')
     async def help_command(self, interaction: Interaction):
         logging.debug("Help command executed")
@@ -18,3 +18,74 @@ LOGGING_CONFIG = {
     'filename': 'bot.log',
     'format': '%(asctime)s:%(levelname)s:%(message)s'
 }
+
+# Playback settings
+# 'passthrough' streams Opus from ffmpeg straight to Discord, 'pcm' decodes to PCM and encodes in the bot
+PLAYBACK_MODE = os.getenv("PLAYBACK_MODE", "passthrough").lower()
+# Passthrough can only skip re-encoding at unity gain, so it defaults to full volume
+DEFAULT_VOLUME = float(os.getenv("DEFAULT_VOLUME", "1.0" if PLAYBACK_MODE == "passthrough" else "0.75"))
+OPUS_BITRATE = int(os.getenv("OPUS_BITRATE", "128"))  # kbps, used when ffmpeg has to encode
+# Step the stream and encoder bitrate down under CPU or network pressure (see quality.py)
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "true").lower() == "true"
+QUALITY_CPU_THRESHOLD = float(os.getenv("QUALITY_CPU_THRESHOLD", "0.85"))  # load average per core counted as CPU pressure
+QUALITY_STEP_UP_SECONDS = float(os.getenv("QUALITY_STEP_UP_SECONDS", "300"))  # calm time before moving back up a tier
+READAHEAD_SECONDS = float(os.getenv("READAHEAD_SECONDS", "3"))  # 0 reads ffmpeg directly on the voice thread
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", "64"))  # across all guilds, including pre-spawned next tracks
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "0"))  # processes running the pcm pipeline; 0 keeps it in the bot process
+GAPLESS_PREPARE_SECONDS = float(os.getenv("GAPLESS_PREPARE_SECONDS", "5"))  # 0 disables pre-spawning the next track
+SEEK_STEP_SECONDS = int(os.getenv("SEEK_STEP_SECONDS", "15"))  # jump for the rewind / fast-forward buttons
+RESUME_CHECKPOINT_INTERVAL = float(os.getenv("RESUME_CHECKPOINT_INTERVAL", "15"))  # how often the play position is saved
+
+# Now playing messages: one scheduler edits all of them within a global budget
+NOW_PLAYING_EDITS_PER_SECOND = float(os.getenv("NOW_PLAYING_EDITS_PER_SECOND", "4"))  # across all guilds
+NOW_PLAYING_MIN_INTERVAL = float(os.getenv("NOW_PLAYING_MIN_INTERVAL", "2"))  # fastest progress bar refresh of one message
+NOW_PLAYING_MESSAGES_PER_GUILD = int(os.getenv("NOW_PLAYING_MESSAGES_PER_GUILD", "1"))  # older ones are superseded
+NOW_PLAYING_MAX_GUILDS = int(os.getenv("NOW_PLAYING_MAX_GUILDS", "500"))  # least recently used guilds are forgotten beyond this
+# What happens to a superseded now playing message: 'disable' removes its buttons, 'delete' deletes it, 'keep' leaves it
+NOW_PLAYING_SUPERSEDED = os.getenv("NOW_PLAYING_SUPERSEDED", "disable").lower()
+
+# Search settings
+HEDGED_SEARCH_ENABLED = os.getenv("HEDGED_SEARCH_ENABLED", "true").lower() == "true"
+HEDGED_SEARCH_CONCURRENCY = int(os.getenv("HEDGED_SEARCH_CONCURRENCY", "3"))
+
+# Extraction failure handling
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "21600"))  # 6 hours
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_FAILURE_WINDOW = float(os.getenv("BREAKER_FAILURE_WINDOW", "120"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "300"))
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "60"))  # a probe not reported back by then was lost, e.g. cancelled
+
+# yt-dlp instance pool
+YTDL_POOL_SIZE = int(os.getenv("YTDL_POOL_SIZE", "3"))
+YTDL_COOKIE_FILE = os.getenv("YTDL_COOKIE_FILE", "cookies.txt")
+
+# Stream URL freshness
+RESOLVED_URL_TTL = float(os.getenv("RESOLVED_URL_TTL", "3600"))
+STREAM_URL_EXPIRY_MARGIN = float(os.getenv("STREAM_URL_EXPIRY_MARGIN", "300"))
+
+# Loudness normalization
+LOUDNESS_NORMALIZATION = os.getenv("LOUDNESS_NORMALIZATION", "true").lower() == "true"
+LOUDNESS_TARGET_LUFS = float(os.getenv("LOUDNESS_TARGET_LUFS", "-14"))
+LOUDNESS_MAX_GAIN_DB = float(os.getenv("LOUDNESS_MAX_GAIN_DB", "12"))  # cap on boost or cut applied to any one track
+LOUDNESS_SCAN_INTERVAL = float(os.getenv("LOUDNESS_SCAN_INTERVAL", "30"))  # seconds between background analysis passes
+
+# Silence trimming of local and cached tracks, measured by the same analysis pass
+SILENCE_TRIM = os.getenv("SILENCE_TRIM", "true").lower() == "true"
+SILENCE_THRESHOLD_DB = float(os.getenv("SILENCE_THRESHOLD_DB", "-50"))  # peak level, in dBFS, below which audio counts as silence
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "0.5"))  # shorter leading or trailing silence is left alone
+
+# Sharding: launcher.py runs SHARD_COUNT bot processes and sets SHARD_ID for each
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_ID = int(os.getenv("SHARD_ID", "0"))
+# 'json' keeps queues.json and friends; 'sqlite' shares one WAL database between shards
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite" if SHARD_COUNT > 1 else "json").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+SHARD_RESTART_DELAY = float(os.getenv("SHARD_RESTART_DELAY", "5"))  # first back-off before the launcher restarts a shard
+
+# On-disk audio cache. Its index and in-progress downloads are only coordinated within one process,
+# so each shard caches in its own subdirectory with an equal share of AUDIO_CACHE_MAX_MB
+AUDIO_CACHE_ROOT = os.getenv("AUDIO_CACHE_DIR", os.path.join("downloaded-mp3s", "cache"))
+AUDIO_CACHE_DIR = os.path.join(AUDIO_CACHE_ROOT, f"shard-{SHARD_ID}") if SHARD_COUNT > 1 else AUDIO_CACHE_ROOT
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "2048")) // max(SHARD_COUNT, 1)  # total across shards
+AUDIO_CACHE_PLAY_THRESHOLD = int(os.getenv("AUDIO_CACHE_PLAY_THRESHOLD", "3"))  # plays before a track is downloaded
+AUDIO_CACHE_TEE = os.getenv("AUDIO_CACHE_TEE", "true").lower() == "true"  # cache tracks while streaming them the first time
@@ -0,0 +1,188 @@
+import logging
+import re
+import time
+from typing import Dict, Optional
+from config import NEGATIVE_CACHE_TTL, BREAKER_FAILURE_THRESHOLD, BREAKER_FAILURE_WINDOW, BREAKER_COOLDOWN, BREAKER_PROBE_TIMEOUT
+
+logging.basicConfig(level=logging.DEBUG, filename='extraction_guard.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+YOUTUBE_ID_PATTERN = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/)([A-Za-z0-9_-]{11})')
+
+# Errors that mean this one video will never play, no matter how often we ask
+UNAVAILABLE_MARKERS = [
+    'video unavailable',
+    'private video',
+    'has been removed',
+    'no longer available',
+    'account associated with this video has been terminated',
+    'not available in your country',
+    'members-only',
+]
+
+# Errors that mean YouTube is refusing us in general (bot detection, expired cookies, throttling)
+SYSTEMATIC_MARKERS = [
+    'sign in to confirm',
+    'not a bot',
+    'cookies are no longer valid',
+    'http error 429',
+    'too many requests',
+    'http error 403',
+]
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    match = YOUTUBE_ID_PATTERN.search(url or '')
+    return match.group(1) if match else None
+
+
+def extraction_cache_key(url: str, index: Optional[int] = None) -> str:
+    """Key a negative cache entry by video ID, or by playlist URL and index when the ID is unknown."""
+    video_id = extract_video_id(url) if "list=" not in url else None
+    if video_id:
+        return video_id
+    return f"{url}#{index}" if index is not None else url
+
+
+def classify_extraction_error(message: Optional[str]) -> str:
+    message = (message or '').lower()
+    if any(marker in message for marker in SYSTEMATIC_MARKERS):
+        return 'systematic'
+    if any(marker in message for marker in UNAVAILABLE_MARKERS):
+        return 'unavailable'
+    return 'other'
+
+
+class ExtractionErrorLog:
+    """yt-dlp logger that remembers the last error, since ignoreerrors swallows the exception."""
+
+    def __init__(self):
+        self.last_error = None
+
+    def debug(self, msg):
+        logging.debug(msg)
+
+    def info(self, msg):
+        logging.info(msg)
+
+    def warning(self, msg):
+        logging.warning(msg)
+
+    def error(self, msg):
+        logging.error(msg)
+        self.last_error = msg
+
+
+class NegativeCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries: Dict[str, float] = {}
+
+    def add(self, key: str, reason: str = ''):
+        self.entries[key] = time.monotonic() + self.ttl
+        logging.info(f"Marked {key} as unavailable for {self.ttl:.0f}s: {reason}")
+
+    def contains(self, key: str) -> bool:
+        expires_at = self.entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return False
+        return True
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, expires_at in self.entries.items() if expires_at <= now]:
+            del self.entries[key]
+
+    def __len__(self):
+        self.purge_expired()
+        return len(self.entries)
+
+
+class CircuitBreaker:
+    """
+    Stops calling YouTube for a cool-down period after repeated systematic failures.
+
+    Closed: requests flow normally. Open: requests are refused until the cool-down ends.
+    Half-open: a single probe request is let through; success closes the breaker, failure re-opens it.
+    A probe whose outcome is never recorded (cancelled, or failed with an error nobody
+    reported) is given up after probe_timeout, and the next request becomes the probe.
+    """
+
+    def __init__(self, failure_threshold: int, failure_window: float, cooldown: float, probe_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = 'closed'
+        self.failures = []
+        self.opened_at = None
+        self.last_reason = None
+        self.probe_in_flight = False
+        self.probe_started_at = None
+
+    def allow_request(self) -> bool:
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = 'half_open'
+            self.probe_in_flight = False
+            logging.info("Circuit breaker half-open, allowing a probe request")
+        if self.state == 'half_open' and self.probe_in_flight and time.monotonic() - self.probe_started_at >= self.probe_timeout:
+            logging.warning(f"Circuit breaker probe not reported back within {self.probe_timeout:.0f}s, allowing another")
+            self.probe_in_flight = False
+        if self.state == 'half_open' and not self.probe_in_flight:
+            self.probe_in_flight = True
+            self.probe_started_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != 'closed':
+            logging.info("Circuit breaker closed after successful request")
+        self.state = 'closed'
+        self.failures.clear()
+        self.probe_in_flight = False
+
+    def record_failure(self, reason: str = ''):
+        now = time.monotonic()
+        self.last_reason = reason
+        self.failures = [failed_at for failed_at in self.failures if now - failed_at < self.failure_window]
+        self.failures.append(now)
+        if self.state == 'half_open' or len(self.failures) >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = now
+            self.probe_in_flight = False
+            logging.warning(f"Circuit breaker opened for {self.cooldown:.0f}s after {len(self.failures)} failures: {reason}")
+
+    def seconds_until_retry(self) -> float:
+        if self.state != 'open':
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def status_message(self) -> str:
+        if self.state == 'closed':
+            return f"YouTube extraction is healthy ({len(self.failures)} recent failures)."
+        if self.state == 'half_open':
+            return "YouTube extraction is recovering, probing with a single request."
+        return (f"YouTube extraction is paused for {self.seconds_until_retry():.0f}s after repeated failures"
+                f" ({self.last_reason or 'unknown error'}).")
+
+
+def record_extraction_failure(key: str, message: Optional[str]) -> str:
+    """Route a failed extraction to the negative cache or the circuit breaker. Returns the error class."""
+    error_class = classify_extraction_error(message)
+    if error_class == 'unavailable':
+        unavailable_videos.add(key, message or '')
+        # YouTube answered, so a half-open probe has proven it is reachable again
+        if youtube_breaker.state == 'half_open':
+            youtube_breaker.record_success()
+    elif error_class == 'systematic' or youtube_breaker.state == 'half_open':
+        youtube_breaker.record_failure(message or '')
+    return error_class
+
+
+# Shared by playback.py, utils.py and command_functions.py
+unavailable_videos = NegativeCache(NEGATIVE_CACHE_TTL)
+youtube_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_FAILURE_WINDOW, BREAKER_COOLDOWN, BREAKER_PROBE_TIMEOUT)
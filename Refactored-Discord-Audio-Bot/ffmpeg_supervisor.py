@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from config import FFMPEG_MAX_PROCESSES
+
+logging.basicConfig(level=logging.DEBUG, filename='ffmpeg_supervisor.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+STDERR_TAIL_LINES = 20
+MONITOR_INTERVAL = 5.0
+RECENT_EXITS = 50
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class FFmpegLimitReached(RuntimeError):
+    """Raised instead of spawning ffmpeg when FFMPEG_MAX_PROCESSES are already running."""
+
+
+class FFmpegProcess:
+    """One supervised ffmpeg child: identity, resource usage and its last stderr lines."""
+
+    def __init__(self, process, guild_id: str, kind: str, stderr_read_fd: int):
+        self.process = process
+        self.pid = process.pid
+        self.guild_id = guild_id
+        self.kind = kind
+        self.started_at = time.time()
+        self.cpu_seconds: Optional[float] = None
+        self.rss_bytes: Optional[int] = None
+        self.cpu_percent: Optional[float] = None
+        self.last_sample: Optional[tuple] = None
+        self.exit_code: Optional[int] = None
+        self.exited_at: Optional[float] = None
+        self.killed = False
+        self.stderr_tail: Deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+        self.stderr_thread = threading.Thread(target=self.drain_stderr, args=(stderr_read_fd,), daemon=True,
+                                              name=f'ffmpeg-stderr:{self.pid}')
+        self.stderr_thread.start()
+
+    def drain_stderr(self, fd: int):
+        # ffmpeg blocks once the stderr pipe is full, so it is always read, even if nobody looks at the tail
+        with os.fdopen(fd, 'rb') as stderr:
+            for line in stderr:
+                self.stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def sample(self):
+        """Read CPU time and RSS from /proc. Leaves the fields as None where /proc is unavailable."""
+        try:
+            with open(f'/proc/{self.pid}/stat', 'r') as stat_file:
+                # Fields after the parenthesised command name; utime and stime are the 12th and 13th
+                fields = stat_file.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{self.pid}/statm', 'r') as statm_file:
+                resident_pages = int(statm_file.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return
+        now = time.monotonic()
+        self.cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+        self.rss_bytes = resident_pages * PAGE_SIZE
+        if self.last_sample:
+            sampled_at, cpu_seconds = self.last_sample
+            self.cpu_percent = 100 * (self.cpu_seconds - cpu_seconds) / max(now - sampled_at, 1e-6)
+        self.last_sample = (now, self.cpu_seconds)
+
+    def poll(self) -> bool:
+        """True once the process has exited; reaps it so it never lingers as a zombie."""
+        if self.exit_code is None:
+            self.exit_code = self.process.poll()
+            if self.exit_code is not None:
+                self.exited_at = time.time()
+        return self.exit_code is not None
+
+    @property
+    def crashed(self) -> bool:
+        # Negative codes are signals, i.e. discord.py's cleanup or ours killing the process
+        return self.exit_code is not None and self.exit_code > 0 and not self.killed
+
+    def describe(self) -> str:
+        age = (self.exited_at or time.time()) - self.started_at
+        cpu = f"{self.cpu_seconds:.1f}s CPU" if self.cpu_seconds is not None else "CPU n/a"
+        if self.cpu_percent is not None:
+            cpu += f" ({self.cpu_percent:.0f}%)"
+        rss = f"{self.rss_bytes / 1024 ** 2:.0f} MB" if self.rss_bytes is not None else "RSS n/a"
+        status = f"exit {self.exit_code}" if self.exit_code is not None else "running"
+        return f"pid {self.pid} {self.kind}: {status}, up {age:.0f}s, {cpu}, {rss}"
+
+
+class FFmpegSupervisor:
+    """
+    Spawns and tracks every ffmpeg child used for playback.
+
+    Each process is recorded per guild with its PID, start time, CPU and RSS
+    (sampled from /proc), exit code and the tail of its stderr. A monitor thread
+    reaps exited processes, logs crashes with their stderr, and keeps the most
+    recent exits for /ffmpeg_stats. Spawning is refused above max_processes, and
+    kill_guild() ends every process of a guild when its voice client goes away.
+    """
+
+    def __init__(self, max_processes: int):
+        self.max_processes = max_processes
+        self.lock = threading.Lock()
+        self.processes: Dict[int, FFmpegProcess] = {}
+        self.recent_exits: Deque[FFmpegProcess] = deque(maxlen=RECENT_EXITS)
+        self.spawned = 0
+        self.crashes = 0
+        self.killed = 0
+        self.rejected = 0
+        self.monitor_thread: Optional[threading.Thread] = None
+
+    def spawn(self, audio_class, guild_id, source, kind: str, **kwargs):
+        """Create an FFmpegPCMAudio / FFmpegOpusAudio under supervision."""
+        with self.lock:
+            if len(self.processes) >= self.max_processes:
+                self.rejected += 1
+                raise FFmpegLimitReached(f"{len(self.processes)} ffmpeg processes already running (limit {self.max_processes})")
+        stderr_read_fd, stderr_write_fd = os.pipe()
+        try:
+            with os.fdopen(stderr_write_fd, 'wb') as stderr_write:
+                audio_source = audio_class(source, stderr=stderr_write, **kwargs)
+        except Exception:
+            os.close(stderr_read_fd)
+            raise
+        # discord.py keeps the Popen on the private _process attribute
+        supervised = FFmpegProcess(audio_source._process, str(guild_id), kind, stderr_read_fd)
+        with self.lock:
+            self.processes[supervised.pid] = supervised
+            self.spawned += 1
+        logging.debug(f"Spawned ffmpeg pid {supervised.pid} ({kind}) for guild {guild_id}")
+        self.ensure_monitor()
+        return audio_source
+
+    def ensure_monitor(self):
+        if self.monitor_thread is None or not self.monitor_thread.is_alive():
+            self.monitor_thread = threading.Thread(target=self.monitor, daemon=True, name='ffmpeg-supervisor')
+            self.monitor_thread.start()
+
+    def monitor(self):
+        while True:
+            time.sleep(MONITOR_INTERVAL)
+            self.check()
+
+    def check(self):
+        with self.lock:
+            supervised_processes = list(self.processes.values())
+        for supervised in supervised_processes:
+            if supervised.poll():
+                self.record_exit(supervised)
+            else:
+                supervised.sample()
+
+    def record_exit(self, supervised: FFmpegProcess):
+        with self.lock:
+            if self.processes.pop(supervised.pid, None) is None:
+                return
+            self.recent_exits.append(supervised)
+            if supervised.crashed:
+                self.crashes += 1
+        if supervised.crashed:
+            stderr = '\n'.join(supervised.stderr_tail)
+            logging.error(f"ffmpeg pid {supervised.pid} for guild {supervised.guild_id} exited with {supervised.exit_code}:\n{stderr}")
+        else:
+            logging.debug(f"ffmpeg pid {supervised.pid} exited with {supervised.exit_code}")
+
+    def kill_guild(self, guild_id) -> int:
+        """Kill every ffmpeg process of a guild, e.g. after its voice client disconnected."""
+        guild_id = str(guild_id)
+        with self.lock:
+            targets = [p for p in self.processes.values() if p.guild_id == guild_id]
+        for supervised in targets:
+            if not supervised.poll():
+                supervised.killed = True
+                try:
+                    supervised.process.kill()
+                    supervised.process.wait(timeout=5)
+                except Exception as e:
+                    logging.warning(f"Could not kill ffmpeg pid {supervised.pid}: {e}")
+                supervised.poll()
+                self.killed += 1
+            self.record_exit(supervised)
+        if targets:
+            logging.info(f"Killed {len(targets)} ffmpeg processes for guild {guild_id}")
+        return len(targets)
+
+    def guild_processes(self, guild_id) -> List[FFmpegProcess]:
+        with self.lock:
+            return [p for p in self.processes.values() if p.guild_id == str(guild_id)]
+
+    def summary(self, guild_id) -> str:
+        self.check()
+        with self.lock:
+            running = len(self.processes)
+            exits = [p for p in self.recent_exits if p.guild_id == str(guild_id)][-5:]
+        lines = [
+            f"Running: {running}/{self.max_processes} (spawned {self.spawned}, crashed {self.crashes}, "
+            f"killed {self.killed}, refused {self.rejected})",
+        ]
+        lines += [supervised.describe() for supervised in self.guild_processes(guild_id)] or ["No ffmpeg processes for this server."]
+        if exits:
+            lines.append("Recent exits:")
+            for supervised in exits:
+                lines.append(supervised.describe())
+                if supervised.crashed and supervised.stderr_tail:
+                    lines.append(f"  last stderr: {supervised.stderr_tail[-1][:150]}")
+        return '\n'.join(lines)
+
+
+ffmpeg_supervisor = FFmpegSupervisor(FFMPEG_MAX_PROCESSES)
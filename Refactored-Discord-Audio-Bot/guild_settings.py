@@ -0,0 +1,55 @@
+import json
+import logging
+from typing import Any, Dict
+from config import DEFAULT_VOLUME
+from state_store import state_store
+
+logging.basicConfig(level=logging.DEBUG, filename='guild_settings.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+SETTINGS_FILE = 'guild_settings.json'
+
+DEFAULT_SETTINGS = {
+    'crossfade_seconds': 0.0,  # 0 plays tracks back to back without blending
+    'crossfade_curve': 'equal_power',
+    'volume': DEFAULT_VOLUME,
+}
+
+
+class GuildSettings:
+    """Per-guild playback preferences, persisted next to queues.json or in the shared state store."""
+
+    def __init__(self, settings_file: str = SETTINGS_FILE):
+        self.settings_file = settings_file
+        self.settings: Dict[str, Dict[str, Any]] = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if state_store:
+            return state_store.load_guild_settings()
+        try:
+            with open(self.settings_file, 'r') as file:
+                return json.load(file)
+        except (json.JSONDecodeError, FileNotFoundError) as e:
+            logging.warning(f"Could not load {self.settings_file}, starting with defaults: {e}")
+            return {}
+
+    def save(self):
+        try:
+            with open(self.settings_file, 'w') as file:
+                json.dump(self.settings, file, indent=4)
+        except OSError as e:
+            logging.error(f"Failed to save {self.settings_file}: {e}")
+
+    def get(self, guild_id, key: str) -> Any:
+        return self.settings.get(str(guild_id), {}).get(key, DEFAULT_SETTINGS[key])
+
+    def set(self, guild_id, key: str, value: Any):
+        if key not in DEFAULT_SETTINGS:
+            raise KeyError(f"Unknown guild setting: {key}")
+        self.settings.setdefault(str(guild_id), {})[key] = value
+        if state_store:
+            state_store.save_guild_settings(str(guild_id), self.settings[str(guild_id)])
+        else:
+            self.save()
+
+
+guild_settings = GuildSettings()
@@ -0,0 +1,99 @@
+"""
+Runs the bot as SHARD_COUNT processes, one Discord shard each.
+
+Every shard is bot.py started with SHARD_ID and SHARD_COUNT in its environment.
+All shards share the SQLite state store, so a shard that crashes is restarted
+with its guilds' queues intact. Restarts back off exponentially, up to a minute,
+and the back-off resets once a shard has stayed up for a while.
+
+Usage: SHARD_COUNT=4 python launcher.py
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+from config import SHARD_COUNT, SHARD_RESTART_DELAY
+
+logging.basicConfig(level=logging.DEBUG, filename='launcher.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+MAX_RESTART_DELAY = 60.0
+STABLE_UPTIME = 300.0  # a shard up this long is healthy again and restarts with the initial delay
+POLL_INTERVAL = 1.0
+
+
+class Shard:
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restart_delay = SHARD_RESTART_DELAY
+        self.restart_at: Optional[float] = None
+
+    def start(self):
+        environment = dict(os.environ, SHARD_ID=str(self.shard_id), SHARD_COUNT=str(SHARD_COUNT), STATE_BACKEND='sqlite')
+        self.process = subprocess.Popen([sys.executable, 'bot.py'], env=environment)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logging.info(f"Started shard {self.shard_id} (pid {self.process.pid})")
+        print(f"Started shard {self.shard_id} (pid {self.process.pid})")
+
+    def check(self):
+        """Schedule a restart for a shard that exited, and perform it once its back-off has passed."""
+        now = time.monotonic()
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        exit_code = self.process.poll()
+        if exit_code is None:
+            return
+        if now - self.started_at >= STABLE_UPTIME:
+            self.restart_delay = SHARD_RESTART_DELAY
+        logging.error(f"Shard {self.shard_id} exited with {exit_code}, restarting in {self.restart_delay:.0f}s")
+        print(f"Shard {self.shard_id} exited with {exit_code}, restarting in {self.restart_delay:.0f}s")
+        self.restart_at = now + self.restart_delay
+        self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout: float):
+        if self.process:
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def run():
+    shards: Dict[int, Shard] = {shard_id: Shard(shard_id) for shard_id in range(SHARD_COUNT)}
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    for shard in shards.values():
+        shard.start()
+    while not stopping:
+        time.sleep(POLL_INTERVAL)
+        for shard in shards.values():
+            shard.check()
+
+    logging.info("Stopping all shards")
+    print("Stopping all shards")
+    for shard in shards.values():
+        shard.stop()
+    for shard in shards.values():
+        shard.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,75 @@
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, List
+from config import NOW_PLAYING_MAX_GUILDS, NOW_PLAYING_MESSAGES_PER_GUILD
+
+logging.basicConfig(level=logging.DEBUG, filename='now_playing.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+
+class GuildNowPlaying:
+    """A guild's reusable ButtonView and its live now playing messages, newest last."""
+
+    def __init__(self):
+        self.view = None
+        self.messages: Deque = deque()
+
+
+class NowPlayingRegistry:
+    """
+    Bounded record of now playing messages and views, so neither grows with uptime.
+
+    Each guild keeps at most NOW_PLAYING_MESSAGES_PER_GUILD messages. add_message
+    returns the ones a new message supersedes, for the caller to retire. At most
+    NOW_PLAYING_MAX_GUILDS guilds are kept, and the least recently used one is
+    forgotten first. Its messages stay as they are, and their buttons still work
+    through dispatch_button, which rebuilds a view from the custom ID.
+    """
+
+    def __init__(self, max_guilds: int = NOW_PLAYING_MAX_GUILDS, messages_per_guild: int = NOW_PLAYING_MESSAGES_PER_GUILD):
+        self.max_guilds = max_guilds
+        self.messages_per_guild = max(messages_per_guild, 1)
+        self.guilds: 'OrderedDict[str, GuildNowPlaying]' = OrderedDict()
+        self.evicted = 0
+
+    def guild(self, guild_id) -> GuildNowPlaying:
+        """The guild's record, marked as most recently used and created if needed."""
+        guild_id = str(guild_id)
+        record = self.guilds.get(guild_id)
+        if record is None:
+            record = self.guilds[guild_id] = GuildNowPlaying()
+            while len(self.guilds) > self.max_guilds:
+                evicted_id, _ = self.guilds.popitem(last=False)
+                self.evicted += 1
+                logging.debug(f"Forgot the now playing state of guild {evicted_id}")
+        else:
+            self.guilds.move_to_end(guild_id)
+        return record
+
+    def view(self, guild_id):
+        record = self.guilds.get(str(guild_id))
+        return record.view if record else None
+
+    def set_view(self, guild_id, view):
+        self.guild(guild_id).view = view
+
+    def add_message(self, guild_id, message) -> List:
+        """Record a new now playing message and return the messages it supersedes, oldest first."""
+        record = self.guild(guild_id)
+        record.messages.append(message)
+        superseded = []
+        while len(record.messages) > self.messages_per_guild:
+            superseded.append(record.messages.popleft())
+        return superseded
+
+    def forget_message(self, guild_id, message_id):
+        record = self.guilds.get(str(guild_id))
+        if record:
+            record.messages = deque(message for message in record.messages if message.id != message_id)
+
+    def describe(self) -> str:
+        messages = sum(len(record.messages) for record in self.guilds.values())
+        return (f"Now playing registry: {len(self.guilds)}/{self.max_guilds} guilds, {messages} messages, "
+                f"{self.evicted} guilds evicted")
+
+
+now_playing_registry = NowPlayingRegistry()
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from discord.errors import HTTPException, NotFound
+from config import NOW_PLAYING_EDITS_PER_SECOND, NOW_PLAYING_MAX_GUILDS, NOW_PLAYING_MIN_INTERVAL, NOW_PLAYING_SUPERSEDED
+from now_playing_registry import now_playing_registry
+from playback_state import get_playback_state
+from utils import create_progress_bar, update_embed_fields
+
+logging.basicConfig(level=logging.DEBUG, filename='now_playing.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+TICK_SECONDS = 0.25
+
+
+class TrackedMessage:
+    """A now playing message and what its next edit has to carry."""
+
+    def __init__(self, message, entry, guild_id: str):
+        self.message = message
+        self.entry = entry
+        self.guild_id = guild_id
+        self.next_progress_at = time.monotonic()
+        self.urgent_since: Optional[float] = None
+        self.pending_view = None
+        self.editing = False
+        self.finished = False
+
+
+class NowPlayingScheduler:
+    """
+    Owns the refresh of every now playing message, in place of a loop per message.
+
+    One task edits messages within a global budget of NOW_PLAYING_EDITS_PER_SECOND.
+    User-visible changes (pause, resume, skip, a changed view) are sent first, in the
+    order they were requested. Progress bar ticks share what is left of the budget,
+    so a message's progress interval stretches from NOW_PLAYING_MIN_INTERVAL as more
+    messages are tracked. Requests for a message coalesce into its next edit, and a
+    message never has more than one edit in flight.
+
+    A message is dropped once its entry is no longer playing, after a last edit
+    when the track ended on its own, or when Discord no longer has it.
+    Messages superseded in now_playing_registry are retired (NOW_PLAYING_SUPERSEDED)
+    after user-visible changes and before progress ticks. The retirement queue is
+    bounded, so a backlog drops the oldest retirements instead of growing.
+    """
+
+    def __init__(self, edits_per_second: float = NOW_PLAYING_EDITS_PER_SECOND):
+        self.edits_per_second = edits_per_second
+        self.tokens = edits_per_second
+        self.refilled_at = time.monotonic()
+        self.messages: Dict[int, TrackedMessage] = {}
+        self.retiring: Deque = deque(maxlen=NOW_PLAYING_MAX_GUILDS)
+        self.task: Optional[asyncio.Task] = None
+        self.edits = 0
+        self.failed_edits = 0
+        self.retired = 0
+
+    def progress_interval(self) -> float:
+        """Seconds between progress ticks of one message, so that all of them fit the budget."""
+        return max(NOW_PLAYING_MIN_INTERVAL, len(self.messages) / self.edits_per_second)
+
+    def track(self, message, entry, guild_id):
+        """Start refreshing a newly sent now playing message. Other messages for the guild are dropped."""
+        guild_id = str(guild_id)
+        for message_id, tracked in list(self.messages.items()):
+            if tracked.guild_id == guild_id:
+                del self.messages[message_id]
+        self.messages[message.id] = TrackedMessage(message, entry, guild_id)
+        self.messages[message.id].next_progress_at += self.progress_interval()
+        for superseded in now_playing_registry.add_message(guild_id, message):
+            self.retire(superseded)
+        self.start()
+
+    def retire(self, message):
+        """Queue removing the buttons of, or deleting, a superseded now playing message."""
+        self.messages.pop(message.id, None)
+        if NOW_PLAYING_SUPERSEDED in ('disable', 'delete'):
+            self.retiring.append(message)
+            self.start()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def request_update(self, message, view=None):
+        """Queue a user-visible update of a tracked message, carrying view if given, ahead of progress ticks."""
+        tracked = self.messages.get(message.id)
+        if tracked is None:
+            return False
+        if view is not None:
+            tracked.pending_view = view
+        if tracked.urgent_since is None:
+            tracked.urgent_since = time.monotonic()
+        return True
+
+    def refill(self, now: float):
+        self.tokens = min(self.edits_per_second, self.tokens + (now - self.refilled_at) * self.edits_per_second)
+        self.refilled_at = now
+
+    def playback_status(self, tracked: TrackedMessage) -> str:
+        """'playing', 'paused' or 'ended' for the message's entry."""
+        state = get_playback_state(tracked.guild_id)
+        if state.entry is not tracked.entry or state.state in ('idle', 'ending'):
+            return 'ended'
+        if state.state == 'paused':
+            return 'paused'
+        return 'playing'
+
+    def due_messages(self, now: float) -> Tuple[List[TrackedMessage], List[TrackedMessage]]:
+        """Messages to edit now: user-visible changes in request order, and progress ticks most overdue first."""
+        urgent = []
+        progress = []
+        for tracked in self.messages.values():
+            if tracked.editing:
+                continue
+            if tracked.urgent_since is not None:
+                urgent.append(tracked)
+                continue
+            status = self.playback_status(tracked)
+            if status == 'ended':
+                tracked.finished = True
+                urgent.append(tracked)
+            elif status == 'playing' and now >= tracked.next_progress_at:
+                progress.append(tracked)
+        urgent.sort(key=lambda tracked: tracked.urgent_since or now)
+        progress.sort(key=lambda tracked: tracked.next_progress_at)
+        return urgent, progress
+
+    async def run(self):
+        while self.messages or self.retiring:
+            now = time.monotonic()
+            self.refill(now)
+            urgent, progress = self.due_messages(now)
+            for tracked in urgent:
+                self.start_edit(tracked, now)
+            while self.retiring and self.tokens >= 1:
+                self.tokens -= 1
+                asyncio.create_task(self.retire_message(self.retiring.popleft()))
+            for tracked in progress:
+                self.start_edit(tracked, now)
+            await asyncio.sleep(TICK_SECONDS)
+
+    def start_edit(self, tracked: TrackedMessage, now: float):
+        if self.tokens < 1:
+            return
+        self.tokens -= 1
+        tracked.editing = True
+        tracked.urgent_since = None
+        tracked.next_progress_at = now + self.progress_interval()
+        asyncio.create_task(self.edit(tracked))
+
+    async def retire_message(self, message):
+        try:
+            if NOW_PLAYING_SUPERSEDED == 'delete':
+                await message.delete()
+            else:
+                await message.edit(view=None)
+            self.retired += 1
+        except NotFound:
+            pass
+        except HTTPException as e:
+            self.failed_edits += 1
+            logging.error(f"Error retiring now playing message {message.id}: {e}")
+
+    async def edit(self, tracked: TrackedMessage):
+        entry = tracked.entry
+        view, tracked.pending_view = tracked.pending_view, None
+        try:
+            duration = entry.duration or 0
+            if duration and entry.start_time:
+                elapsed = min(entry.playback_position(), duration)
+                progress_bar, elapsed_str, duration_str = create_progress_bar(elapsed / duration, duration)
+                embed = update_embed_fields(tracked.message.embeds[0], entry, progress_bar, elapsed_str, duration_str)
+                if view is not None:
+                    await tracked.message.edit(embed=embed, view=view)
+                else:
+                    await tracked.message.edit(embed=embed)
+            elif view is not None:
+                await tracked.message.edit(view=view)
+            self.edits += 1
+        except NotFound:
+            logging.info(f"Now playing message {tracked.message.id} is gone, no longer refreshing it")
+            now_playing_registry.forget_message(tracked.guild_id, tracked.message.id)
+            tracked.finished = True
+        except (HTTPException, IndexError) as e:
+            self.failed_edits += 1
+            logging.error(f"Error refreshing now playing message {tracked.message.id}: {e}")
+        finally:
+            tracked.editing = False
+            if tracked.finished and self.messages.get(tracked.message.id) is tracked:
+                logging.debug(f"Stopped refreshing the now playing message of {entry.title}")
+                del self.messages[tracked.message.id]
+
+    def describe(self) -> str:
+        return (f"Now playing messages: {len(self.messages)}, progress every {self.progress_interval():.1f}s, "
+                f"{self.edits} edits ({self.failed_edits} failed), {self.retired} retired, budget {self.edits_per_second:g}/s\n"
+                f"{now_playing_registry.describe()}")
+
+
+now_playing_scheduler = NowPlayingScheduler()
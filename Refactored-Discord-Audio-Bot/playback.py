@@ -1,15 +1,33 @@
 import logging
 import asyncio
+import time
 import yt_dlp
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from discord import FFmpegPCMAudio, Interaction, PCMVolumeTransformer
+from typing import Dict, Optional, Tuple
+from discord import AudioSource, FFmpegOpusAudio, FFmpegPCMAudio, Interaction
+from config import PLAYBACK_MODE, READAHEAD_SECONDS, GAPLESS_PREPARE_SECONDS, LOUDNESS_NORMALIZATION, RESUME_CHECKPOINT_INTERVAL, AUDIO_CACHE_TEE, SILENCE_TRIM
+from audio_analysis import db_to_gain
+from audio_cache import audio_cache
+from ffmpeg_supervisor import ffmpeg_supervisor
+from voice_workers import WorkerOpusSource, voice_workers
+from quality import quality_governor
+from audio_sources import FRAME_LENGTH, CrossfadeSource, FailoverSource, GainSource, OggOpusSource, ReadAheadSource, find_source, get_playback_telemetry
+from guild_settings import guild_settings
+from playback_state import get_playback_state
 from now_playing_helper import send_now_playing_message
 from queue_manager import QueueEntry
+from extraction_guard import ExtractionErrorLog, extract_video_id, extraction_cache_key, record_extraction_failure, unavailable_videos, youtube_breaker
+from ytdl_pool import extract_info, select_audio_format, selected_bitrate
 
 logging.basicConfig(level=logging.DEBUG, filename='playback.log', format='%(asctime)s:%(levelname)s:%(message)s')
 
-executor = ThreadPoolExecutor(max_workers=1)
+CROSSFADE_PREPARE_MARGIN = 2.0  # seconds the next source gets to buffer before a crossfade starts
+UNITY_GAIN_TOLERANCE = 0.06  # about 0.5 dB; closer than this to unity, passthrough remuxes instead of re-encoding
+
+# Next track's source, spawned and buffering before the current track ends, keyed by guild.
+# Module level because PlaybackManager is instantiated by several modules and views.
+prepared_sources: Dict[str, Tuple[QueueEntry, AudioSource]] = {}
+preparation_tasks: Dict[str, asyncio.Task] = {}
 
 class PlaybackManager:
     def __init__(self, queue_manager):
@@ -19,18 +37,36 @@ class PlaybackManager:
         try:
             server_id = str(ctx_or_interaction.guild.id)
             self.queue_manager.ensure_queue_exists(server_id)
+            entry.guild_id = server_id  # Ensure guild ID is set
+            self.cancel_next_source_preparation(server_id)
+            state = get_playback_state(server_id)
+            state.transition('resolve', entry)
+            quality_governor.evaluate(ctx_or_interaction.guild)
 
-            await self.refresh_url_if_needed(entry)
-            entry.guild_id = str(ctx_or_interaction.guild.id)  # Ensure guild ID is set
-            if entry.duration == 0:
-                await self.update_entry_duration(entry)
+            # An entry checkpointed mid-play before the bot went down resumes where it was
+            resume_offset = entry.resume_position if entry.resume_position and not self.queue_manager.is_restarting else 0.0
+            start_offset = resume_offset or entry.trimmed_start()
+            audio_source = self.take_prepared_source(server_id, entry)
+            if audio_source is not None and resume_offset:
+                audio_source.cleanup()
+                audio_source = None
+            if audio_source is None:
+                await self.refresh_url_if_needed(entry)
+                if entry.duration == 0 and entry.resolved_at is None:
+                    await self.update_entry_duration(entry)
+                if resume_offset:
+                    logging.info(f"Resuming {entry.title} at {resume_offset:.0f}s")
+                    audio_source = self.create_audio_source(entry, server_id, start_offset=resume_offset)
+            else:
+                logging.info(f"Using pre-spawned source for {entry.title}")
+            state.transition('buffer', entry)
 
             self.queue_manager.set_currently_playing(entry)
             self.queue_manager.is_paused = False
 
-            self.queue_manager.save_queues()
-            entry.start_time = datetime.now()
+            entry.start_time = datetime.now() - timedelta(seconds=start_offset)
             entry.paused_duration = timedelta(0)
+            entry.pause_start_time = None
 
             logging.info(f"Starting playback for: {entry.title} (URL: {entry.best_audio_url})")
             print(f"Starting playback for: {entry.title} (URL: {entry.best_audio_url})")
@@ -38,36 +74,155 @@ class PlaybackManager:
             def after_playing_callback(error):
                 self.handle_playback_end(ctx_or_interaction, entry, error)
 
-            await self.start_playback(ctx_or_interaction, entry, after_playing_callback)
+            await self.start_playback(ctx_or_interaction, entry, after_playing_callback, audio_source)
+            # Saved after playback starts so the disk write is not part of the gap between tracks
+            self.queue_manager.save_queues()
+            audio_cache.record_play(entry)
             logging.info("Calling send_now_playing")
             print("Calling send_now_playing")
             # Schedule a halfway point queue refresh
             halfway_duration = entry.duration / 2
             asyncio.create_task(self.schedule_halfway_queue_refresh(server_id, halfway_duration))
+            self.schedule_next_source_preparation(ctx_or_interaction, entry)
+            asyncio.create_task(self.checkpoint_position(entry))
         except Exception as e:
+            get_playback_state(ctx_or_interaction.guild.id).transition('idle')
             await self.handle_playback_exception(ctx_or_interaction, entry, e)
 
+    def schedule_next_source_preparation(self, ctx_or_interaction, entry):
+        server_id = str(ctx_or_interaction.guild.id)
+        self.cancel_next_source_preparation(server_id)
+        if self.preparation_lead(server_id) > 0 and entry.duration:
+            preparation_tasks[server_id] = asyncio.create_task(self.prepare_next_source(ctx_or_interaction, entry))
+
+    async def checkpoint_position(self, entry):
+        """Persist the play position periodically so a restarted bot can resume mid-track."""
+        while True:
+            await asyncio.sleep(RESUME_CHECKPOINT_INTERVAL)
+            if get_playback_state(entry.guild_id).entry is not entry:
+                return
+            entry.resume_position = entry.playback_position()
+            self.queue_manager.save_queues()
+
+    async def seek(self, ctx_or_interaction, position: float) -> Optional[float]:
+        """
+        Jump within the current entry by swapping in a source that starts at position.
+        Returns the position actually used, or None if nothing is playing.
+        """
+        guild = ctx_or_interaction.guild
+        voice_client = guild.voice_client
+        state = get_playback_state(guild.id)
+        entry = state.entry
+        if state.state not in ('playing', 'paused') or entry is None or voice_client is None or voice_client.source is None:
+            return None
+        server_id = str(guild.id)
+        position = max(entry.trimmed_start(), position)
+        if entry.trimmed_end():
+            position = min(position, max(entry.trimmed_end() - 1, 0))
+
+        self.cancel_next_source_preparation(server_id)
+        self.discard_prepared_source(server_id)
+        await self.refresh_url_if_needed(entry)
+        new_source = self.create_audio_source(entry, server_id, start_offset=position)
+        old_source = voice_client.source
+        paused = voice_client.is_paused()
+        # The setter swaps sources without firing the after callback, so the old one is cleaned up here.
+        # It also resumes the player, so a paused track is paused again.
+        voice_client.source = new_source
+        if paused:
+            voice_client.pause()
+        old_source.cleanup()
+
+        now = datetime.now()
+        entry.start_time = now - timedelta(seconds=position)
+        entry.paused_duration = timedelta(0)
+        entry.pause_start_time = now if paused else None
+        logging.info(f"Seeked {entry.title} to {position:.1f}s")
+        self.schedule_next_source_preparation(ctx_or_interaction, entry)
+        return position
+
+    def peek_next_entry(self, server_id, current_entry):
+        """Best guess at the entry play_next will pick once current_entry ends."""
+        if self.queue_manager.loop:
+            return current_entry
+        queue = self.queue_manager.get_queue(server_id)
+        remaining = [e for e in queue if e is not current_entry]
+        return remaining[0] if remaining else None
+
+    def preparation_lead(self, server_id) -> float:
+        """Seconds before the end of a track at which the next track's source is spawned."""
+        fade_seconds = guild_settings.get(server_id, 'crossfade_seconds') if PLAYBACK_MODE == 'pcm' else 0
+        if fade_seconds > 0:
+            # The next source has to be buffering before the crossfade starts
+            return max(GAPLESS_PREPARE_SECONDS, fade_seconds + CROSSFADE_PREPARE_MARGIN)
+        return GAPLESS_PREPARE_SECONDS
+
+    async def prepare_next_source(self, ctx_or_interaction, entry):
+        """Spawn and pre-buffer the next entry's ffmpeg source shortly before the current entry ends."""
+        server_id = str(ctx_or_interaction.guild.id)
+        state = get_playback_state(server_id)
+        lead = self.preparation_lead(server_id)
+        try:
+            while True:
+                if state.entry is not entry:
+                    return
+                if state.state == 'paused':
+                    await asyncio.sleep(1)
+                    continue
+                elapsed = (datetime.now() - entry.start_time - entry.paused_duration).total_seconds()
+                # Timed off the trimmed end, so the next track is ready when trailing silence is skipped
+                remaining = entry.trimmed_end() - elapsed
+                if remaining <= lead:
+                    break
+                await asyncio.sleep(min(remaining - lead, 5))
+
+            next_entry = self.peek_next_entry(server_id, entry)
+            if next_entry is None:
+                return
+            next_entry.guild_id = server_id
+            await self.refresh_url_if_needed(next_entry)
+            self.discard_prepared_source(server_id)
+            next_source = self.create_audio_source(next_entry, server_id)
+            prepared_sources[server_id] = (next_entry, next_source)
+            logging.info(f"Pre-spawned source for next entry: {next_entry.title}")
+
+            voice_client = ctx_or_interaction.guild.voice_client
+            current_source = voice_client.source if voice_client else None
+            if isinstance(current_source, CrossfadeSource) and state.entry is entry:
+                current_source.set_next(next_source)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Failed to prepare next source after {entry.title}: {e}")
+
+    def take_prepared_source(self, server_id, entry):
+        prepared = prepared_sources.pop(server_id, None)
+        if prepared is None:
+            return None
+        prepared_entry, audio_source = prepared
+        if prepared_entry is not entry:
+            logging.debug(f"Discarding pre-spawned source for {prepared_entry.title}, playing {entry.title} instead")
+            audio_source.cleanup()
+            return None
+        return audio_source
+
+    def discard_prepared_source(self, server_id):
+        prepared = prepared_sources.pop(server_id, None)
+        if prepared:
+            prepared[1].cleanup()
+
+    def cancel_next_source_preparation(self, server_id):
+        task = preparation_tasks.pop(server_id, None)
+        if task and not task.done():
+            task.cancel()
+
     async def schedule_halfway_queue_refresh(self, server_id, delay):
         await asyncio.sleep(delay)
         self.queue_manager.get_queue(server_id)
         logging.debug(f"Queue refreshed at halfway point for server {server_id}")
         print(f"Queue refreshed at halfway point for server {server_id}")
     
-    def after_playing(self, ctx_or_interaction, entry):
-        def after_playing_callback(error):
-            self.queue_manager.stop_is_triggered = False
-            if error:
-                logging.error(f"Error playing {entry.title}: {error}")
-                print(f"Error playing {entry.title}: {error}")
-                bot_client = ctx_or_interaction.client if isinstance(ctx_or_interaction, Interaction) else ctx_or_interaction.bot
-                asyncio.run_coroutine_threadsafe(ctx_or_interaction.channel.send("Error occurred during playback."), bot_client.loop).result()
-            else:
-                logging.info(f"Finished playing {entry.title} at {datetime.now()}")
-                print(f"Finished playing {entry.title} at {datetime.now()}")
-                self.manage_queue_after_playback(ctx_or_interaction, entry)
-        return after_playing_callback
-
-    def manage_queue_after_playback(self, ctx_or_interaction, entry):
+    async def manage_queue_after_playback(self, ctx_or_interaction, entry):
         if not self.queue_manager.is_restarting and not self.queue_manager.has_been_shuffled and not self.queue_manager.loop:
             queue = self.queue_manager.get_queue(str(ctx_or_interaction.guild.id))
             logging.debug(f"Queue before managing playback: {[e.title for e in queue]}")
@@ -84,59 +239,268 @@ class PlaybackManager:
         if self.queue_manager.loop:
             logging.info(f"Looping {entry.title}")
             print(f"Looping {entry.title}")
-            bot_client = ctx_or_interaction.client if isinstance(ctx_or_interaction, Interaction) else ctx_or_interaction.bot
-            asyncio.run_coroutine_threadsafe(self.play_audio(ctx_or_interaction, entry), bot_client.loop).result()
+            await self.play_audio(ctx_or_interaction, entry)
         else:
             if not self.queue_manager.is_restarting:
                 self.queue_manager.last_played_audio[str(ctx_or_interaction.guild.id)] = entry.title
             self.queue_manager.save_queues()
-            bot_client = ctx_or_interaction.client if isinstance(ctx_or_interaction, Interaction) else ctx_or_interaction.bot
-            asyncio.run_coroutine_threadsafe(self.play_next(ctx_or_interaction), bot_client.loop).result()
+            await self.play_next(ctx_or_interaction)
 
-    async def start_playback(self, ctx_or_interaction, entry, after_callback):
+    async def start_playback(self, ctx_or_interaction, entry, after_callback, audio_source=None):
         try:
             logging.debug("Starting playback")
             print("Starting playback")
             voice_client = ctx_or_interaction.guild.voice_client
+            state = get_playback_state(ctx_or_interaction.guild.id)
             if self.queue_manager.stop_is_triggered:
                 logging.info("Playback stopped before starting")
                 print("Playback stopped before starting")
+                if audio_source is not None:
+                    audio_source.cleanup()
+                state.transition('idle')
                 return
 
             if voice_client is None:
                 logging.error("No voice client found.")
                 print("No voice client found.")
+                if audio_source is not None:
+                    audio_source.cleanup()
+                state.transition('idle')
                 return
 
-            audio_source = FFmpegPCMAudio(
-                entry.best_audio_url,
-                options='-bufsize 65536k -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 2 -vn'
-            )
-            # Set volume to 50%
-            audio_source = PCMVolumeTransformer(audio_source, volume=0.75)
-
-            if not voice_client.is_playing():
-                voice_client.play(audio_source, after=after_callback)
-                print(f'setting currently playing entry - {entry.title} = entry.title')
-                self.queue_manager.set_currently_playing(entry)
-                asyncio.create_task(send_now_playing_message(ctx_or_interaction, entry))
-                self.queue_manager.has_been_shuffled = False
-                logging.info(f"Playback started for {entry.title} at {datetime.now()}")
-                print(f"Playback started for {entry.title} at {datetime.now()}")
+            if voice_client.is_playing():
+                # Another track was started while this one was resolved. This entry is the guild's
+                # current one now, so it replaces that track instead of leaving the state in buffering.
+                logging.info(f"Replacing the playing track with {entry.title}")
+                await state.stop_player(voice_client)
+            if audio_source is None:
+                audio_source = self.create_audio_source(entry, str(ctx_or_interaction.guild.id))
+            voice_client.play(audio_source, after=after_callback)
+            encoder = getattr(voice_client, 'encoder', None)
+            if encoder is not None and not audio_source.is_opus():
+                # discord.py encodes PCM sources itself; match its bitrate to the guild's quality tier
+                encoder.set_bitrate(quality_governor.target_kbps(ctx_or_interaction.guild.id))
+            state.transition('start', entry)
+            print(f'setting currently playing entry - {entry.title} = entry.title')
+            self.queue_manager.set_currently_playing(entry)
+            asyncio.create_task(send_now_playing_message(ctx_or_interaction, entry))
+            self.queue_manager.has_been_shuffled = False
+            logging.info(f"Playback started for {entry.title} at {datetime.now()}")
+            print(f"Playback started for {entry.title} at {datetime.now()}")
         except Exception as e:
+            get_playback_state(ctx_or_interaction.guild.id).transition('idle')
             if not self.queue_manager.stop_is_triggered:
                 logging.error(f"Exception during playback: {e}")
                 print(f"Exception during playback: {e}")
                 bot_client = ctx_or_interaction.client if isinstance(ctx_or_interaction, Interaction) else ctx_or_interaction.bot
                 await ctx_or_interaction.channel.send(f"An error occurred during playback: {e}")
 
+    def create_audio_source(self, entry, guild_id, volume: Optional[float] = None, start_offset: Optional[float] = None,
+                            stream_only: bool = False):
+        """
+        Build the AudioSource for an entry.
+
+        In passthrough mode ffmpeg hands Discord Opus packets directly: YouTube's Opus
+        stream is remuxed without decoding when no volume change is needed, and any
+        other input is filtered and encoded inside ffmpeg instead of in Python.
+        Every ffmpeg process is spawned through the ffmpeg supervisor, which tracks
+        it per guild and refuses new ones above FFMPEG_MAX_PROCESSES.
+        The ffmpeg output is read ahead on its own thread (READAHEAD_SECONDS) so
+        network stalls are absorbed before they reach the voice thread.
+        PCM sources are scaled by a GainSource, so volume can change mid-track, and are
+        wrapped in a CrossfadeSource when the guild has crossfade enabled.
+        Cached tracks already normalized to Ogg/Opus are played by OggOpusSource
+        without any subprocess when no gain has to be applied. Their loudness gain is
+        baked into the cache file, so at the default volume that is the common case.
+        With VOICE_WORKERS, PCM sources without crossfade are decoded, scaled and
+        Opus-encoded in a voice worker process and only the packets come back.
+        Worker streams are not teed into the audio cache, since the tee reads in this process.
+        start_offset seeks on ffmpeg's input side (-ss) or by packet index in Ogg files.
+        It defaults to the end of the entry's leading silence, and playback stops at
+        the start of its trailing silence (-t, or the last Ogg packet) when measured.
+        Volume defaults to the guild's saved /volume setting. The entry's measured
+        loudness normalization gain is applied on top of it as a static gain.
+        Remote and teed streams are watched by a FailoverSource, which asks
+        recover_stream for a new stream at the same position when one stalls or ends
+        early. stream_only returns just that decoding stage, for use as the replacement.
+        """
+        if volume is None:
+            volume = guild_settings.get(guild_id, 'volume')
+        if start_offset is None:
+            start_offset = entry.trimmed_start()
+        end = entry.trim_end if SILENCE_TRIM and entry.trim_end and entry.trim_end > start_offset else None
+        track_gain_db = entry.loudness_gain_db if LOUDNESS_NORMALIZATION else 0.0
+
+        # A cached copy replaces the remote stream entirely
+        cached = audio_cache.lookup(extract_video_id(entry.video_url)) if entry.video_url.startswith('http') else None
+        if cached:
+            logging.debug(f"Audio cache hit for {entry.title}: {cached['path']}")
+            # Only apply what the cache file does not already carry; a baked gain was measured on this very track
+            baked_gain_db = cached.get('baked_gain_db', 0.0)
+            track_gain_db = (baked_gain_db if track_gain_db is None else track_gain_db) - baked_gain_db
+        track_gain = db_to_gain(track_gain_db)
+        input_path = cached['path'] if cached else entry.best_audio_url
+        audio_codec = cached['acodec'] if cached else entry.audio_codec
+        fade_seconds = guild_settings.get(guild_id, 'crossfade_seconds')
+        # Crossfading mixes PCM of two tracks, so it stays in this process
+        use_worker = PLAYBACK_MODE == 'pcm' and voice_workers.enabled and fade_seconds <= 0
+        # Otherwise fetch the stream ourselves and cache it while ffmpeg reads it from a pipe
+        # A pipe cannot be seeked, and a partial download would not be a complete cache file
+        tee = audio_cache.open_tee_stream(entry) if AUDIO_CACHE_TEE and not cached and not start_offset and not use_worker and not stream_only else None
+        if tee:
+            logging.debug(f"Streaming {entry.title} through the audio cache")
+            input_path = tee
+        is_remote = not tee and input_path.startswith('http')
+        input_options = []
+        if start_offset:
+            input_options.append(f'-ss {start_offset:.2f}')
+        if is_remote:
+            input_options.append('-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 2')
+        before_options = ' '.join(input_options) or None
+        output_options = f'-vn -t {end - start_offset:.2f}' if end else '-vn'
+        pipe = tee is not None
+
+        if PLAYBACK_MODE == 'passthrough':
+            unity_gain = abs(volume * track_gain - 1.0) < UNITY_GAIN_TOLERANCE
+            if cached and unity_gain and cached['path'].endswith('.opus'):
+                try:
+                    # Normalized cache files are demuxed in-process: no ffmpeg, no decode, no encode
+                    return OggOpusSource(
+                        cached['path'],
+                        start_packet=int(start_offset / FRAME_LENGTH),
+                        end_packet=int(end / FRAME_LENGTH) if end else None
+                    )
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Falling back to ffmpeg for cached {entry.title}: {e}")
+            if audio_codec == 'opus' and unity_gain:
+                logging.debug(f"Remuxing Opus stream without re-encoding for {entry.title}")
+                audio_source = ffmpeg_supervisor.spawn(
+                    FFmpegOpusAudio, guild_id, input_path, 'opus-copy',
+                    codec='copy', pipe=pipe, before_options=before_options, options=output_options
+                )
+            else:
+                audio_source = ffmpeg_supervisor.spawn(
+                    FFmpegOpusAudio, guild_id, input_path, 'opus-encode',
+                    bitrate=quality_governor.target_kbps(guild_id),
+                    pipe=pipe,
+                    before_options=before_options,
+                    options=f'{output_options} -af volume={volume * track_gain:.4f}'
+                )
+            stream = self.read_ahead(audio_source, guild_id)
+        elif use_worker:
+            worker_source = voice_workers.open_stream(guild_id, {
+                'input': input_path,
+                'before_options': before_options,
+                'options': output_options,
+                'volume': volume,
+                'track_gain': track_gain,
+                'bitrate': quality_governor.target_kbps(guild_id),
+            })
+            stream = self.read_ahead(worker_source, guild_id)
+        else:
+            pcm_source = ffmpeg_supervisor.spawn(FFmpegPCMAudio, guild_id, input_path, 'pcm', pipe=pipe, before_options=before_options, options=output_options)
+            stream = self.read_ahead(pcm_source, guild_id)
+
+        if stream_only:
+            return stream
+        if is_remote or tee:
+            loop = asyncio.get_running_loop()
+            stream = FailoverSource(
+                stream,
+                start_offset,
+                entry.trimmed_end(),
+                lambda position: asyncio.run_coroutine_threadsafe(self.recover_stream(entry, guild_id, position), loop),
+                telemetry=get_playback_telemetry(guild_id)
+            )
+        if PLAYBACK_MODE == 'passthrough' or use_worker:
+            return stream
+
+        audio_source = GainSource(stream, volume, track_gain, telemetry=get_playback_telemetry(guild_id))
+        if fade_seconds > 0:
+            return CrossfadeSource(
+                audio_source,
+                fade_seconds,
+                guild_settings.get(guild_id, 'crossfade_curve'),
+                expected_frames=int(max(entry.trimmed_end() - start_offset, 0) / FRAME_LENGTH),
+                read_ahead=stream if isinstance(stream, (ReadAheadSource, FailoverSource)) else None,
+                telemetry=get_playback_telemetry(guild_id)
+            )
+        return audio_source
+
+    async def recover_stream(self, entry, guild_id, position: float) -> Optional[AudioSource]:
+        """
+        Build a replacement decoding stage for a stream that stalled or ended early,
+        starting at position. The stream URL is re-resolved first, since an expired or
+        throttled URL is the usual cause. Called from the audio thread through
+        run_coroutine_threadsafe; returns None if no replacement could be made.
+        """
+        try:
+            if not audio_cache.path_for(extract_video_id(entry.video_url)):
+                entry.resolved_at = None
+                await self.refresh_url_if_needed(entry)
+            stream = self.create_audio_source(entry, guild_id, start_offset=position, stream_only=True)
+        except Exception as e:
+            logging.error(f"Could not recover the stream of {entry.title}: {e}")
+            return None
+        if get_playback_state(guild_id).entry is entry:
+            # Silence was played while the stream was down, so the clock restarts at position
+            now = datetime.now()
+            entry.start_time = now - timedelta(seconds=position)
+            entry.paused_duration = timedelta(0)
+            entry.pause_start_time = now if self.queue_manager.is_paused else None
+        return stream
+
+    def set_volume(self, guild, volume: float) -> bool:
+        """
+        Save the guild's volume and apply it to the playing and pre-spawned sources.
+        Returns False when the playing source cannot change volume mid-track (passthrough mode).
+        """
+        guild_settings.set(guild.id, 'volume', volume)
+        prepared = prepared_sources.get(str(guild.id))
+        prepared_gain = find_source(prepared[1], (GainSource, WorkerOpusSource)) if prepared else None
+        if prepared_gain:
+            prepared_gain.set_volume(volume)
+        elif prepared:
+            # Passthrough bakes the volume into ffmpeg, so respawn the next track with the new one
+            self.discard_prepared_source(str(guild.id))
+
+        voice_client = guild.voice_client
+        gain_stage = find_source(voice_client.source, (GainSource, WorkerOpusSource)) if voice_client and voice_client.source else None
+        if gain_stage:
+            gain_stage.set_volume(volume)
+            return True
+        return voice_client is None or voice_client.source is None
+
+    def read_ahead(self, audio_source, guild_id):
+        if READAHEAD_SECONDS <= 0:
+            return audio_source
+        return ReadAheadSource(audio_source, READAHEAD_SECONDS, get_playback_telemetry(guild_id))
+
     def handle_playback_end(self, ctx_or_interaction, entry, error):
+        # Called on discord.py's audio thread: hand the end over to the event loop without waiting on it
+        get_playback_state(ctx_or_interaction.guild.id).post('end', entry, self.finish_playback, ctx_or_interaction, entry, error)
+
+    async def finish_playback(self, ctx_or_interaction, entry, error):
+        # Ended, skipped or stopped: only an unclean shutdown should leave a resume point behind
+        entry.resume_position = None
+        if self.queue_manager.stop_is_triggered:
+            # Nothing follows a stop, so the pre-spawned ffmpeg would only linger
+            self.discard_prepared_source(str(ctx_or_interaction.guild.id))
         self.queue_manager.stop_is_triggered = False
+        if get_playback_state(ctx_or_interaction.guild.id).manual_transition:
+            # The command that stopped the player starts the next track itself
+            server_id = str(ctx_or_interaction.guild.id)
+            if not self.queue_manager.is_restarting:
+                self.queue_manager.last_played_audio[server_id] = entry.title
+            self.queue_manager.is_restarting = False
+            self.queue_manager.save_queues()
+            logging.info(f"Stopped {entry.title} for a track chosen by a command")
+            return
         if error:
             logging.error(f"Error playing {entry.title}: {error}")
             print(f"Error playing {entry.title}: {error}")
-            bot_client = ctx_or_interaction.client if isinstance(ctx_or_interaction, Interaction) else ctx_or_interaction.bot
-            asyncio.run_coroutine_threadsafe(ctx_or_interaction.channel.send("Error occurred during playback."), bot_client.loop).result()
+            get_playback_state(ctx_or_interaction.guild.id).transition('idle')
+            await ctx_or_interaction.channel.send("Error occurred during playback.")
         else:
             logging.info(f"Finished playing {entry.title} at {datetime.now()}")
             print(f"Finished playing {entry.title} at {datetime.now()}")
@@ -146,7 +510,7 @@ class PlaybackManager:
             # queue_manager.last_played_audio[server_id] = entry.title
             # queue_manager.save_queues()
             
-            self.manage_queue_after_playback(ctx_or_interaction, entry)
+            await self.manage_queue_after_playback(ctx_or_interaction, entry)
 
     async def play_next(self, interaction):
         logging.debug("Playing next track in the queue")
@@ -160,6 +524,8 @@ class PlaybackManager:
             
             self.queue_manager.is_restarting = False
             await self.play_next_entry_in_queue(interaction, queue)
+        else:
+            get_playback_state(server_id).transition('idle')
             
     def check_and_arrange_current_entry(self, queue, current_entry):
         if current_entry in queue and not self.queue_manager.is_restarting:
@@ -177,44 +543,51 @@ class PlaybackManager:
         logging.error(f"Error in play_audio: {exception}")
         await ctx_or_interaction.followup.send(f"An error occurred: {exception}")
 
-    async def fetch_info(self, url, index: int = None):
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'noplaylist': False if "list=" in url else True,
-            'playlist_items': str(index) if index is not None else None,
-            'ignoreerrors': True,
-            'cookiefile': 'cookies.txt',
-            'force_generic_extractor': False,
-            'http_headers': {
-                'User-Agent': (
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    )
-                }
-            }
+    async def fetch_info(self, url, index: int = None, max_kbps: Optional[int] = None):
+        cache_key = extraction_cache_key(url, index)
+        if unavailable_videos.contains(cache_key):
+            logging.info(f"Skipping known-unavailable video: {cache_key}")
+            return None
+        if not youtube_breaker.allow_request():
+            logging.warning(youtube_breaker.status_message())
+            return None
 
+        error_log = ExtractionErrorLog()
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logging.debug(f"Fetching info for URL: {url}, index: {index}")
-                info = await asyncio.get_running_loop().run_in_executor(executor, lambda: ydl.extract_info(url, download=False))
-                if 'entries' in info:
-                    entries = []
-                    for entry in info['entries']:
-                        if entry and not entry.get('is_unavailable', False):
-                            entry['duration'] = entry.get('duration', 0)
-                            entry['thumbnail'] = entry.get('thumbnail', '')
-                            entry['best_audio_url'] = next((f['url'] for f in entry['formats'] if f.get('acodec') != 'none'), entry.get('url'))
-                            entries.append(entry)
-                            logging.debug(f"Processing entry: {entry.get('title', 'Unknown title')}")
-                    info['entries'] = entries
-                else:
-                    info['duration'] = info.get('duration', 0)
-                    info['thumbnail'] = info.get('thumbnail', '')
-                    info['best_audio_url'] = next((f['url'] for f in info['formats'] if f.get('acodec') != 'none'), info.get('url'))
-                    logging.debug(f"Processing entry: {info.get('title', 'Unknown title')}")
-                return info
+            logging.debug(f"Fetching info for URL: {url}, index: {index}")
+            info = await extract_info(
+                'resolve', url,
+                noplaylist=False if "list=" in url else True,
+                playlist_items=str(index) if index is not None else None,
+                logger=error_log
+            )
+            if not info or ('entries' in info and not info['entries'] and error_log.last_error):
+                record_extraction_failure(cache_key, error_log.last_error)
+                return None
+            youtube_breaker.record_success()
+            if 'entries' in info:
+                entries = []
+                for entry in info['entries']:
+                    if entry and not entry.get('is_unavailable', False):
+                        entry['duration'] = entry.get('duration', 0)
+                        entry['thumbnail'] = entry.get('thumbnail', '')
+                        entry['best_audio_url'], entry['audio_codec'] = select_audio_format(entry, max_kbps=max_kbps)
+                        entry['audio_bitrate'] = selected_bitrate(entry, entry['best_audio_url'])
+                        entry['resolved_max_kbps'] = max_kbps
+                        entries.append(entry)
+                        logging.debug(f"Processing entry: {entry.get('title', 'Unknown title')}")
+                info['entries'] = entries
+            else:
+                info['duration'] = info.get('duration', 0)
+                info['thumbnail'] = info.get('thumbnail', '')
+                info['best_audio_url'], info['audio_codec'] = select_audio_format(info, max_kbps=max_kbps)
+                info['audio_bitrate'] = selected_bitrate(info, info['best_audio_url'])
+                info['resolved_max_kbps'] = max_kbps
+                logging.debug(f"Processing entry: {info.get('title', 'Unknown title')}")
+            return info
         except yt_dlp.utils.ExtractorError as e:
             logging.warning(f"Skipping unavailable video: {str(e)}")
+            record_extraction_failure(cache_key, str(e))
             return None
         
     def create_queue_entry(self, video_info, index):
@@ -227,18 +600,22 @@ class PlaybackManager:
             is_playlist=True,
             thumbnail=video_info.get('thumbnail', ''),
             playlist_index=index,
-            duration=video_info.get('duration', 0)
+            duration=video_info.get('duration', 0),
+            resolved_at=time.time() if video_info.get('best_audio_url') else None,
+            audio_codec=video_info.get('audio_codec'),
+            audio_bitrate=video_info.get('audio_bitrate'),
+            resolved_max_kbps=video_info.get('resolved_max_kbps')
         )
         
-    async def fetch_first_video_info(self, url):
-        first_video_info = await self.fetch_info(url, index=1)
+    async def fetch_first_video_info(self, url, max_kbps: Optional[int] = None):
+        first_video_info = await self.fetch_info(url, index=1, max_kbps=max_kbps)
         if not first_video_info or 'entries' not in first_video_info or not first_video_info['entries']:
             return None
         return first_video_info['entries'][0]
 
     async def process_play_command(self, interaction, url):
         server_id = str(interaction.guild.id)
-        first_video = await self.fetch_first_video_info(url)
+        first_video = await self.fetch_first_video_info(url, quality_governor.resolve_kbps(interaction.guild))
         if not first_video:
             await interaction.followup.send("Could not retrieve the first video of the playlist.")
             return
@@ -262,7 +639,7 @@ class PlaybackManager:
         if playlist_length > 1:
             for index in range(2, playlist_length + 1):
                 try:
-                    info = await self.fetch_info(url, index=index)
+                    info = await self.fetch_info(url, index=index, max_kbps=quality_governor.resolve_kbps(interaction.guild))
                     if info and 'entries' in info and info['entries']:
                         video = info['entries'][0]
                         if video.get('is_unavailable', False):
@@ -297,76 +674,50 @@ class PlaybackManager:
             print(f"Processing MP3 file: {url}")
             return QueueEntry(video_url=url, best_audio_url=url, title=url.split('/')[-1], is_playlist=False)
         else:
-            video_info = await self.fetch_info(url)
+            video_info = await self.fetch_info(url, max_kbps=quality_governor.resolve_kbps(interaction.guild))
             if video_info:
                 logging.debug(f"Processing single video: {video_info.get('title', 'Unknown title')}")
                 print(f"Processing single video: {video_info.get('title', 'Unknown title')}")
                 return self.create_queue_entry(video_info, None)
             else:
-                await interaction.response.send_message("Error retrieving video data.")
+                message = "Error retrieving video data."
+                if youtube_breaker.state != 'closed':
+                    message = f"{message} {youtube_breaker.status_message()}"
+                await interaction.followup.send(message)
                 logging.error("Error retrieving video data.")
                 print("Error retrieving video data.")
                 return None
 
     async def fetch_playlist_length(self, url):
-        ydl_opts = {
-            'quiet': True,
-            'noplaylist': False,
-            'extract_entries': True,
-            'ignoreerrors': True,
-            'cookiefile': 'cookies.txt',
-            'force_generic_extractor': False,
-            'http_headers': {
-                'User-Agent': (
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    )
-                }
-            }
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logging.debug(f"Fetching playlist length for URL: {url}")
-                info = await asyncio.get_running_loop().run_in_executor(executor, lambda: ydl.extract_info(url, download=False))
-                length = len(info.get('entries', []))
-                logging.info(f"Playlist length: {length}")
-                return length
+            logging.debug(f"Fetching playlist length for URL: {url}")
+            info = await extract_info('flat_list', url)
+            length = len((info or {}).get('entries') or [])
+            logging.info(f"Playlist length: {length}")
+            return length
         except yt_dlp.utils.ExtractorError as e:
             logging.warning(f"Error fetching playlist length: {str(e)}")
             return 0
 
     async def refresh_url_if_needed(self, entry):
-        if 'youtube.com' in entry.video_url or 'youtu.be' in entry.video_url:
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'noplaylist': True,
-                'ignoreerrors': True,
-                'cookiefile': 'cookies.txt',
-                'force_generic_extractor': False,
-                'http_headers': {
-                    'User-Agent': (
-                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                        )
-                    }
-                }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(entry.video_url, download=False)
-                entry.best_audio_url = next((f['url'] for f in info['formats'] if f.get('acodec') != 'none'), entry.video_url)
+        if 'youtube.com' not in entry.video_url and 'youtu.be' not in entry.video_url:
+            return
+        if audio_cache.path_for(extract_video_id(entry.video_url)):
+            logging.debug(f"Playing {entry.title} from the audio cache, no stream URL needed")
+            return
+        if entry.has_fresh_stream_url() and not quality_governor.needs_lower_bitrate(entry):
+            logging.debug(f"Reusing stream URL resolved {time.time() - entry.resolved_at:.0f}s ago for {entry.title}")
+            return
+        # One extraction refreshes both the stream URL and the duration
+        info = await self.fetch_info(entry.video_url, max_kbps=quality_governor.target_kbps(entry.guild_id) if entry.guild_id else None)
+        if info:
+            entry.best_audio_url = info.get('best_audio_url') or entry.video_url
+            entry.duration = info.get('duration') or entry.duration
+            entry.audio_codec = info.get('audio_codec')
+            entry.audio_bitrate = info.get('audio_bitrate')
+            entry.resolved_max_kbps = info.get('resolved_max_kbps')
+            entry.resolved_at = time.time()
 
     async def update_entry_duration(self, entry):
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'ignoreerrors': True,
-            'cookiefile': 'cookies.txt',
-            'force_generic_extractor': False,
-            'http_headers': {
-                'User-Agent': (
-                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    )
-                }
-            }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(entry.video_url, download=False)
-            entry.duration = info.get('duration', 0)
+        info = await extract_info('resolve', entry.video_url)
+        entry.duration = info.get('duration', 0) if info else 0
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.DEBUG, filename='playback.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+TRANSITION_HISTORY = 20
+SIGNAL_TIMEOUT = 10.0  # upper bound on waiting for a signal that never comes, e.g. a player that was never started
+SIGNALS = ('stopped', 'started', 'track_changed')
+
+# event -> (states it is accepted in, state it leads to); None accepts the event in any state
+TRANSITIONS: Dict[str, Tuple[Optional[Tuple[str, ...]], str]] = {
+    'resolve': (None, 'resolving'),
+    'buffer': (('resolving',), 'buffering'),
+    'start': (('buffering',), 'playing'),
+    'pause': (('playing',), 'paused'),
+    'resume': (('paused',), 'playing'),
+    'end': (('buffering', 'playing', 'paused'), 'ending'),
+    'idle': (None, 'idle'),
+}
+
+
+class PlaybackStateMachine:
+    """
+    Playback state of one guild: idle -> resolving -> buffering -> playing <-> paused -> ending.
+
+    Transitions happen on the event loop only. discord.py's audio thread reports
+    the end of a track with post(), which queues the event through
+    call_soon_threadsafe and returns immediately, so the audio thread never waits
+    for the next track to be resolved. Events that do not fit the current state
+    (a late 'end' of a track that was already replaced, for example) are logged
+    and leave the state unchanged. The last transitions are kept for /playback_stats.
+
+    Commands await signals instead of sleeping after voice_client.stop():
+    'stopped' when a player has finished and its end handler has run, 'started'
+    when audio starts, 'track_changed' when a different entry starts resolving.
+    A command that picks the next track itself stops the player with stop_player(),
+    so the end handler does not also advance the queue.
+    """
+
+    def __init__(self, guild_id: str, loop: asyncio.AbstractEventLoop):
+        self.guild_id = guild_id
+        self.loop = loop
+        self.state = 'idle'
+        self.entry = None
+        self.manual_transition = False
+        self.history: Deque[Tuple[float, str, str, str]] = deque(maxlen=TRANSITION_HISTORY)
+        self.waiters: Dict[str, List[asyncio.Future]] = {signal: [] for signal in SIGNALS}
+
+    def transition(self, event: str, entry=None) -> bool:
+        """Apply an event on the event loop. Returns False if the current state does not accept it."""
+        accepted_in, target = TRANSITIONS[event]
+        if event == 'end' and entry is not None and entry is not self.entry:
+            logging.debug(f"Guild {self.guild_id}: ignoring '{event}' for {entry.title}, current entry is another one")
+            return False
+        if accepted_in is not None and self.state not in accepted_in:
+            logging.debug(f"Guild {self.guild_id}: ignoring '{event}' in state {self.state}")
+            return False
+        if event == 'resolve':
+            if entry is not self.entry:
+                self.signal('track_changed')
+            self.entry = entry
+        elif event == 'idle':
+            self.entry = None
+        self.history.append((time.time(), self.state, target, event))
+        logging.debug(f"Guild {self.guild_id}: {self.state} -> {target} on '{event}'")
+        self.state = target
+        if event == 'start':
+            self.signal('started')
+        return True
+
+    def signal(self, signal: str):
+        waiters, self.waiters[signal] = self.waiters[signal], []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(self.entry)
+
+    async def wait_for(self, signal: str, timeout: float = SIGNAL_TIMEOUT) -> bool:
+        """
+        Wait for the next occurrence of a signal. Returns False on timeout.
+
+        Events from the audio thread are only dispatched once the caller yields, so
+        calling voice_client.stop() and then awaiting 'stopped' cannot miss the signal.
+        """
+        waiter = self.loop.create_future()
+        self.waiters[signal].append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            logging.warning(f"Guild {self.guild_id}: no '{signal}' within {timeout:.0f}s, state {self.state}")
+            return False
+        finally:
+            if waiter in self.waiters[signal]:
+                self.waiters[signal].remove(waiter)
+
+    async def stop_player(self, voice_client) -> bool:
+        """
+        Stop the player for a command that starts the next track itself, and wait until its end was handled.
+        While manual_transition is set, the end handler records the stopped track but does not advance the queue.
+        """
+        if not (voice_client.is_playing() or voice_client.is_paused()):
+            return True
+        self.manual_transition = True
+        try:
+            voice_client.stop()
+            return await self.wait_for('stopped')
+        finally:
+            self.manual_transition = False
+
+    def post(self, event: str, entry=None, handler: Optional[Callable[..., Awaitable]] = None, *args):
+        """
+        Thread-safe, non-blocking: queue the event on the event loop.
+        handler(*args) is run as a task on the loop after the transition, whether or not it was accepted.
+        For 'end', 'stopped' is signalled once the handler has finished.
+        """
+        self.loop.call_soon_threadsafe(self.dispatch, event, entry, handler, args)
+
+    def dispatch(self, event: str, entry, handler, args):
+        self.transition(event, entry)
+        task = self.loop.create_task(handler(*args)) if handler is not None else None
+        if event == 'end':
+            # A player did stop, even if its end no longer fits the state
+            if task is None:
+                self.signal('stopped')
+            else:
+                task.add_done_callback(lambda _: self.signal('stopped'))
+
+    def describe(self) -> str:
+        lines = [f"State: {self.state}" + (f" ({self.entry.title})" if self.entry else "")]
+        for at, previous, target, event in list(self.history)[-5:]:
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(at))} {previous} -> {target} ({event})")
+        return '\n'.join(lines)
+
+
+playback_states: Dict[str, PlaybackStateMachine] = {}
+
+
+def get_playback_state(guild_id) -> PlaybackStateMachine:
+    """The guild's state machine, created on first use. Must first be called from the event loop."""
+    guild_id = str(guild_id)
+    if guild_id not in playback_states:
+        playback_states[guild_id] = PlaybackStateMachine(guild_id, asyncio.get_running_loop())
+    return playback_states[guild_id]
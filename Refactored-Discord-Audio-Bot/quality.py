@@ -0,0 +1,115 @@
+import logging
+import os
+import time
+from typing import Dict, Optional
+from config import ADAPTIVE_QUALITY, OPUS_BITRATE, QUALITY_CPU_THRESHOLD, QUALITY_STEP_UP_SECONDS
+from audio_sources import get_playback_telemetry
+
+logging.basicConfig(level=logging.DEBUG, filename='playback.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+# Highest stream and encoder bitrate (kbps) allowed in each tier, best first
+QUALITY_TIERS = [('high', 160), ('medium', 96), ('low', 64), ('minimum', 48)]
+BITRATE_TOLERANCE = 1.1  # a stream this close to the target is not worth re-resolving
+
+
+def host_load() -> Optional[float]:
+    """One-minute load average per core, None where the platform has no load average."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class QualityGovernor:
+    """
+    Picks the audio bitrate for each guild from its voice channel and the host's condition.
+
+    The target is the lowest of the current tier's cap, the voice channel's bitrate
+    and OPUS_BITRATE. Streams are selected within it when a track is resolved, and
+    it is re-evaluated whenever a track starts. A guild steps down
+    one tier when the host's load average per core is above QUALITY_CPU_THRESHOLD
+    or its read-ahead buffer ran dry since the previous track. It steps back up one
+    tier after QUALITY_STEP_UP_SECONDS without pressure.
+    """
+
+    def __init__(self):
+        self.tiers: Dict[str, int] = {}
+        self.changed_at: Dict[str, float] = {}
+        self.channel_kbps: Dict[str, int] = {}
+        self.seen_underruns: Dict[str, int] = {}
+        self.last_reason: Dict[str, str] = {}
+
+    def pressure(self, guild_id: str) -> Optional[str]:
+        load = host_load()
+        if load is not None and load > QUALITY_CPU_THRESHOLD:
+            return f"CPU load {load:.2f} per core"
+        underruns = get_playback_telemetry(guild_id).underruns
+        new_underruns = underruns - self.seen_underruns.get(guild_id, underruns)
+        self.seen_underruns[guild_id] = underruns
+        if new_underruns > 0:
+            return f"{new_underruns} buffer underruns"
+        return None
+
+    def record_channel(self, guild):
+        """Remember the bitrate of the guild's voice channel, if it is connected to one."""
+        voice_client = guild.voice_client
+        if voice_client and getattr(voice_client, 'channel', None) and getattr(voice_client.channel, 'bitrate', None):
+            self.channel_kbps[str(guild.id)] = voice_client.channel.bitrate // 1000
+
+    def evaluate(self, guild):
+        """Record the guild's channel bitrate and move one tier down or up if warranted."""
+        guild_id = str(guild.id)
+        self.record_channel(guild)
+        if not ADAPTIVE_QUALITY:
+            return
+        tier = self.tiers.get(guild_id, 0)
+        now = time.monotonic()
+        reason = self.pressure(guild_id)
+        if reason and tier < len(QUALITY_TIERS) - 1:
+            tier += 1
+        elif not reason and tier > 0 and now - self.changed_at.get(guild_id, 0) >= QUALITY_STEP_UP_SECONDS:
+            tier -= 1
+            reason = "no pressure"
+        else:
+            return
+        self.tiers[guild_id] = tier
+        self.changed_at[guild_id] = now
+        self.last_reason[guild_id] = reason
+        logging.info(f"Guild {guild_id} quality tier now {QUALITY_TIERS[tier][0]} ({reason})")
+
+    def tier_name(self, guild_id) -> str:
+        return QUALITY_TIERS[self.tiers.get(str(guild_id), 0)][0]
+
+    def target_kbps(self, guild_id) -> int:
+        guild_id = str(guild_id)
+        target = min(QUALITY_TIERS[self.tiers.get(guild_id, 0)][1], OPUS_BITRATE)
+        channel_kbps = self.channel_kbps.get(guild_id)
+        return min(target, channel_kbps) if channel_kbps else target
+
+    def resolve_kbps(self, guild) -> int:
+        """Bitrate cap for selecting a stream format for the guild, from its current channel."""
+        self.record_channel(guild)
+        return self.target_kbps(guild.id)
+
+    def needs_lower_bitrate(self, entry) -> bool:
+        """True if entry's stream should be re-resolved to fit the guild's target, whether set by its channel or its tier."""
+        target = self.target_kbps(entry.guild_id)
+        if entry.resolved_max_kbps is not None and entry.resolved_max_kbps <= target:
+            # Selected under this cap already, so another extraction would pick the same format
+            return False
+        if entry.audio_bitrate is None:
+            return self.tiers.get(str(entry.guild_id), 0) > 0
+        return entry.audio_bitrate > target * BITRATE_TOLERANCE
+
+    def describe(self, guild_id) -> str:
+        guild_id = str(guild_id)
+        channel_kbps = self.channel_kbps.get(guild_id)
+        line = f"Quality tier: {self.tier_name(guild_id)}, target {self.target_kbps(guild_id)} kbps"
+        if channel_kbps:
+            line += f" (channel {channel_kbps} kbps)"
+        if guild_id in self.last_reason:
+            line += f", last change: {self.last_reason[guild_id]}"
+        return line
+
+
+quality_governor = QualityGovernor()
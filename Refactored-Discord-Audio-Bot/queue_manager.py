@@ -1,16 +1,22 @@
 import json
 import logging
+import time
+import uuid
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
 from utils import sanitize_title
+from config import RESOLVED_URL_TTL, STREAM_URL_EXPIRY_MARGIN, SILENCE_TRIM
+from state_store import state_store
 
 logging.basicConfig(level=logging.DEBUG, filename='queue_manager.log', format='%(asctime)s:%(levelname)s:%(message)s')
 
 class QueueEntry:
-    def __init__(self, video_url: str, best_audio_url: str, title: str, is_playlist: bool, thumbnail: str = '', playlist_index: Optional[int] = None, duration: int = 0, is_favorited: bool = False, favorited_by: Optional[List[Dict[str, str]]] = None, has_been_arranged: bool = False, has_been_played_after_arranged: bool = False, timestamp: Optional[str] = None, paused_duration: Optional[float] = 0.0, guild_id: Optional[str] = None, pause_start_time: Optional[datetime] = None, start_time: Optional[datetime] = None):
+    def __init__(self, video_url: str, best_audio_url: str, title: str, is_playlist: bool, thumbnail: str = '', playlist_index: Optional[int] = None, duration: int = 0, is_favorited: bool = False, favorited_by: Optional[List[Dict[str, str]]] = None, has_been_arranged: bool = False, has_been_played_after_arranged: bool = False, timestamp: Optional[str] = None, paused_duration: Optional[float] = 0.0, guild_id: Optional[str] = None, pause_start_time: Optional[datetime] = None, start_time: Optional[datetime] = None, resolved_at: Optional[float] = None, audio_codec: Optional[str] = None, loudness_gain_db: Optional[float] = None, resume_position: Optional[float] = None, trim_start: Optional[float] = None, trim_end: Optional[float] = None, audio_bitrate: Optional[float] = None, resolved_max_kbps: Optional[int] = None, entry_id: Optional[str] = None):
         logging.debug(f"Creating QueueEntry: {title}, URL: {video_url}")
         print(f"Creating QueueEntry: {title}, URL: {video_url}, Guild ID: {guild_id}")
         self.video_url = video_url
+        self.entry_id = entry_id or uuid.uuid4().hex[:12]  # Tells apart entries of the same URL, kept across restarts
         self.best_audio_url = best_audio_url
         self.title = sanitize_title(title)
         self.is_playlist = is_playlist
@@ -26,6 +32,41 @@ class QueueEntry:
         self.start_time = start_time or datetime.now()
         self.paused_duration = timedelta(seconds=paused_duration) if isinstance(paused_duration, (int, float)) else timedelta(seconds=0.0)
         self.guild_id = guild_id
+        self.resolved_at = resolved_at  # Unix time best_audio_url was extracted, None if never resolved
+        self.audio_codec = audio_codec  # Codec of best_audio_url as reported by yt-dlp, e.g. 'opus'
+        self.audio_bitrate = audio_bitrate  # kbps of best_audio_url, None if unknown
+        self.resolved_max_kbps = resolved_max_kbps  # Bitrate cap best_audio_url was selected under, None if uncapped
+        self.loudness_gain_db = loudness_gain_db  # Normalization gain from audio_analysis, None until measured
+        self.resume_position = resume_position  # Seconds in when the bot last checkpointed this entry mid-play
+        self.trim_start = trim_start  # End of leading silence in seconds, None until analyzed
+        self.trim_end = trim_end  # Start of trailing silence in seconds, None if there is none to trim
+
+    def has_fresh_stream_url(self) -> bool:
+        """True if best_audio_url came from a recent extraction and can be played without resolving again."""
+        if not self.resolved_at or not self.best_audio_url.startswith('http'):
+            return False
+        now = time.time()
+        # googlevideo URLs carry their own expiry timestamp
+        expire = parse_qs(urlparse(self.best_audio_url).query).get('expire')
+        if expire and expire[0].isdigit():
+            return now < int(expire[0]) - STREAM_URL_EXPIRY_MARGIN
+        return now - self.resolved_at < RESOLVED_URL_TTL
+
+    def playback_position(self) -> float:
+        """Seconds of the track played so far, excluding time spent paused."""
+        now = datetime.now()
+        elapsed = now - self.start_time - self.paused_duration
+        if self.pause_start_time:
+            elapsed -= now - self.pause_start_time
+        return max(0.0, elapsed.total_seconds())
+
+    def trimmed_start(self) -> float:
+        """Position playback starts at: after the leading silence, if it has been measured."""
+        return (self.trim_start or 0.0) if SILENCE_TRIM else 0.0
+
+    def trimmed_end(self) -> float:
+        """Position playback ends at: before the trailing silence, otherwise the full duration."""
+        return self.trim_end if SILENCE_TRIM and self.trim_end else self.duration
 
     def to_dict(self):
         data = self.__dict__.copy()
@@ -73,6 +114,10 @@ class BotQueue:
         return True
 
     def load_queues(self) -> Dict[str, List[QueueEntry]]:
+        if state_store:
+            queues_data = state_store.load_queues()
+            logging.info(f"Loaded {len(queues_data)} queues from the state store")
+            return {server_id: [QueueEntry.from_dict(entry) for entry in entries] for server_id, entries in queues_data.items()}
         try:
             with open('queues.json', 'r') as file:
                 queues_data = json.load(file)
@@ -93,6 +138,11 @@ class BotQueue:
                     logging.error(f"Queue validation failed for server {server_id}, skipping save.")
                     print(f"Queue validation failed for server {server_id}, skipping save.")
                     return
+            if state_store:
+                state_store.save_queues({k: [entry.to_dict() for entry in v] for k, v in self.queues.items()}, self.last_played_audio)
+                logging.info("Queues and last played audio saved to the state store")
+                self.queue_cache = self.queues.copy()
+                return
             with open('queues.json', 'w') as file:
                 json.dump({k: [entry.to_dict() for entry in v] for k, v in self.queues.items()}, file, indent=4)
             logging.info("Queues saved successfully")
@@ -153,6 +203,8 @@ class BotQueue:
     def load_last_played_audio(self) -> Dict[str, Optional[str]]:
         logging.debug("Loading last played audio from file")
         print("Loading last played audio from file")
+        if state_store:
+            return state_store.load_last_played()
         try:
             with open('last_played_audio.json', 'r') as file:
                 data = json.load(file)
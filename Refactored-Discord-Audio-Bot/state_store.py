@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import SHARD_COUNT, SHARD_ID, STATE_BACKEND, STATE_DB_PATH
+
+logging.basicConfig(level=logging.DEBUG, filename='state_store.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+BUSY_TIMEOUT = 5.0  # seconds a write waits for another shard's transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queues (
+    guild_id TEXT PRIMARY KEY,
+    entries TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_played (
+    guild_id TEXT PRIMARY KEY,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL
+);
+"""
+
+
+def shard_for_guild(guild_id, shard_count: int = SHARD_COUNT) -> int:
+    """The shard Discord routes a guild to: (guild_id >> 22) % shard_count."""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def owns_guild(guild_id) -> bool:
+    """True if this process's shard is the one that may write the guild's state."""
+    return SHARD_COUNT <= 1 or shard_for_guild(guild_id) == SHARD_ID
+
+
+class StateStore:
+    """
+    Queues, last played titles and guild settings in one SQLite file shared by all shards.
+
+    The database runs in WAL mode, so shards read while another one writes.
+    State is stored one row per guild, and each shard writes only the guilds it owns
+    (see owns_guild), so shards never overwrite each other. A restarted shard
+    reloads its guilds' queues from the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # NORMAL is durable across application crashes in WAL mode, only a power loss can drop the last commits
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def load_queues(self) -> Dict[str, List[dict]]:
+        with self.lock:
+            rows = self.connection.execute('SELECT guild_id, entries FROM queues').fetchall()
+        return {guild_id: json.loads(entries) for guild_id, entries in rows if owns_guild(guild_id)}
+
+    def save_queues(self, queues: Dict[str, List[dict]], last_played: Dict[str, Optional[str]]):
+        now = time.time()
+        queue_rows = [(guild_id, json.dumps(entries), now) for guild_id, entries in queues.items() if owns_guild(guild_id)]
+        last_played_rows = [(guild_id, title) for guild_id, title in last_played.items() if owns_guild(guild_id)]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO queues (guild_id, entries, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(guild_id) DO UPDATE SET entries = excluded.entries, updated_at = excluded.updated_at',
+                queue_rows
+            )
+            self.connection.executemany(
+                'INSERT INTO last_played (guild_id, title) VALUES (?, ?) '
+                'ON CONFLICT(guild_id) DO UPDATE SET title = excluded.title',
+                last_played_rows
+            )
+
+    def load_last_played(self) -> Dict[str, Optional[str]]:
+        with self.lock:
+            rows = self.connection.execute('SELECT guild_id, title FROM last_played').fetchall()
+        return {guild_id: title for guild_id, title in rows if owns_guild(guild_id)}
+
+    def load_guild_settings(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute('SELECT guild_id, settings FROM guild_settings').fetchall()
+        return {guild_id: json.loads(settings) for guild_id, settings in rows if owns_guild(guild_id)}
+
+    def save_guild_settings(self, guild_id: str, settings: Dict[str, Any]):
+        if not owns_guild(guild_id):
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO guild_settings (guild_id, settings) VALUES (?, ?) '
+                'ON CONFLICT(guild_id) DO UPDATE SET settings = excluded.settings',
+                (guild_id, json.dumps(settings))
+            )
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return not any(self.connection.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone()
+                           for table in ('queues', 'last_played', 'guild_settings'))
+
+    def import_json_files(self, queues_file: str, last_played_file: str, settings_file: str):
+        """One-time migration of the JSON files written by the single-process bot."""
+        def read(path: str) -> dict:
+            if not os.path.exists(path):
+                return {}
+            try:
+                with open(path, 'r') as file:
+                    return json.load(file)
+            except json.JSONDecodeError as e:
+                logging.error(f"Skipping {path} during migration: {e}")
+                return {}
+
+        queues = read(queues_file)
+        last_played = read(last_played_file)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO queues VALUES (?, ?, ?)',
+                                        [(guild_id, json.dumps(entries), now) for guild_id, entries in queues.items()])
+            self.connection.executemany('INSERT OR IGNORE INTO last_played VALUES (?, ?)', list(last_played.items()))
+            self.connection.executemany('INSERT OR IGNORE INTO guild_settings VALUES (?, ?)',
+                                        [(guild_id, json.dumps(settings)) for guild_id, settings in read(settings_file).items()])
+        logging.info(f"Imported {len(queues)} queues from {queues_file} into {self.path}")
+
+
+def open_state_store() -> Optional[StateStore]:
+    """The shared store when STATE_BACKEND is 'sqlite', None for the per-process JSON files."""
+    if STATE_BACKEND != 'sqlite':
+        return None
+    store = StateStore(STATE_DB_PATH)
+    if store.is_empty():
+        store.import_json_files('queues.json', 'last_played_audio.json', 'guild_settings.json')
+    return store
+
+
+state_store = open_state_store()
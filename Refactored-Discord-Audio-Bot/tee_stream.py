@@ -0,0 +1,172 @@
+import http.client
+import logging
+import os
+import re
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from ytdl_pool import USER_AGENT
+
+logging.basicConfig(level=logging.DEBUG, filename='tee_stream.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+RANGE_CHUNK_SIZE = 4 * 1024 * 1024  # googlevideo throttles unranged reads, so the stream is fetched in ranges
+READ_SIZE = 64 * 1024
+MAX_RETRIES = 3
+CONNECT_TIMEOUT = 10
+CONTENT_RANGE_PATTERN = re.compile(r'bytes \d+-\d+/(\d+)')
+MIME_EXTENSIONS = {'audio/webm': 'webm', 'audio/mp4': 'm4a', 'audio/mpeg': 'mp3', 'audio/ogg': 'ogg'}
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections per host, shared by every tee stream."""
+
+    def __init__(self, max_per_host: int = 4):
+        self.max_per_host = max_per_host
+        self.lock = threading.Lock()
+        self.idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+
+    def get(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        with self.lock:
+            connections = self.idle.get((scheme, host))
+            if connections:
+                return connections.pop()
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return connection_class(host, timeout=CONNECT_TIMEOUT)
+
+    def put(self, scheme: str, host: str, connection: http.client.HTTPConnection):
+        with self.lock:
+            connections = self.idle.setdefault((scheme, host), [])
+            if len(connections) < self.max_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+
+connection_pool = ConnectionPool()
+
+
+def stream_extension(url: str) -> str:
+    """File extension for a googlevideo URL, taken from its mime query parameter."""
+    mime = parse_qs(urlparse(url).query).get('mime', [''])[0]
+    return MIME_EXTENSIONS.get(mime, 'webm')
+
+
+def discard_partial_file(file, part_path: str, on_finish: Callable[[Optional[str]], None]):
+    """Finalizer for a tee stream that was dropped before the whole track was read."""
+    if not file.closed:
+        file.close()
+    if os.path.exists(part_path):
+        os.remove(part_path)
+        logging.debug(f"Discarded partial cache file {part_path}")
+    on_finish(None)
+
+
+class TeeStream:
+    """
+    File-like object that streams a remote track for ffmpeg's stdin while
+    writing the same bytes to a cache file.
+
+    The track is fetched with ranged requests on pooled keep-alive connections.
+    A dropped connection is resumed from the current offset. When the last byte
+    has been read, the partial file is renamed into place and on_finish is
+    called with its path. If the stream is abandoned first, for example because
+    the track was skipped and discord.py's pipe writer stopped reading, the
+    partial file is removed when the stream is closed or garbage collected and
+    on_finish is called with None.
+    """
+
+    def __init__(self, url: str, part_path: str, final_path: str, on_finish: Callable[[Optional[str]], None]):
+        self.url = url
+        parsed = urlparse(url)
+        self.scheme = parsed.scheme
+        self.host = parsed.netloc
+        self.path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        self.part_path = part_path
+        self.final_path = final_path
+        self.on_finish = on_finish
+        self.position = 0
+        self.total: Optional[int] = None
+        self.connection: Optional[http.client.HTTPConnection] = None
+        self.response: Optional[http.client.HTTPResponse] = None
+        self.range_end = -1
+        self.failed = False
+        self.file = open(part_path, 'wb')
+        self.finalizer = weakref.finalize(self, discard_partial_file, self.file, part_path, on_finish)
+
+    def request_next_range(self):
+        self.range_end = self.position + RANGE_CHUNK_SIZE - 1
+        if self.total is not None:
+            self.range_end = min(self.range_end, self.total - 1)
+        self.connection = self.connection or connection_pool.get(self.scheme, self.host)
+        self.connection.request('GET', self.path, headers={
+            'Range': f'bytes={self.position}-{self.range_end}',
+            'User-Agent': USER_AGENT,
+        })
+        self.response = self.connection.getresponse()
+        if self.response.status == 200:
+            # Server ignored the range and is sending the whole file
+            self.total = int(self.response.getheader('Content-Length', 0)) or None
+            self.range_end = self.total - 1 if self.total else float('inf')
+        elif self.response.status == 206:
+            match = CONTENT_RANGE_PATTERN.match(self.response.getheader('Content-Range', ''))
+            if match:
+                self.total = int(match.group(1))
+        else:
+            raise http.client.HTTPException(f"HTTP {self.response.status} for range starting at {self.position}")
+
+    def release_connection(self):
+        if self.connection is not None:
+            connection_pool.put(self.scheme, self.host, self.connection)
+            self.connection = None
+
+    def drop_connection(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self.response = None
+
+    def read(self, size: int = READ_SIZE) -> bytes:
+        if self.failed or (self.total is not None and self.position >= self.total):
+            return b''
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if self.response is None:
+                    self.request_next_range()
+                data = self.response.read(min(size, READ_SIZE))
+                if not data:
+                    if self.total is None and self.range_end == float('inf'):
+                        # Unranged response without a length ends at EOF
+                        self.total = self.position
+                        self.complete()
+                        return b''
+                    raise http.client.IncompleteRead(b'')
+                self.position += len(data)
+                self.file.write(data)
+                if self.position > self.range_end:
+                    # Range fully read; the connection is idle again and can serve the next one
+                    self.response = None
+                    self.release_connection()
+                if self.total is not None and self.position >= self.total:
+                    self.complete()
+                return data
+            except (OSError, http.client.HTTPException) as e:
+                logging.warning(f"Tee stream read failed at byte {self.position} (attempt {attempt + 1}): {e}")
+                self.drop_connection()
+        # Give ffmpeg EOF; the partial file is discarded when the stream is dropped
+        self.failed = True
+        return b''
+
+    def complete(self):
+        self.file.close()
+        self.finalizer.detach()
+        os.replace(self.part_path, self.final_path)
+        logging.info(f"Tee stream finished, cached {self.total} bytes at {self.final_path}")
+        try:
+            self.on_finish(self.final_path)
+        except Exception as e:
+            logging.error(f"Failed to register tee-cached file {self.final_path}: {e}")
+
+    def close(self):
+        self.drop_connection()
+        self.finalizer()
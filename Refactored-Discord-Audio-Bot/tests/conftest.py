@@ -0,0 +1,155 @@
+"""
+Shared test setup.
+
+The bot's modules read and write queues.json, *.log and the cache directory in the
+working directory at import time, so the whole session runs in a temporary one.
+Third-party packages that are not installed (discord.py, yt-dlp, ...) are replaced
+by minimal stand-ins so the playback logic can be tested offline; when the real
+package is installed it is used as is.
+"""
+import asyncio
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# Set in .env for a real bot; utils.py builds its lyricsgenius client at import time
+os.environ.setdefault('genius_api_token', 'test-token')
+
+WORKING_DIR = tempfile.mkdtemp(prefix='audio-bot-tests-')
+os.chdir(WORKING_DIR)
+atexit.register(shutil.rmtree, WORKING_DIR, True)
+
+
+class StandInModule(types.ModuleType):
+    """Any attribute not defined explicitly is a class that accepts and ignores all arguments."""
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        placeholder = type(name, (), {'__init__': lambda self, *args, **kwargs: None})
+        setattr(self, name, placeholder)
+        return placeholder
+
+
+def stand_in(name: str, **attributes) -> types.ModuleType:
+    module = StandInModule(name)
+    for attribute, value in attributes.items():
+        setattr(module, attribute, value)
+    sys.modules[name] = module
+    if '.' in name:
+        parent, child = name.rsplit('.', 1)
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def is_installed(name: str) -> bool:
+    try:
+        importlib.import_module(name)
+        return True
+    except ImportError:
+        return False
+
+
+if not is_installed('discord'):
+    class AudioSource:
+        def read(self) -> bytes:
+            raise NotImplementedError
+
+        def is_opus(self) -> bool:
+            return False
+
+        def cleanup(self):
+            pass
+
+    class HTTPException(Exception):
+        pass
+
+    class NotFound(HTTPException):
+        pass
+
+    class Item:
+        def __init__(self, label=None, style=None, custom_id=None, **kwargs):
+            self.label = label
+            self.style = style
+            self.custom_id = custom_id
+
+    class View:
+        def __init__(self, timeout=None):
+            self.children = []
+            self.stopped = False
+
+        def clear_items(self):
+            self.children.clear()
+
+        def add_item(self, item):
+            self.children.append(item)
+
+        def stop(self):
+            self.stopped = True
+
+        def is_finished(self) -> bool:
+            return self.stopped
+
+    stand_in('discord', AudioSource=AudioSource, InteractionType=types.SimpleNamespace(component=3),
+             ButtonStyle=types.SimpleNamespace(primary=1, secondary=2, success=3, danger=4))
+    stand_in('discord.errors', HTTPException=HTTPException, NotFound=NotFound)
+    stand_in('discord.ui', Button=Item, View=View)
+    stand_in('discord.ext')
+    stand_in('discord.ext.commands')
+    stand_in('discord.utils', get=lambda iterable, **attrs: None)
+    stand_in('discord.opus')
+    stand_in('discord.app_commands')
+
+if not is_installed('yt_dlp'):
+    class DownloadError(Exception):
+        pass
+
+    class ExtractorError(Exception):
+        pass
+
+    stand_in('yt_dlp')
+    stand_in('yt_dlp.utils', DownloadError=DownloadError, ExtractorError=ExtractorError)
+
+if not is_installed('dotenv'):
+    stand_in('dotenv', load_dotenv=lambda *args, **kwargs: None)
+
+for package in ('aiohttp', 'lyricsgenius'):
+    if not is_installed(package):
+        stand_in(package)
+
+if not is_installed('mutagen'):
+    stand_in('mutagen')
+    stand_in('mutagen.mp3')
+
+
+def run(coroutine):
+    """Run a coroutine on a fresh event loop, the way the bot's commands are run."""
+    return asyncio.run(coroutine)
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_playback():
+    """Empty queues and no per-guild state, as after a restart of the bot."""
+    from playback_state import playback_states
+    from queue_manager import queue_manager
+    playback_states.clear()
+    queue_manager.queues.clear()
+    queue_manager.queue_cache.clear()
+    queue_manager.last_played_audio.clear()
+    queue_manager.currently_playing = None
+    queue_manager.is_paused = False
+    queue_manager.is_restarting = False
+    queue_manager.stop_is_triggered = False
+    queue_manager.has_been_shuffled = False
+    queue_manager.loop = False
+    yield
+    playback_states.clear()
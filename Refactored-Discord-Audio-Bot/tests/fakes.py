@@ -0,0 +1,118 @@
+"""Stand-ins for the discord.py objects a command handler touches."""
+import itertools
+from types import SimpleNamespace
+
+message_ids = itertools.count(1)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+        self.deferred = False
+
+    def is_done(self) -> bool:
+        return self.deferred or bool(self.sent)
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+
+class FakeMessage:
+    def __init__(self, content=None):
+        self.id = next(message_ids)
+        self.content = content
+        self.embeds = []
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+
+    async def delete(self):
+        self.edits.append('deleted')
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+        return FakeMessage(content)
+
+
+class FakeVoiceClient:
+    """A voice client whose player ends, and calls its after callback, when stopped."""
+
+    def __init__(self, channel_bitrate: int = 64000):
+        self.channel = SimpleNamespace(bitrate=channel_bitrate)
+        self._source = None
+        self.after = None
+        self.played = []
+        self.playing = False
+        self.paused = False
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, value):
+        # Like discord.py's AudioPlayer._set_source: pause, swap, resume
+        self._source = value
+        if self.paused:
+            self.playing, self.paused = True, False
+
+    def is_playing(self) -> bool:
+        return self.playing
+
+    def is_paused(self) -> bool:
+        return self.paused
+
+    def is_connected(self) -> bool:
+        return True
+
+    def play(self, source, after=None):
+        self.played.append(source)
+        self.source = source
+        self.after = after
+        self.playing = True
+
+    def pause(self):
+        self.playing, self.paused = False, True
+
+    def resume(self):
+        self.playing, self.paused = True, False
+
+    def stop(self):
+        after, self.after = self.after, None
+        self.playing = self.paused = False
+        if after is not None:
+            after(None)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, voice_client=None):
+        self.id = guild_id
+        self.name = f"Guild {guild_id}"
+        self.voice_client = voice_client
+
+
+class FakeInteraction:
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = FakeChannel()
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.user = SimpleNamespace(id=1, name='listener', voice=SimpleNamespace(channel=SimpleNamespace(bitrate=64000)))
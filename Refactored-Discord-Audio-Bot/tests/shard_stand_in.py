@@ -0,0 +1,45 @@
+"""
+One bot shard without a gateway connection, for testing several shards offline.
+
+Run it the way launcher.py runs bot.py, with SHARD_ID and SHARD_COUNT in the
+environment, plus STATE_DB_PATH and AUDIO_CACHE_DIR pointing at shared test
+locations:
+
+    python shard_stand_in.py write <guild_id>...   queue a track, set a volume and cache a file per guild
+    python shard_stand_in.py read                  print the state this shard loads as JSON
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import conftest  # noqa: E402,F401  installs stand-ins for missing packages and puts the bot on sys.path
+
+from audio_cache import audio_cache  # noqa: E402
+from config import SHARD_ID  # noqa: E402
+from guild_settings import guild_settings  # noqa: E402
+from queue_manager import QueueEntry, queue_manager  # noqa: E402
+
+
+def write(guild_ids):
+    for guild_id in guild_ids:
+        queue_manager.add_to_queue(guild_id, QueueEntry(f"https://www.youtube.com/watch?v={guild_id}", '', f"track {guild_id}", False, guild_id=guild_id))
+        guild_settings.set(guild_id, 'volume', SHARD_ID + 0.5)
+        path = os.path.join(audio_cache.directory, f"{guild_id}.opus")
+        with open(path, 'wb') as file:
+            file.write(b'audio')
+        audio_cache.add(guild_id, path, 'opus')
+    queue_manager.save_queues()
+
+
+def read():
+    print(json.dumps({
+        'queues': {guild_id: [entry.title for entry in queue] for guild_id, queue in queue_manager.queues.items()},
+        'settings': guild_settings.settings,
+        'cache_directory': os.path.abspath(audio_cache.directory),
+        'cached': sorted(audio_cache.entries),
+    }))
+
+
+if __name__ == '__main__':
+    write(sys.argv[2:]) if sys.argv[1] == 'write' else read()
@@ -0,0 +1,29 @@
+import audio_analysis
+from audio_analysis import AudioAnalysis, AudioAnalyzer
+from conftest import run
+from queue_manager import QueueEntry, queue_manager
+
+
+def local_entry(path):
+    return QueueEntry(path, path, path, False, guild_id='1')
+
+
+def test_silent_track_does_not_stop_analysis_of_the_rest_of_the_queue(monkeypatch, tmp_path):
+    silent, loud = tmp_path / 'silent.mp3', tmp_path / 'loud.mp3'
+    silent.write_bytes(b'')
+    loud.write_bytes(b'')
+    analyses = {
+        str(silent): AudioAnalysis(None, 0.0, None),  # what analyze_file returns for silence or < 400 ms
+        str(loud): AudioAnalysis(-20.0, 0.5, 100.0),
+    }
+    monkeypatch.setattr(audio_analysis, 'analyze_file', lambda path: analyses[path])
+    queue_manager.queues['1'] = [local_entry(str(silent)), local_entry(str(loud))]
+    analyzer = AudioAnalyzer(queue_manager)
+
+    run(analyzer.analyze_pending())
+    run(analyzer.analyze_pending())
+
+    silent_entry, loud_entry = queue_manager.queues['1']
+    assert silent_entry.loudness_gain_db == 0.0
+    assert loud_entry.loudness_gain_db == audio_analysis.normalization_gain_db(-20.0)
+    assert (loud_entry.trim_start, loud_entry.trim_end) == (0.5, 100.0)
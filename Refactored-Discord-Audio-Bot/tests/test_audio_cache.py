@@ -0,0 +1,55 @@
+import os
+import shutil
+import subprocess
+import pytest
+import command_functions
+import playback
+from audio_cache import GAIN_EXTENSION, AudioCache
+from queue_manager import QueueEntry
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+VIDEO_URL = f'https://www.youtube.com/watch?v={VIDEO_ID}'
+
+
+def make_entry(loudness_gain_db):
+    return QueueEntry(VIDEO_URL, 'https://rr1---sn-test.googlevideo.com/videoplayback', 'Test track', False,
+                      guild_id='1', audio_codec='opus', loudness_gain_db=loudness_gain_db)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+def test_loudness_gain_is_baked_into_the_cache_file_once(tmp_path):
+    cache = AudioCache(str(tmp_path), 100 * 1024 * 1024, 1)
+    source_path = os.path.join(tmp_path, f'{VIDEO_ID}.webm')
+    subprocess.run(['ffmpeg', '-nostdin', '-v', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=1',
+                    '-c:a', 'libopus', source_path], check=True)
+    cache.add(VIDEO_ID, source_path, 'opus')
+    cache.bake_gain(VIDEO_ID, -6.0)
+    cache.bake_gain(VIDEO_ID, -6.0)
+    cache.normalizer.shutdown(wait=True)
+
+    item = cache.lookup(VIDEO_ID)
+    assert item['path'].endswith(GAIN_EXTENSION)
+    assert item['baked_gain_db'] == -6.0
+    assert cache.baked_gain_db(item['path']) == -6.0
+    assert sorted(os.listdir(tmp_path)) == sorted(['index.json', os.path.basename(item['path'])])
+
+
+@pytest.mark.parametrize('loudness_gain_db', [-6.0, None])
+def test_cached_track_with_baked_gain_plays_without_ffmpeg(monkeypatch, loudness_gain_db):
+    opened = []
+
+    class OggOpusSource:
+        def __init__(self, path, start_packet=0, end_packet=None):
+            opened.append(path)
+
+    monkeypatch.setattr(playback, 'PLAYBACK_MODE', 'passthrough')
+    monkeypatch.setattr(playback, 'LOUDNESS_NORMALIZATION', True)
+    monkeypatch.setattr(playback, 'OggOpusSource', OggOpusSource)
+    monkeypatch.setattr(playback.audio_cache, 'lookup', lambda video_id: {
+        'path': f'/cache/{VIDEO_ID}{GAIN_EXTENSION}', 'acodec': 'opus', 'baked_gain_db': -6.0,
+    })
+
+    source = command_functions.playback_manager.create_audio_source(make_entry(loudness_gain_db), '1', volume=1.0)
+
+    assert isinstance(source, OggOpusSource)
+    assert opened == [f'/cache/{VIDEO_ID}{GAIN_EXTENSION}']
@@ -0,0 +1,44 @@
+import shutil
+import subprocess
+import pytest
+from audio_sources import OggOpusSource
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='needs ffmpeg')
+
+
+def encode(path, seconds, frame_duration):
+    subprocess.run(['ffmpeg', '-nostdin', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'anoisesrc=color=pink:duration={seconds}',
+                    '-ac', '2', '-ar', '48000', '-c:a', 'libopus', '-frame_duration', str(frame_duration), '-f', 'ogg', str(path)],
+                   check=True)
+    return str(path)
+
+
+def test_construction_indexes_only_the_start_of_the_file(tmp_path):
+    path = encode(tmp_path / 'track.opus', 60, 20)
+    source = OggOpusSource(path)
+    indexed = len(source.packets)
+
+    packets = []
+    while packet := source.read():
+        packets.append(packet)
+
+    assert indexed < 1000
+    assert 3000 <= len(packets) <= 3001  # the encoder may add a priming packet
+    assert source.packet_count == len(packets)
+
+
+def test_packets_other_than_20_ms_are_refused_when_constructed(tmp_path):
+    path = encode(tmp_path / 'track.opus', 1, 40)
+    with pytest.raises(ValueError):
+        OggOpusSource(path)
+
+
+def test_start_and_end_packet_bound_playback(tmp_path):
+    path = encode(tmp_path / 'track.opus', 10, 20)
+    source = OggOpusSource(path, start_packet=100, end_packet=150)
+    packets = []
+    while packet := source.read():
+        packets.append(packet)
+    assert len(packets) == 50
+    source.cleanup()
+    assert source.read() == b''
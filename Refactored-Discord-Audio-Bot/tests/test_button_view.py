@@ -0,0 +1,24 @@
+import inspect
+from button_view import BUTTON_HANDLERS, button_custom_id, entry_key, find_entry
+from conftest import run
+from queue_manager import QueueEntry, queue_manager
+
+
+def test_every_button_handler_takes_interaction_entry_and_view():
+    for action, handler in BUTTON_HANDLERS.items():
+        assert list(inspect.signature(handler).parameters) == ['interaction', 'entry', 'button_view'], action
+
+
+def test_entries_of_the_same_url_get_their_own_button_ids():
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    first, second = QueueEntry(url, url, 'Track', False, guild_id='1'), QueueEntry(url, url, 'Track', False, guild_id='1')
+    queue_manager.queues['1'] = [first, second]
+
+    assert button_custom_id('pause', '1', first) != button_custom_id('pause', '1', second)
+
+    async def lookup():
+        return find_entry('1', entry_key(second))
+
+    assert run(lookup()) is second
+    restored = QueueEntry.from_dict(second.to_dict())
+    assert entry_key(restored) == entry_key(second)
@@ -0,0 +1,18 @@
+import extraction_guard
+from extraction_guard import CircuitBreaker
+
+
+def test_lost_probe_is_replaced_after_the_probe_timeout(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(extraction_guard.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, failure_window=60, cooldown=10, probe_timeout=30)
+    breaker.record_failure('HTTP Error 429')
+
+    now[0] += 10
+    assert breaker.allow_request()  # the probe, which is then cancelled without an outcome
+    now[0] += 29
+    assert not breaker.allow_request()
+    now[0] += 1
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import playback
+from conftest import run
+from fakes import FakeGuild, FakeInteraction, FakeVoiceClient
+from playback_state import get_playback_state
+from queue_manager import QueueEntry, queue_manager
+
+
+def make_entry(title: str, guild_id: int) -> QueueEntry:
+    return QueueEntry(f"https://www.youtube.com/watch?v={title}", '', title, False, duration=200, guild_id=str(guild_id))
+
+
+def start(guild_id: int, entry: QueueEntry):
+    state = get_playback_state(guild_id)
+    for event in ('resolve', 'buffer', 'start'):
+        state.transition(event, entry)
+    queue_manager.set_currently_playing(entry)
+
+
+def test_next_source_is_prepared_while_another_guild_plays(monkeypatch):
+    manager = playback.PlaybackManager(queue_manager)
+    spawned = []
+
+    async def refresh_url_if_needed(entry):
+        pass
+
+    monkeypatch.setattr(manager, 'refresh_url_if_needed', refresh_url_if_needed)
+    monkeypatch.setattr(manager, 'create_audio_source', lambda entry, guild_id, **kwargs: spawned.append((guild_id, entry)) or object())
+
+    async def scenario():
+        current, following = make_entry('current', 1), make_entry('following', 1)
+        queue_manager.queues['1'] = [current, following]
+        start(1, current)
+        current.start_time = datetime.now() - timedelta(seconds=199)  # inside the preparation lead
+        start(2, make_entry('elsewhere', 2))  # the shared currently_playing now belongs to guild 2
+        interaction = FakeInteraction(FakeGuild(1, FakeVoiceClient()))
+        await manager.prepare_next_source(interaction, current)
+        return following
+
+    following = run(scenario())
+    assert spawned == [('1', following)]
+    assert playback.prepared_sources.pop('1')[0] is following
@@ -0,0 +1,42 @@
+from conftest import run
+from fakes import FakeMessage
+from now_playing_scheduler import NowPlayingScheduler
+from playback_state import get_playback_state
+from queue_manager import QueueEntry, queue_manager
+
+
+def start(guild_id, title):
+    entry = QueueEntry(f"https://www.youtube.com/watch?v={title}", '', title, False, guild_id=str(guild_id))
+    state = get_playback_state(guild_id)
+    for event in ('resolve', 'buffer', 'start'):
+        state.transition(event, entry)
+    queue_manager.set_currently_playing(entry)
+    return entry
+
+
+def test_a_track_starting_in_another_guild_does_not_end_this_guild_message():
+    async def scenario():
+        scheduler = NowPlayingScheduler()
+        scheduler.start = lambda: None
+        first = start(1, 'first')
+        message = FakeMessage()
+        scheduler.track(message, first, 1)
+        start(2, 'second')  # now the globally "currently playing" entry
+        tracked = scheduler.messages[message.id]
+        status = scheduler.playback_status(tracked)
+        get_playback_state(1).transition('pause')
+        return status, scheduler.playback_status(tracked)
+
+    assert run(scenario()) == ('playing', 'paused')
+
+
+def test_message_ends_when_its_guild_moves_on():
+    async def scenario():
+        scheduler = NowPlayingScheduler()
+        scheduler.start = lambda: None
+        message = FakeMessage()
+        scheduler.track(message, start(1, 'first'), 1)
+        start(1, 'second')
+        return scheduler.playback_status(scheduler.messages[message.id])
+
+    assert run(scenario()) == 'ended'
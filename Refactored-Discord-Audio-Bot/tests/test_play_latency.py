@@ -0,0 +1,49 @@
+import command_functions
+import playback
+from conftest import run
+from fakes import FakeGuild, FakeInteraction, FakeVoiceClient
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+STREAM_URL = 'https://rr1---sn-test.googlevideo.com/videoplayback?mime=audio%2Fwebm&expire=9999999999'
+
+
+class CountingVoiceClient(FakeVoiceClient):
+    """Records how many extractions had run when playback started."""
+
+    def __init__(self, extractions):
+        super().__init__()
+        self.extractions = extractions
+        self.extractions_at_play = None
+
+    def play(self, source, after=None):
+        self.extractions_at_play = len(self.extractions)
+        super().play(source, after)
+
+
+class Source:
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        pass
+
+
+def test_play_extracts_at_most_once_before_voice_client_play(monkeypatch):
+    extractions = []
+
+    async def extract_info(profile, url, **options):
+        extractions.append((profile, url))
+        return {
+            'id': 'dQw4w9WgXcQ', 'title': 'Test track', 'duration': 0, 'thumbnail': '', 'webpage_url': VIDEO_URL,
+            'formats': [{'format_id': '251', 'url': STREAM_URL, 'acodec': 'opus', 'vcodec': 'none', 'abr': 64}],
+        }
+
+    monkeypatch.setattr(playback, 'extract_info', extract_info)
+    monkeypatch.setattr(command_functions.playback_manager, 'create_audio_source', lambda entry, guild_id, **kwargs: Source())
+    voice_client = CountingVoiceClient(extractions)
+    interaction = FakeInteraction(FakeGuild(1, voice_client))
+
+    run(command_functions.process_play(interaction, youtube_url=VIDEO_URL))
+
+    assert voice_client.extractions_at_play is not None, interaction.channel.sent
+    assert voice_client.extractions_at_play <= 1, extractions
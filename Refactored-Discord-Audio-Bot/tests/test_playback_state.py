@@ -0,0 +1,129 @@
+import asyncio
+
+import command_functions
+import view_functions
+from conftest import run
+from fakes import FakeGuild, FakeInteraction, FakeVoiceClient
+from playback_state import get_playback_state
+from queue_manager import QueueEntry, queue_manager
+
+
+def make_entry(title: str) -> QueueEntry:
+    return QueueEntry(f"https://www.youtube.com/watch?v={title}", '', title, False, guild_id='1')
+
+
+async def playing(interaction, entry):
+    """Put the guild in the state play_audio leaves it in: entry playing, its end reported by the voice client."""
+    state = get_playback_state(interaction.guild.id)
+    for event in ('resolve', 'buffer', 'start'):
+        state.transition(event, entry)
+    queue_manager.set_currently_playing(entry)
+    voice_client = interaction.guild.voice_client
+    voice_client.play(object(), after=lambda error: command_functions.playback_manager.handle_playback_end(interaction, entry, error))
+
+
+def record_play_audio(monkeypatch):
+    played = []
+
+    async def play_audio(ctx_or_interaction, entry, *args, **kwargs):
+        played.append(entry)
+
+    monkeypatch.setattr(command_functions.playback_manager, 'play_audio', play_audio)
+    return played
+
+
+def test_jump_plays_the_chosen_entry_once(monkeypatch):
+    played = record_play_audio(monkeypatch)
+    first, second = make_entry('first'), make_entry('second')
+    queue_manager.queues['1'] = [first, second]
+    interaction = FakeInteraction(FakeGuild(1, FakeVoiceClient()))
+
+    async def scenario():
+        await playing(interaction, first)
+        await command_functions.process_search_and_play_from_queue(interaction, 'second')
+        await asyncio.sleep(0)  # a late auto-advance would run here
+
+    run(scenario())
+    assert played == [second]
+    assert queue_manager.get_queue('1')[0] is second
+    assert queue_manager.last_played_audio['1'] == 'first'
+
+
+def test_previous_button_plays_the_previous_entry_once(monkeypatch):
+    played = record_play_audio(monkeypatch)
+    first, second = make_entry('first'), make_entry('second')
+    queue_manager.queues['1'] = [second, first]
+    queue_manager.last_played_audio['1'] = 'first'
+    interaction = FakeInteraction(FakeGuild(1, FakeVoiceClient()))
+
+    class ButtonView:
+        playback_manager = command_functions.playback_manager
+
+        async def refresh_view(self, interaction):
+            pass
+
+    async def scenario():
+        await playing(interaction, second)
+        await view_functions.handle_previous_button(interaction, second, ButtonView())
+        await asyncio.sleep(0)
+
+    run(scenario())
+    assert played == [first]
+
+
+def test_skip_still_advances_on_its_own(monkeypatch):
+    played = record_play_audio(monkeypatch)
+    first, second = make_entry('first'), make_entry('second')
+    queue_manager.queues['1'] = [first, second]
+    interaction = FakeInteraction(FakeGuild(1, FakeVoiceClient()))
+
+    async def scenario():
+        await playing(interaction, first)
+        interaction.guild.voice_client.stop()
+        assert await get_playback_state(1).wait_for('stopped', timeout=1)
+
+    run(scenario())
+    assert played == [second]  # the end handler had advanced the queue when 'stopped' was signalled
+
+
+def test_stopped_is_signalled_after_the_end_handler():
+    order = []
+
+    async def scenario():
+        state = get_playback_state(1)
+
+        async def handler():
+            await asyncio.sleep(0)
+            order.append('handler')
+
+        state.post('end', None, handler)
+        await state.wait_for('stopped', timeout=1)
+        order.append('stopped')
+
+    run(scenario())
+    assert order == ['handler', 'stopped']
+
+
+def test_start_while_another_track_plays_replaces_it(monkeypatch):
+    first, second = make_entry('first'), make_entry('second')
+    queue_manager.queues['1'] = [first, second]
+    voice_client = FakeVoiceClient()
+    interaction = FakeInteraction(FakeGuild(1, voice_client))
+    manager = command_functions.playback_manager
+    new_source = object()
+
+    async def scenario():
+        await playing(interaction, first)
+        state = get_playback_state(1)
+        # A second start raced the first: second was resolved while first kept playing
+        state.transition('resolve', second)
+        state.transition('buffer', second)
+        started = asyncio.ensure_future(state.wait_for('started', timeout=1.0))
+        await manager.start_playback(interaction, second, lambda error: None, new_source)
+        return state, await started
+
+    state, started = run(scenario())
+    assert started
+    assert (state.state, state.entry) == ('playing', second)
+    assert voice_client.source is new_source
+    assert queue_manager.get_queue('1') == [first, second]
@@ -0,0 +1,129 @@
+from datetime import timedelta
+import command_functions
+import view_functions
+from conftest import run
+from fakes import FakeGuild, FakeInteraction, FakeVoiceClient
+from playback_state import get_playback_state
+from queue_manager import QueueEntry, queue_manager
+
+
+class Source:
+    def __init__(self, start_offset=None):
+        self.start_offset = start_offset
+        self.cleaned_up = False
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+def make_entry(title: str, guild_id) -> QueueEntry:
+    return QueueEntry(f"https://www.youtube.com/watch?v={title}", '', title, False, duration=300, guild_id=str(guild_id))
+
+
+def setup_playing(monkeypatch, guild_id, title):
+    manager = command_functions.playback_manager
+
+    async def refresh_url_if_needed(entry):
+        pass
+
+    monkeypatch.setattr(manager, 'refresh_url_if_needed', refresh_url_if_needed)
+    monkeypatch.setattr(manager, 'create_audio_source', lambda entry, guild_id, **kwargs: Source(kwargs.get('start_offset')))
+    monkeypatch.setattr(manager, 'schedule_next_source_preparation', lambda *args: None)
+    entry = make_entry(title, guild_id)
+    state = get_playback_state(guild_id)
+    for event in ('resolve', 'buffer', 'start'):
+        state.transition(event, entry)
+    queue_manager.set_currently_playing(entry)
+    voice_client = FakeVoiceClient()
+    voice_client.play(Source())
+    return FakeInteraction(FakeGuild(guild_id, voice_client)), entry
+
+
+def test_seek_keeps_a_paused_track_paused(monkeypatch):
+    async def scenario():
+        interaction, entry = setup_playing(monkeypatch, 1, 'first')
+        voice_client = interaction.guild.voice_client
+        old_source = voice_client.source
+        voice_client.pause()
+        get_playback_state(1).transition('pause')
+        position = await command_functions.playback_manager.seek(interaction, 60)
+        return position, voice_client, old_source, entry
+
+    position, voice_client, old_source, entry = run(scenario())
+    assert position == 60
+    assert voice_client.is_paused() and not voice_client.is_playing()
+    assert voice_client.source.start_offset == 60 and old_source.cleaned_up
+    assert entry.pause_start_time is not None
+
+
+def test_seek_uses_the_guilds_own_entry(monkeypatch):
+    async def scenario():
+        interaction, first = setup_playing(monkeypatch, 1, 'first')
+        setup_playing(monkeypatch, 2, 'second')  # the shared currently_playing is now guild 2's entry
+        await command_functions.playback_manager.seek(interaction, 30)
+        return first
+
+    first = run(scenario())
+    assert 29 <= first.playback_position() <= 31
+
+
+def test_restart_defers_before_seeking(monkeypatch):
+    async def scenario():
+        interaction, entry = setup_playing(monkeypatch, 1, 'first')
+        seek = command_functions.playback_manager.seek
+
+        async def checked_seek(ctx, position):
+            assert ctx.response.deferred
+            return await seek(ctx, position)
+
+        monkeypatch.setattr(command_functions.playback_manager, 'seek', checked_seek)
+        await command_functions.process_restart(interaction)
+        return interaction
+
+    interaction = run(scenario())
+    assert interaction.followup.sent == ["Restarted first."]
+
+
+def test_restart_button_answers_after_seeking(monkeypatch):
+    class ButtonView:
+        playback_manager = command_functions.playback_manager
+
+    async def scenario():
+        interaction, entry = setup_playing(monkeypatch, 1, 'first')
+        await view_functions.handle_restart_button(interaction, entry, ButtonView())
+        return interaction
+
+    interaction = run(scenario())
+    assert interaction.response.deferred
+    assert interaction.followup.sent == ["Restarted first."]
+
+
+def test_relative_seek_uses_the_guilds_own_clock(monkeypatch):
+    class ButtonView:
+        playback_manager = command_functions.playback_manager
+
+    async def scenario():
+        interaction, first = setup_playing(monkeypatch, 1, 'first')
+        second_interaction, second = setup_playing(monkeypatch, 2, 'second')
+        second.start_time -= timedelta(seconds=200)  # guild 2 is far into its track
+        await command_functions.process_seek(interaction, '+15')
+        await view_functions.handle_fast_forward_button(interaction, first, ButtonView())
+        return interaction, first
+
+    interaction, first = run(scenario())
+    assert 29 <= first.playback_position() <= 31
+    assert interaction.followup.sent[0].startswith("Jumped to 0:15 in first")
+
+
+def test_restart_names_the_guilds_own_track(monkeypatch):
+    async def scenario():
+        interaction, entry = setup_playing(monkeypatch, 1, 'first')
+        setup_playing(monkeypatch, 2, 'second')
+        await command_functions.process_restart(interaction)
+        return interaction
+
+    interaction = run(scenario())
+    assert interaction.followup.sent == ["Restarted first."]
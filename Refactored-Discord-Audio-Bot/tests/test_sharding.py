@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from state_store import shard_for_guild
+
+STAND_IN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shard_stand_in.py')
+SHARD_COUNT = 2
+
+
+def guild_on_shard(shard_id: int, n: int) -> str:
+    guild_id = str((2 * n + shard_id) << 22)
+    assert shard_for_guild(guild_id, SHARD_COUNT) == shard_id
+    return guild_id
+
+
+def run_shards(tmp_path, commands):
+    """Run one stand-in process per shard at the same time, as launcher.py does, and return their output."""
+    processes = []
+    for shard_id, args in enumerate(commands):
+        environment = dict(os.environ, SHARD_ID=str(shard_id), SHARD_COUNT=str(SHARD_COUNT), STATE_BACKEND='sqlite',
+                           STATE_DB_PATH=str(tmp_path / 'bot_state.db'), AUDIO_CACHE_DIR=str(tmp_path / 'cache'))
+        processes.append(subprocess.Popen([sys.executable, STAND_IN, *args], env=environment, cwd=tmp_path,
+                                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
+    outputs = []
+    for process in processes:
+        stdout, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+        outputs.append(stdout)
+    return outputs
+
+
+def test_shards_keep_their_own_guilds_across_restarts(tmp_path):
+    guilds = [[guild_on_shard(shard_id, n) for n in range(3)] for shard_id in range(SHARD_COUNT)]
+    run_shards(tmp_path, [['write', *guilds[0]], ['write', *guilds[1]]])
+    # Restarted shards load what they wrote, and nothing of the other shard's guilds
+    states = [json.loads(output.splitlines()[-1]) for output in run_shards(tmp_path, [['read'], ['read']])]
+
+    for shard_id, state in enumerate(states):
+        assert sorted(state['queues']) == sorted(guilds[shard_id])
+        assert all(titles == [f"track {guild_id}"] for guild_id, titles in state['queues'].items())
+        assert sorted(state['settings']) == sorted(guilds[shard_id])
+        assert all(settings['volume'] == shard_id + 0.5 for settings in state['settings'].values())
+        assert state['cached'] == sorted(guilds[shard_id])
+    assert states[0]['cache_directory'] != states[1]['cache_directory']
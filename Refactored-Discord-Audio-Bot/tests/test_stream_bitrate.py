@@ -0,0 +1,51 @@
+import command_functions
+import playback
+from conftest import run
+from fakes import FakeGuild, FakeInteraction, FakeVoiceClient
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+HIGH_URL = 'https://rr1---sn-test.googlevideo.com/videoplayback?itag=251&abr=160'
+LOW_URL = 'https://rr1---sn-test.googlevideo.com/videoplayback?itag=250&abr=64'
+
+
+class Source:
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        pass
+
+
+def test_play_selects_a_stream_within_the_channel_bitrate(monkeypatch):
+    extractions = []
+
+    async def extract_info(profile, url, **options):
+        extractions.append(url)
+        return {
+            'id': 'dQw4w9WgXcQ', 'title': 'Test track', 'duration': 0, 'thumbnail': '', 'webpage_url': VIDEO_URL,
+            'url': HIGH_URL, 'acodec': 'opus', 'abr': 160,
+            'formats': [
+                {'format_id': '250', 'url': LOW_URL, 'acodec': 'opus', 'vcodec': 'none', 'abr': 64},
+                {'format_id': '251', 'url': HIGH_URL, 'acodec': 'opus', 'vcodec': 'none', 'abr': 160},
+            ],
+        }
+
+    played_urls = []
+
+    def create_audio_source(entry, guild_id, **kwargs):
+        # Guild settings and per-guild state are keyed by the string form of the ID
+        assert guild_id == '1'
+        played_urls.append(entry.best_audio_url)
+        return Source()
+
+    monkeypatch.setattr(playback, 'extract_info', extract_info)
+    monkeypatch.setattr(command_functions.playback_manager, 'create_audio_source', create_audio_source)
+    voice_client = FakeVoiceClient()
+    voice_client.channel.bitrate = 64000
+    interaction = FakeInteraction(FakeGuild(1, voice_client))
+
+    run(command_functions.process_play(interaction, youtube_url=VIDEO_URL))
+
+    assert played_urls == [LOW_URL], interaction.channel.sent
+    # Selected when the track was resolved, not by a second extraction once it started
+    assert len(extractions) == 1, extractions
@@ -0,0 +1,18 @@
+import pytest
+import yt_dlp
+from conftest import StandInModule
+from ytdl_pool import YoutubeDLPool
+
+
+@pytest.mark.skipif(isinstance(yt_dlp, StandInModule), reason='needs yt-dlp')
+def test_overrides_leave_no_params_behind(tmp_path):
+    pool = YoutubeDLPool(1, str(tmp_path / 'cookies.txt'))
+    with pool.acquire('search') as ydl:
+        before = dict(ydl.params)
+    assert 'playlistend' not in before
+
+    with pool.acquire('search', playlistend=3, quiet=not before.get('quiet')) as ydl:
+        assert ydl.params['playlistend'] == 3
+    with pool.acquire('search') as reused:
+        assert reused is ydl
+        assert reused.params == before
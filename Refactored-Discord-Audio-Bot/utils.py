@@ -3,8 +3,7 @@ import re
 import aiohttp
 import yt_dlp
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
+from datetime import timedelta
 # from pydub import AudioSegment
 from mutagen.mp3 import MP3
 import logging
@@ -15,6 +14,8 @@ from discord.errors import NotFound
 from lyricsgenius import Genius
 from dotenv import load_dotenv
 import config  # ✅ Import your config to access MUSICBRAINZ_USER_AGENT
+from extraction_guard import ExtractionErrorLog, extraction_cache_key, record_extraction_failure, unavailable_videos, youtube_breaker
+from ytdl_pool import extract_info, select_audio_format
 
 load_dotenv()
 
@@ -30,8 +31,6 @@ GENIUS_API_TOKEN = os.getenv('genius_api_token')
 # Initialize the Genius API client
 genius = Genius(GENIUS_API_TOKEN)
 
-executor = ThreadPoolExecutor(max_workers=1)
-
 UNWANTED_PATTERNS = [
     r'\(Official Video\)', 
     r'\(Official Audio\)', 
@@ -165,50 +164,37 @@ async def fetch_info(url, index: int = None):
     Returns:
         dict: Information about the video or playlist
     """
-    # Standard options with enhanced user agent and headers
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'noplaylist': False if "list=" in url else True,
-        'playlist_items': str(index) if index is not None else None,
-        'ignoreerrors': True,
-        'cookiefile': 'cookies.txt',
-        'http_headers': {
-            'User-Agent': (
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-        }
-    }
+    cache_key = extraction_cache_key(url, index)
+    if unavailable_videos.contains(cache_key):
+        logging.info(f"Skipping known-unavailable video: {cache_key}")
+        return None
+    if not youtube_breaker.allow_request():
+        logging.warning(youtube_breaker.status_message())
+        return None
 
+    error_log = ExtractionErrorLog()
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logging.debug(f"Fetching info for URL: {url}, index: {index}")
-            info = await asyncio.get_running_loop().run_in_executor(executor, lambda: ydl.extract_info(url, download=False))
-            
-            # Process playlist entries if present
-            if 'entries' in info:
-                entries = []
-                for entry in info['entries']:
-                    if entry and not entry.get('is_unavailable', False):
-                        entry['duration'] = entry.get('duration', 0)
-                        entry['thumbnail'] = entry.get('thumbnail', '')
-                        entry['best_audio_url'] = next((f['url'] for f in entry['formats'] if f.get('acodec') != 'none'), entry.get('url'))
-                        entries.append(entry)
-                        logging.debug(f"Processing entry: {entry.get('title', 'Unknown title')}")
-                info['entries'] = entries
-            else:
-                # Process single video
-                info['duration'] = info.get('duration', 0)
-                info['thumbnail'] = info.get('thumbnail', '')
-                info['best_audio_url'] = next((f['url'] for f in info['formats'] if f.get('acodec') != 'none'), info.get('url'))
-                logging.debug(f"Processing entry: {info.get('title', 'Unknown title')}")
-            return info
+        logging.debug(f"Fetching info for URL: {url}, index: {index}")
+        info = await extract_info(
+            'resolve', url,
+            noplaylist=False if "list=" in url else True,
+            playlist_items=str(index) if index is not None else None,
+            logger=error_log
+        )
+        if not info:
+            raise yt_dlp.utils.DownloadError(error_log.last_error or f"No info returned for {url}")
+        youtube_breaker.record_success()
+        return process_extracted_info(info)
     except yt_dlp.utils.ExtractorError as e:
         logging.warning(f"Skipping unavailable video: {str(e)}")
+        record_extraction_failure(cache_key, str(e))
         return None
     except Exception as e:
         logging.error(f"Error fetching info for URL {url}: {str(e)}")
-        # Try with more aggressive options if standard options fail
+        # Aggressive options only help with transient errors; unavailable videos and
+        # bot detection would just fail again and feed the failure storm
+        if record_extraction_failure(cache_key, str(e)) != 'other' or not youtube_breaker.allow_request():
+            return None
         return await fetch_info_with_aggressive_options(url, index)
 
 async def fetch_info_with_aggressive_options(url, index: int = None):
@@ -223,57 +209,44 @@ async def fetch_info_with_aggressive_options(url, index: int = None):
         dict: Information about the video or playlist
     """
     logging.info(f"Using aggressive options to fetch info for URL: {url}")
-    
-    # More aggressive options to bypass restrictions
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'noplaylist': False if "list=" in url else True,
-        'playlist_items': str(index) if index is not None else None,
-        'ignoreerrors': True,
-        'cookiefile': 'cookies.txt',
-        'source_address': '0.0.0.0',  # Use all available network interfaces
-        'force_ipv4': True,           # Force IPv4 to avoid IPv6 issues
-        'rm_cachedir': True,          # Remove cache to avoid stale data
-        'http_headers': {
-            'User-Agent': (
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            ),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Referer': 'https://www.youtube.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
-    }
+    cache_key = extraction_cache_key(url, index)
+    error_log = ExtractionErrorLog()
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = await asyncio.get_running_loop().run_in_executor(executor, lambda: ydl.extract_info(url, download=False))
-            
-            # Process playlist entries if present
-            if 'entries' in info:
-                entries = []
-                for entry in info['entries']:
-                    if entry and not entry.get('is_unavailable', False):
-                        entry['duration'] = entry.get('duration', 0)
-                        entry['thumbnail'] = entry.get('thumbnail', '')
-                        entry['best_audio_url'] = next((f['url'] for f in entry['formats'] if f.get('acodec') != 'none'), entry.get('url'))
-                        entries.append(entry)
-                info['entries'] = entries
-            else:
-                # Process single video
-                info['duration'] = info.get('duration', 0)
-                info['thumbnail'] = info.get('thumbnail', '')
-                info['best_audio_url'] = next((f['url'] for f in info['formats'] if f.get('acodec') != 'none'), info.get('url'))
-            
-            logging.info(f"Successfully fetched info with aggressive options for URL: {url}")
-            return info
+        info = await extract_info(
+            'aggressive', url,
+            noplaylist=False if "list=" in url else True,
+            playlist_items=str(index) if index is not None else None,
+            logger=error_log
+        )
+        if not info:
+            raise yt_dlp.utils.DownloadError(error_log.last_error or f"No info returned for {url}")
+        youtube_breaker.record_success()
+        logging.info(f"Successfully fetched info with aggressive options for URL: {url}")
+        return process_extracted_info(info)
     except Exception as e:
         logging.error(f"Failed to fetch info even with aggressive options for URL {url}: {str(e)}")
+        record_extraction_failure(cache_key, str(e))
         return None
+
+def process_extracted_info(info):
+    """Fill in duration, thumbnail and best_audio_url on a video or on each available playlist entry."""
+    if 'entries' in info:
+        entries = []
+        for entry in info['entries']:
+            if entry and not entry.get('is_unavailable', False):
+                entry['duration'] = entry.get('duration', 0)
+                entry['thumbnail'] = entry.get('thumbnail', '')
+                entry['best_audio_url'], entry['audio_codec'] = select_audio_format(entry)
+                entries.append(entry)
+                logging.debug(f"Processing entry: {entry.get('title', 'Unknown title')}")
+        info['entries'] = entries
+    else:
+        info['duration'] = info.get('duration', 0)
+        info['thumbnail'] = info.get('thumbnail', '')
+        info['best_audio_url'], info['audio_codec'] = select_audio_format(info)
+        logging.debug(f"Processing entry: {info.get('title', 'Unknown title')}")
+    return info
     
 def create_now_playing_embed(entry):
     embed = Embed(title="Now Playing", description=entry.title, url=entry.video_url)
@@ -288,40 +261,6 @@ def create_now_playing_embed(entry):
 
     return embed
 
-def store_message_info(bot, message_id, view):
-    bot.message_views[message_id] = view
-    bot.add_now_playing_message(message_id)
-    
-def is_playback_active(interaction):
-    return interaction.guild.voice_client and interaction.guild.voice_client.is_playing()
-    
-def is_entry_currently_playing(entry, queue_manager):
-    return queue_manager.currently_playing == entry
-
-async def finalize_progress_update(interaction, message, entry, duration, button_view):
-    elapsed = calculate_elapsed_time(entry, duration)
-    progress_bar, elapsed_str, duration_str = create_progress_bar(elapsed / duration, duration)
-    embed = update_embed_fields(message.embeds[0], entry, progress_bar, elapsed_str, duration_str)
-    view = button_view(interaction.client, entry, paused=False, current_user=interaction.user)
-    await message.edit(embed=embed, view=view)
-
-async def update_progress_bar(interaction, message, entry, button_view, queue_manager):
-    logging.debug(f"Updating progress bar for: {entry.title}")
-    duration = entry.duration if hasattr(entry, 'duration') else 300
-
-    while not queue_manager.is_paused:
-        print(f'{is_playback_active(interaction)}  is playback active --- checking for opposite')
-        if not is_entry_currently_playing(entry, queue_manager):
-            logging.info(f"Stopping progress update for {entry.title}")
-            break
-
-        if not is_playback_active(interaction):
-            await finalize_progress_update(interaction, message, entry, duration, button_view)
-            break
-
-        await refresh_progress_bar(interaction, message, entry, duration, button_view)
-        await asyncio.sleep(2)  # Update less frequently to reduce load
-        
 def create_progress_bar(progress, duration):
     total_blocks = 20
     filled_blocks = int(progress * total_blocks)
@@ -330,21 +269,6 @@ def create_progress_bar(progress, duration):
     duration_str = str(timedelta(seconds=duration))
     return progress_bar, elapsed_str, duration_str
 
-async def refresh_progress_bar(interaction, message, entry, duration, button_view):
-    elapsed = calculate_elapsed_time(entry, duration)
-    progress_bar, elapsed_str, duration_str = create_progress_bar(elapsed / duration, duration)
-    embed = update_embed_fields(message.embeds[0], entry, progress_bar, elapsed_str, duration_str)
-    view = button_view(interaction.client, entry, paused=False, current_user=interaction.user)
-    await message.edit(embed=embed, view=view)
-
-async def schedule_progress_bar_update(ctx_or_interaction, message, entry, button_view, queue_manager):
-    await update_progress_bar(ctx_or_interaction, message, entry, button_view, queue_manager)
-    asyncio.create_task(update_progress_bar(ctx_or_interaction, message, entry, button_view, queue_manager))
-    
-def calculate_elapsed_time(entry, duration):
-    elapsed = (datetime.now() - entry.start_time - entry.paused_duration).total_seconds()
-    return min(elapsed, duration)
-
 def update_embed_fields(embed, entry, progress_bar, elapsed_str, duration_str):
     favorited_by = ', '.join([user['name'] for user in entry.favorited_by]) if entry.favorited_by else "No one"
     embed.set_field_at(0, name="Favorited by", value=favorited_by, inline=False)
@@ -397,7 +321,9 @@ async def remove_orphaned_mp3_files(queue_manager, download_folder: str = 'downl
     all_entries = [entry for queue in queue_manager.queues.values() for entry in queue]
     all_mp3_files = {entry.best_audio_url for entry in all_entries if entry.best_audio_url.startswith(download_folder)}
     
-    for root, _, files in os.walk(download_folder):
+    for root, dirs, files in os.walk(download_folder):
+        # The audio cache manages its own files
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.normpath(config.AUDIO_CACHE_ROOT)]
         for file in files:
             file_path = os.path.join(root, file)
             if file_path not in all_mp3_files:
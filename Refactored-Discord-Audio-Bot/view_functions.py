@@ -2,16 +2,19 @@ import logging
 import os
 import random
 from datetime import datetime
-import asyncio
 
-from discord import Interaction, Embed, File, ButtonStyle
+from discord import Interaction, Embed, File
 from queue_manager import queue_manager, QueueEntry
 from utils import get_lyrics
+from audio_cache import audio_cache
+from config import SEEK_STEP_SECONDS
+from playback_state import get_playback_state
+from now_playing_scheduler import now_playing_scheduler
 
 logging.basicConfig(level=logging.DEBUG, filename='view_functions.log', format='%(asctime)s:%(levelname)s:%(message)s')
 
 
-async def handle_lyrics_button(interaction: Interaction, entry: QueueEntry):
+async def handle_lyrics_button(interaction: Interaction, entry: QueueEntry, button_view):
     logging.debug(f"Lyrics button clicked for: {entry.title}")
     await interaction.response.defer(ephemeral=True)
 
@@ -28,22 +31,20 @@ async def handle_lyrics_button(interaction: Interaction, entry: QueueEntry):
         await interaction.followup.send(lyrics)
 
 
-async def handle_loop_button(interaction: Interaction):
+async def handle_loop_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer(ephemeral=True)
     logging.debug("Loop button callback triggered")
 
     if queue_manager.currently_playing:
         queue_manager.loop = not queue_manager.loop
-        button_label = "🔁 Looped" if queue_manager.loop else "🔁 Loop"
-        button_style = ButtonStyle.primary if queue_manager.loop else ButtonStyle.secondary
         await interaction.followup.send(f"Looping {'enabled' if queue_manager.loop else 'disabled'}.")
         logging.info(f"Looping {'enabled' if queue_manager.loop else 'disabled'} for {queue_manager.currently_playing.title}")
-        await update_now_playing(interaction, queue_manager.currently_playing, button_label, button_style)
+        await update_now_playing(interaction, queue_manager.currently_playing, button_view)
     else:
         await interaction.followup.send("No track is currently playing.", ephemeral=True)
 
 
-async def handle_favorite_button(interaction: Interaction, entry: QueueEntry, current_user):
+async def handle_favorite_button(interaction: Interaction, entry: QueueEntry, button_view):
     logging.debug("Favorite button callback triggered")
     await interaction.response.defer(ephemeral=True)
     user_id = interaction.user.id
@@ -51,16 +52,16 @@ async def handle_favorite_button(interaction: Interaction, entry: QueueEntry, cu
     if user_id in [user['id'] for user in entry.favorited_by]:
         entry.favorited_by = [user for user in entry.favorited_by if user['id'] != user_id]
         entry.is_favorited = False
-        button_style = ButtonStyle.secondary
-        button_label = "⭐ Favorite"
     else:
         entry.favorited_by.append({'id': user_id, 'name': user_name})
         entry.is_favorited = True
-        button_style = ButtonStyle.primary
-        button_label = "💛 Favorited"
+        # Favorites are replayed often enough to keep a local copy
+        audio_cache.request_download(entry)
 
     queue_manager.save_queues()
-    await update_now_playing(interaction, entry, button_label, button_style)
+    # The button shows the state for whoever pressed it last
+    button_view.current_user = interaction.user
+    await update_now_playing(interaction, entry, button_view)
 
 
 async def handle_pause_button(interaction: Interaction, entry: QueueEntry, button_view):
@@ -68,16 +69,14 @@ async def handle_pause_button(interaction: Interaction, entry: QueueEntry, butto
     if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
         interaction.guild.voice_client.pause()
         queue_manager.is_paused = True
+        get_playback_state(interaction.guild.id).transition('pause')
         entry.pause_start_time = datetime.now()
         button_view.paused = True
         logging.debug(f"Pause button clicked. Setting paused to {button_view.paused}")
         button_view.update_buttons()
-        await interaction.message.edit(view=button_view)
+        if not now_playing_scheduler.request_update(interaction.message, view=button_view):
+            await interaction.message.edit(view=button_view)
         await interaction.followup.send('Playback paused.', ephemeral=True)
-        # Stop the progress update task
-        if button_view.progress_update_task:
-            button_view.progress_update_task.cancel()
-            button_view.progress_update_task = None
 
 
 async def handle_resume_button(interaction: Interaction, entry: QueueEntry, button_view):
@@ -85,17 +84,18 @@ async def handle_resume_button(interaction: Interaction, entry: QueueEntry, butt
     if interaction.guild.voice_client and interaction.guild.voice_client.is_paused():
         interaction.guild.voice_client.resume()
         queue_manager.is_paused = False
+        get_playback_state(interaction.guild.id).transition('resume')
         entry.paused_duration += datetime.now() - entry.pause_start_time
         entry.pause_start_time = None
         button_view.paused = False
         logging.debug(f"Resume button clicked. Setting paused to {button_view.paused}")
         button_view.update_buttons()
-        await interaction.message.edit(view=button_view)
+        if not now_playing_scheduler.request_update(interaction.message, view=button_view):
+            await interaction.message.edit(view=button_view)
         await interaction.followup.send('Playback resumed.', ephemeral=True)
-        await button_view.start_progress_update_task(interaction, entry)  # Restart the progress update task
 
 
-async def handle_stop_button(interaction: Interaction):
+async def handle_stop_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     if interaction.guild.voice_client:
         queue_manager.stop_is_triggered = True
@@ -108,7 +108,7 @@ async def handle_stop_button(interaction: Interaction):
         await interaction.followup.send('Playback stopped and disconnected.', ephemeral=True)
 
 
-async def handle_skip_button(interaction: Interaction):
+async def handle_skip_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -118,28 +118,56 @@ async def handle_skip_button(interaction: Interaction):
 
     if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
         interaction.guild.voice_client.stop()
-        await asyncio.sleep(0.5)
+        await get_playback_state(interaction.guild.id).wait_for('stopped')
         await interaction.followup.send("Skipped the current track.", ephemeral=True)
     else:
         await interaction.followup.send("Nothing is currently playing.", ephemeral=True)
 
 
-async def handle_restart_button(interaction: Interaction, button_view):
+async def handle_restart_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
-    if not queue_manager.currently_playing:
+    current_entry = get_playback_state(interaction.guild.id).entry
+    if not current_entry:
         await interaction.followup.send("No track is currently playing.", ephemeral=True)
         return
 
-    current_entry = queue_manager.currently_playing
+    # Seeking to the start keeps the same player and avoids re-running queue rotation
+    if interaction.guild.voice_client and await button_view.playback_manager.seek(interaction, 0) is not None:
+        await interaction.followup.send(f"Restarted {current_entry.title}.", ephemeral=True)
+        return
     queue_manager.is_restarting = True
 
     if interaction.guild.voice_client:
-        interaction.guild.voice_client.stop()
-        await asyncio.sleep(0.5)
+        await get_playback_state(interaction.guild.id).stop_player(interaction.guild.voice_client)
         await button_view.playback_manager.play_audio(interaction, current_entry)
+        await interaction.followup.send(f"Restarted {current_entry.title}.", ephemeral=True)
+    else:
+        await interaction.followup.send("The bot is not connected to a voice channel.", ephemeral=True)
+
 
+async def handle_rewind_button(interaction: Interaction, entry: QueueEntry, button_view):
+    await seek_by(interaction, entry, button_view, -SEEK_STEP_SECONDS)
 
-async def handle_shuffle_button(interaction: Interaction, button_view):
+
+async def handle_fast_forward_button(interaction: Interaction, entry: QueueEntry, button_view):
+    await seek_by(interaction, entry, button_view, SEEK_STEP_SECONDS)
+
+
+async def seek_by(interaction: Interaction, entry: QueueEntry, button_view, offset: float):
+    await interaction.response.defer(ephemeral=True)
+    # The buttons of an older now playing message must not move the guild's current track
+    if entry is not get_playback_state(interaction.guild.id).entry or not interaction.guild.voice_client:
+        await interaction.followup.send(f"{entry.title} is not playing anymore.", ephemeral=True)
+        return
+    position = await button_view.playback_manager.seek(interaction, entry.playback_position() + offset)
+    if position is None:
+        await interaction.followup.send("No track is currently playing.", ephemeral=True)
+        return
+    minutes, seconds = divmod(int(position), 60)
+    await interaction.followup.send(f"Jumped to {minutes}:{seconds:02d}.", ephemeral=True)
+
+
+async def handle_shuffle_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -150,8 +178,8 @@ async def handle_shuffle_button(interaction: Interaction, button_view):
 
     queue_manager.has_been_shuffled = True
     random.shuffle(queue)
-    for entry in queue:
-        entry.has_been_arranged = False
+    for queued_entry in queue:
+        queued_entry.has_been_arranged = False
     queue_manager.queues[server_id] = queue
     queue_manager.save_queues()
 
@@ -161,7 +189,7 @@ async def handle_shuffle_button(interaction: Interaction, button_view):
         await button_view.send_now_playing_for_buttons(interaction, first_entry_before_shuffle)
 
 
-async def handle_list_queue_button(interaction: Interaction, button_view):
+async def handle_list_queue_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue_manager.ensure_queue_exists(server_id)
@@ -175,12 +203,10 @@ async def handle_list_queue_button(interaction: Interaction, button_view):
             await button_view.send_now_playing_for_buttons(interaction, queue_manager.currently_playing)
 
 
-async def handle_remove_button(interaction: Interaction):
+async def handle_remove_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
-    # Access the entry directly from the interaction's view
-    entry = interaction.view.entry
     if entry in queue:
         queue.remove(entry)
         queue_manager.save_queues()
@@ -193,7 +219,7 @@ async def handle_remove_button(interaction: Interaction):
         await interaction.followup.send(f"Stopped playback and removed '{entry.title}' from the queue.", ephemeral=True)
 
 
-async def handle_previous_button(interaction: Interaction):
+async def handle_previous_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
 
     server_id = str(interaction.guild.id)
@@ -203,23 +229,22 @@ async def handle_previous_button(interaction: Interaction):
         return
 
     queue = queue_manager.get_queue(server_id)
-    entry = next((e for e in queue if e.title == last_played), None)
+    previous_entry = next((e for e in queue if e.title == last_played), None)
 
-    if not entry:
+    if not previous_entry:
         await interaction.followup.send("No previously played track found.", ephemeral=True)
         return
 
-    queue.remove(entry)
-    queue.insert(1, entry)
+    queue.remove(previous_entry)
+    queue.insert(1, previous_entry)
     queue_manager.save_queues()
     if interaction.guild.voice_client and interaction.guild.voice_client.is_playing():
-        interaction.guild.voice_client.stop()
-        await asyncio.sleep(0.5)
-        await interaction.message.view.playback_manager.play_audio(interaction, entry)
-        await interaction.message.view.refresh_view(interaction)
+        await get_playback_state(interaction.guild.id).stop_player(interaction.guild.voice_client)
+        await button_view.playback_manager.play_audio(interaction, previous_entry)
+        await button_view.refresh_view(interaction)
 
 
-async def handle_move_up_button(interaction: Interaction, entry: QueueEntry):
+async def handle_move_up_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -230,12 +255,12 @@ async def handle_move_up_button(interaction: Interaction, entry: QueueEntry):
         entry.has_been_arranged = True
         queue_manager.save_queues()
         await interaction.followup.send(f"Moved '{entry.title}' up in the queue.", ephemeral=True)
-        await interaction.message.view.refresh_view(interaction)
+        await button_view.refresh_view(interaction)
     else:
         await interaction.followup.send(f"'{entry.title}' is already at the top of the queue.", ephemeral=True)
 
 
-async def handle_move_down_button(interaction: Interaction, entry: QueueEntry):
+async def handle_move_down_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -246,12 +271,12 @@ async def handle_move_down_button(interaction: Interaction, entry: QueueEntry):
         entry.has_been_arranged = True
         queue_manager.save_queues()
         await interaction.followup.send(f"Moved '{entry.title}' down in the queue.", ephemeral=True)
-        await interaction.message.view.refresh_view(interaction)
+        await button_view.refresh_view(interaction)
     else:
         await interaction.followup.send(f"'{entry.title}' is already at the bottom of the queue.", ephemeral=True)
 
 
-async def handle_move_to_top_button(interaction: Interaction, entry: QueueEntry):
+async def handle_move_to_top_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -262,12 +287,12 @@ async def handle_move_to_top_button(interaction: Interaction, entry: QueueEntry)
         entry.has_been_arranged = True
         queue_manager.save_queues()
         await interaction.followup.send(f"Moved '{entry.title}' to the top of the queue.", ephemeral=True)
-        await interaction.message.view.refresh_view(interaction)
+        await button_view.refresh_view(interaction)
     else:
         await interaction.followup.send(f"'{entry.title}' is already at the top of the queue.", ephemeral=True)
 
 
-async def handle_move_to_bottom_button(interaction: Interaction, entry: QueueEntry):
+async def handle_move_to_bottom_button(interaction: Interaction, entry: QueueEntry, button_view):
     await interaction.response.defer()  # Defer the response
     server_id = str(interaction.guild.id)
     queue = queue_manager.get_queue(server_id)
@@ -278,18 +303,20 @@ async def handle_move_to_bottom_button(interaction: Interaction, entry: QueueEnt
         entry.has_been_arranged = True
         queue_manager.save_queues()
         await interaction.followup.send(f"Moved '{entry.title}' to the bottom of the queue.", ephemeral=True)
-        await interaction.message.view.refresh_view(interaction)
+        await button_view.refresh_view(interaction)
     else:
         await interaction.followup.send(f"'{entry.title}' is already at the bottom of the queue.", ephemeral=True)
 
 
-async def update_now_playing(interaction: Interaction, entry: QueueEntry, button_label: str, button_style):
+async def update_now_playing(interaction: Interaction, entry: QueueEntry, button_view):
+    button_view.update_buttons()
+    # The scheduler's edit rewrites the favorites field along with the progress bar
+    if now_playing_scheduler.request_update(interaction.message, view=button_view):
+        return
     embed = interaction.message.embeds[0]
     favorited_by = ', '.join([user['name'] for user in entry.favorited_by]) if entry.favorited_by else "No one"
     embed.set_field_at(0, name="Favorited by", value=favorited_by, inline=False)
-    interaction.message.view.favorite_button.label = button_label
-    interaction.message.view.favorite_button.style = button_style
-    await interaction.message.edit(embed=embed, view=interaction.message.view)
+    await interaction.message.edit(embed=embed, view=button_view)
 
 
 async def display_queue(interaction: Interaction, title: str, queue):
@@ -0,0 +1,277 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from itertools import count
+from typing import Deque, Dict, List, Optional
+from discord import AudioSource
+from config import OPUS_BITRATE, VOICE_WORKERS
+
+logging.basicConfig(level=logging.DEBUG, filename='voice_workers.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+CREDIT_WINDOW = 250  # packets (5 s) a worker may encode ahead of what the bot process has played
+CREDIT_BATCH = 25  # consumed packets handed back to the worker per message
+PACKET_BATCH = 10  # Opus packets per message from a worker
+
+
+class WorkerStream:
+    """One audio pipeline inside a worker process: ffmpeg PCM -> GainSource -> Opus encoder."""
+
+    def __init__(self, stream_id: int, spec: dict, send):
+        # Imported here so the bot process never loads the encoder for workers it does not run
+        from discord import FFmpegPCMAudio
+        from discord.opus import Encoder
+        from audio_sources import SAMPLES_PER_FRAME, GainSource
+
+        self.stream_id = stream_id
+        self.send = send
+        self.samples_per_frame = SAMPLES_PER_FRAME
+        pcm_source = FFmpegPCMAudio(spec['input'], before_options=spec['before_options'], options=spec['options'])
+        self.source = GainSource(pcm_source, spec['volume'], spec['track_gain'])
+        self.encoder = Encoder()
+        self.encoder.set_bitrate(spec.get('bitrate', OPUS_BITRATE))
+        self.credit = CREDIT_WINDOW
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True, name=f'voice-stream:{stream_id}')
+        self.thread.start()
+
+    def grant(self, packets: int):
+        with self.condition:
+            self.credit += packets
+            self.condition.notify_all()
+
+    def run(self):
+        batch: List[bytes] = []
+        try:
+            while True:
+                with self.condition:
+                    out_of_credit = self.credit <= 0
+                if out_of_credit and batch:
+                    self.send(('packets', self.stream_id, batch))
+                    batch = []
+                with self.condition:
+                    self.condition.wait_for(lambda: self.credit > 0 or self.closed)
+                    if self.closed:
+                        return
+                    self.credit -= 1
+                pcm = self.source.read()
+                if not pcm:
+                    break
+                batch.append(self.encoder.encode(pcm, self.samples_per_frame))
+                if len(batch) >= PACKET_BATCH:
+                    self.send(('packets', self.stream_id, batch))
+                    batch = []
+            if batch:
+                self.send(('packets', self.stream_id, batch))
+            self.send(('end', self.stream_id, None))
+        except Exception as e:
+            if not self.closed:
+                logging.error(f"Voice stream {self.stream_id} failed: {e}")
+                self.send(('error', self.stream_id, str(e)))
+        finally:
+            self.source.cleanup()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.source.cleanup()
+
+
+def worker_main(connection):
+    """Entry point of a voice worker process: serve stream requests until the bot process goes away."""
+    send_lock = threading.Lock()
+    streams: Dict[int, WorkerStream] = {}
+
+    def send(message):
+        with send_lock:
+            connection.send(message)
+
+    while True:
+        try:
+            kind, stream_id, payload = connection.recv()
+        except (EOFError, OSError):
+            break
+        if kind == 'open':
+            try:
+                streams[stream_id] = WorkerStream(stream_id, payload, send)
+            except Exception as e:
+                logging.error(f"Could not open voice stream {stream_id}: {e}")
+                send(('error', stream_id, str(e)))
+        elif kind == 'credit' and stream_id in streams:
+            streams[stream_id].grant(payload)
+        elif kind == 'volume' and stream_id in streams:
+            streams[stream_id].source.set_volume(payload)
+        elif kind == 'close' and stream_id in streams:
+            streams.pop(stream_id).close()
+        elif kind == 'shutdown':
+            break
+    for stream in streams.values():
+        stream.close()
+
+
+class WorkerOpusSource(AudioSource):
+    """
+    Opus packets encoded by a voice worker process, handed to discord.py as is.
+
+    read() blocks until the worker has delivered the next packet, like a read from
+    ffmpeg's stdout would, so it is meant to be wrapped in a ReadAheadSource. Every
+    CREDIT_BATCH packets played are returned to the worker as credit, which keeps
+    it at most CREDIT_WINDOW packets ahead of playback.
+    """
+
+    def __init__(self, worker: 'VoiceWorker', stream_id: int, volume: float):
+        self.worker = worker
+        self.stream_id = stream_id
+        self.user_volume = volume
+        self.packets: Deque[bytes] = deque()
+        self.condition = threading.Condition()
+        self.finished = False
+        self.consumed = 0
+
+    def deliver(self, packets: List[bytes]):
+        with self.condition:
+            self.packets.extend(packets)
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def read(self) -> bytes:
+        with self.condition:
+            self.condition.wait_for(lambda: self.packets or self.finished)
+            if not self.packets:
+                return b''
+            packet = self.packets.popleft()
+        self.consumed += 1
+        if self.consumed >= CREDIT_BATCH:
+            self.worker.send(('credit', self.stream_id, self.consumed))
+            self.consumed = 0
+        return packet
+
+    @property
+    def volume(self) -> float:
+        return self.user_volume
+
+    def set_volume(self, volume: float):
+        # The worker's GainSource clamps and ramps it
+        self.user_volume = volume
+        self.worker.send(('volume', self.stream_id, volume))
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self):
+        with self.condition:
+            self.finished = True
+            self.packets.clear()
+            self.condition.notify_all()
+        self.worker.close_stream(self.stream_id)
+
+
+class VoiceWorker:
+    """A worker process and the bot-side end of its pipe."""
+
+    def __init__(self, index: int, context):
+        self.index = index
+        parent_connection, child_connection = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_connection,), daemon=True, name=f'voice-worker-{index}')
+        self.process.start()
+        child_connection.close()
+        self.connection = parent_connection
+        self.send_lock = threading.Lock()
+        self.streams: Dict[int, WorkerOpusSource] = {}
+        self.receiver = threading.Thread(target=self.receive, daemon=True, name=f'voice-worker-{index}-receiver')
+        self.receiver.start()
+        logging.info(f"Started voice worker {index} (pid {self.process.pid})")
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, message):
+        try:
+            with self.send_lock:
+                self.connection.send(message)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not reach voice worker {self.index}: {e}")
+
+    def open_stream(self, stream_id: int, spec: dict) -> WorkerOpusSource:
+        source = WorkerOpusSource(self, stream_id, spec['volume'])
+        self.streams[stream_id] = source
+        self.send(('open', stream_id, spec))
+        return source
+
+    def close_stream(self, stream_id: int):
+        if self.streams.pop(stream_id, None) is not None:
+            self.send(('close', stream_id, None))
+
+    def receive(self):
+        while True:
+            try:
+                kind, stream_id, payload = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            source = self.streams.get(stream_id)
+            if source is None:
+                continue
+            if kind == 'packets':
+                source.deliver(payload)
+            else:
+                if kind == 'error':
+                    logging.error(f"Voice worker {self.index} stream {stream_id}: {payload}")
+                source.finish()
+        # The worker is gone; let every stream it served end instead of blocking the players
+        logging.error(f"Voice worker {self.index} exited with {self.process.exitcode}")
+        for source in list(self.streams.values()):
+            source.finish()
+
+
+class VoiceWorkerPool:
+    """
+    Worker processes that run the PCM pipeline (ffmpeg decode, gain and Opus encode)
+    outside the bot process, so audio work scales with cores instead of sharing one
+    with the event loop. The bot process keeps the gateway, the voice connection and
+    discord.py's packet pacing, and receives finished Opus packets over a pipe.
+
+    A guild's streams always go to the same worker. A worker that died is replaced
+    the next time one of its guilds starts a track.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.workers: List[Optional[VoiceWorker]] = [None] * size
+        self.stream_ids = count(1)
+        self.lock = threading.Lock()
+        self.context = multiprocessing.get_context('spawn')
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def worker_for(self, guild_id) -> VoiceWorker:
+        index = int(guild_id) % self.size
+        with self.lock:
+            worker = self.workers[index]
+            if worker is None or not worker.alive:
+                worker = self.workers[index] = VoiceWorker(index, self.context)
+            return worker
+
+    def open_stream(self, guild_id, spec: dict) -> WorkerOpusSource:
+        return self.worker_for(guild_id).open_stream(next(self.stream_ids), spec)
+
+    def summary(self) -> str:
+        lines = [f"Voice workers: {self.size}"]
+        for index, worker in enumerate(self.workers):
+            if worker is None:
+                lines.append(f"worker {index}: not started")
+            else:
+                status = 'running' if worker.alive else f"exited {worker.process.exitcode}"
+                lines.append(f"worker {index}: pid {worker.process.pid} {status}, {len(worker.streams)} streams")
+        return '\n'.join(lines)
+
+
+voice_workers = VoiceWorkerPool(VOICE_WORKERS)
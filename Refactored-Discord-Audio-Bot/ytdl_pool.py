@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import yt_dlp
+from config import YTDL_POOL_SIZE, YTDL_COOKIE_FILE, PLAYBACK_MODE, AUDIO_CACHE_DIR
+
+logging.basicConfig(level=logging.DEBUG, filename='ytdl_pool.log', format='%(asctime)s:%(levelname)s:%(message)s')
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+MISSING = object()  # marks params a profile does not set, so overrides of them are removed again
+
+# Passthrough playback can remux YouTube's Opus stream straight to Discord, so prefer it
+AUDIO_FORMAT = 'bestaudio[acodec=opus]/bestaudio/best' if PLAYBACK_MODE == 'passthrough' else 'bestaudio/best'
+
+BASE_OPTIONS = {
+    'format': AUDIO_FORMAT,
+    'ignoreerrors': True,
+    'cookiefile': YTDL_COOKIE_FILE,
+    'force_generic_extractor': False,
+    'http_headers': {'User-Agent': USER_AGENT},
+}
+
+# Every yt-dlp option set the bot uses lives here. Per-call differences
+# (noplaylist, playlist_items, logger) are passed as overrides to acquire().
+PROFILE_OPTIONS = {
+    # Full extraction of a single video or one playlist item
+    'resolve': {
+        'noplaylist': True,
+    },
+    # Playlist listing without resolving every entry
+    'flat_list': {
+        'quiet': True,
+        'noplaylist': False,
+        'extract_flat': 'in_playlist',
+    },
+    # ytsearchN: queries
+    'search': {
+        'noplaylist': True,
+    },
+    # Background downloads into the audio cache, one file per video ID
+    'download': {
+        'quiet': True,
+        'noplaylist': True,
+        'outtmpl': {'default': os.path.join(AUDIO_CACHE_DIR, '%(id)s.%(ext)s')},
+    },
+    # Fallback when the standard options fail. rm_cachedir is only honoured by the
+    # yt-dlp command line, so it is not carried over here.
+    'aggressive': {
+        'noplaylist': True,
+        'source_address': '0.0.0.0',  # Use all available network interfaces
+        'force_ipv4': True,           # Force IPv4 to avoid IPv6 issues
+        'http_headers': {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Referer': 'https://www.youtube.com/',
+            'DNT': '1',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        },
+    },
+}
+
+
+def format_kbps(audio_format: dict) -> float:
+    return audio_format.get('abr') or audio_format.get('tbr') or 0
+
+
+def select_audio_format(info: dict, fallback: Optional[str] = None, max_kbps: Optional[int] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return the stream URL and audio codec to play for an extracted video.
+
+    Uses the format yt-dlp selected for AUDIO_FORMAT when it carries audio, otherwise
+    the first format that does, otherwise the info's own URL. With max_kbps, the
+    best audio-only format within that bitrate is used instead (Opus first in
+    passthrough mode), or the lowest-bitrate one if none fits.
+    """
+    if max_kbps:
+        audio_formats = [f for f in info.get('formats') or [] if f.get('url') and f.get('acodec') not in (None, 'none')]
+        audio_formats = [f for f in audio_formats if f.get('vcodec') in (None, 'none')] or audio_formats
+        fitting = [f for f in audio_formats if format_kbps(f) <= max_kbps]
+        prefer_opus = PLAYBACK_MODE == 'passthrough'
+        if fitting:
+            chosen = max(fitting, key=lambda f: (prefer_opus and f.get('acodec') == 'opus', format_kbps(f)))
+            return chosen['url'], chosen.get('acodec')
+        if audio_formats:
+            chosen = min(audio_formats, key=format_kbps)
+            return chosen['url'], chosen.get('acodec')
+    if info.get('url') and info.get('acodec') not in (None, 'none'):
+        return info['url'], info['acodec']
+    audio_format = next((f for f in info.get('formats') or [] if f.get('acodec') != 'none'), None)
+    if audio_format:
+        return audio_format['url'], audio_format.get('acodec')
+    return info.get('url', fallback), info.get('acodec')
+
+
+def selected_bitrate(info: dict, url: Optional[str]) -> Optional[float]:
+    """Bitrate in kbps of the format whose URL was selected, if yt-dlp reported one."""
+    for audio_format in [info, *(info.get('formats') or [])]:
+        if audio_format.get('url') == url:
+            return format_kbps(audio_format) or None
+    return None
+
+
+class YoutubeDLPool:
+    """
+    Keeps a few long-lived YoutubeDL instances per option profile.
+
+    Building a YoutubeDL loads cookies.txt, initializes every extractor and creates
+    an HTTP opener, so instances are reused across calls and only rebuilt when the
+    cookie file changes on disk. Each instance is checked out by one thread at a time.
+    """
+
+    def __init__(self, size: int, cookie_file: str):
+        self.size = size
+        self.cookie_file = cookie_file
+        self.lock = threading.Lock()
+        self.idle: Dict[str, List[yt_dlp.YoutubeDL]] = {profile: [] for profile in PROFILE_OPTIONS}
+        self.slots = {profile: threading.BoundedSemaphore(size) for profile in PROFILE_OPTIONS}
+        self.cookie_mtime = self.read_cookie_mtime()
+        self.generation = 0
+        self.instances_created = 0
+        self.checkouts = 0
+
+    def read_cookie_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.cookie_file)
+        except OSError:
+            return None
+
+    def build(self, profile: str) -> yt_dlp.YoutubeDL:
+        options = {**BASE_OPTIONS, **PROFILE_OPTIONS[profile]}
+        self.instances_created += 1
+        logging.debug(f"Creating YoutubeDL instance for profile '{profile}' (total created: {self.instances_created})")
+        return yt_dlp.YoutubeDL(options)
+
+    def check_cookies(self):
+        """Drop idle instances when cookies.txt changed so the next checkout loads the new cookies."""
+        cookie_mtime = self.read_cookie_mtime()
+        if cookie_mtime != self.cookie_mtime:
+            logging.info(f"{self.cookie_file} changed, rebuilding YoutubeDL instances")
+            self.cookie_mtime = cookie_mtime
+            self.generation += 1
+            for instances in self.idle.values():
+                instances.clear()
+
+    def checkout(self, profile: str):
+        with self.lock:
+            self.check_cookies()
+            self.checkouts += 1
+            instances = self.idle[profile]
+            ydl = instances.pop() if instances else None
+            generation = self.generation
+        return ydl or self.build(profile), generation
+
+    def checkin(self, profile: str, ydl: yt_dlp.YoutubeDL, generation: int):
+        with self.lock:
+            # Instances built before a cookie change are dropped instead of returned.
+            # They are not closed, since close() would write the stale cookies back to disk.
+            if generation == self.generation:
+                self.idle[profile].append(ydl)
+
+    @contextmanager
+    def acquire(self, profile: str, **overrides):
+        if profile not in PROFILE_OPTIONS:
+            raise ValueError(f"Unknown YoutubeDL profile: {profile}")
+        slot = self.slots[profile]
+        slot.acquire()
+        try:
+            ydl, generation = self.checkout(profile)
+            saved_params = {key: ydl.params.get(key, MISSING) for key in overrides}
+            ydl.params.update(overrides)
+            try:
+                yield ydl
+            finally:
+                # yt-dlp treats a param set to None differently from an absent one
+                for key, value in saved_params.items():
+                    if value is MISSING:
+                        ydl.params.pop(key, None)
+                    else:
+                        ydl.params[key] = value
+                self.checkin(profile, ydl, generation)
+        finally:
+            slot.release()
+
+    def stats(self) -> dict:
+        return {
+            'instances_created': self.instances_created,
+            'checkouts': self.checkouts,
+            'idle': {profile: len(instances) for profile, instances in self.idle.items()},
+        }
+
+
+ytdl_pool = YoutubeDLPool(YTDL_POOL_SIZE, YTDL_COOKIE_FILE)
+executor = ThreadPoolExecutor(max_workers=YTDL_POOL_SIZE * len(PROFILE_OPTIONS), thread_name_prefix='ytdl')
+
+
+def extract_info_sync(profile: str, url: str, **overrides) -> Optional[dict]:
+    with ytdl_pool.acquire(profile, **overrides) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+async def extract_info(profile: str, url: str, **overrides) -> Optional[dict]:
+    """Run a pooled extraction off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(executor, lambda: extract_info_sync(profile, url, **overrides))